@@ -0,0 +1,672 @@
+"""
+Read-only archives of closed fiscal years.
+
+    python archive.py --list
+    python archive.py 2023 [--vacuum]
+
+Archiving a closed fiscal year moves its invoices out of the live
+database into data/archive/fy<year>-<generation>.db and their PDFs out of
+pdfs/ into one container file next to it (.pack). The container is the
+PDFs back to back. Its index (name, offset, size, sha256) lives in the
+archive database.
+
+An archive database holds the same invoices, invoice_items and
+invoice_search tables as the live one. It also keeps a snapshot of the
+vendors and signatures the invoices reference. So the Database query
+methods (list, count, search, details, reports, exports) run on it
+unchanged. Archives are never modified in place. Archiving more invoices
+into a year that is already archived writes a new generation, and the
+older one is removed once no process has it open. Because of that, every
+archive can be opened with immutable=1 and memory-mapped: SQLite skips
+locking and change detection for them.
+
+`archives` merges the live database and every archive for the invoice
+list, search, reports, exports and PDF downloads. The live database
+stays the size of the open years.
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import queue
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from database import (
+    Database, db, decode_invoice_cursor, encode_invoice_cursor,
+    INVOICE_PAGE_SIZE, MAX_INVOICE_PAGE_SIZE, SEARCH_PAGE_SIZE, READER_POOL_SIZE,
+    SEARCH_INSERT_SQL
+)
+from invoice_totals import sum_amounts
+from metrics import connection_factory
+from zip_export import local_pdf_path
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(BASE_DIR, 'data', 'archive')
+# fy2023-1760000000.db / fy2023-1760000000.pack
+_ARCHIVE_RE = re.compile(r'^fy(\d{4})-(\d+)\.db$')
+
+# First month of the fiscal year; fiscal year N runs from month M of
+# year N to the end of month M-1 of year N+1
+FISCAL_YEAR_START_MONTH = int(os.environ.get('INVOICE_FISCAL_YEAR_START') or 1)
+
+ARCHIVE_MMAP_SIZE = 1024 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+# Superseded archives stay open this long for requests still reading them
+RETIRED_ARCHIVE_GRACE_SECONDS = 60
+# Tables copied from the live database (vendors/signatures as snapshots)
+ARCHIVE_TABLES = ('vendors', 'signatures', 'invoices', 'invoice_items')
+
+
+def fiscal_year_of(day):
+    """Fiscal year containing a date."""
+    return day.year if day.month >= FISCAL_YEAR_START_MONTH else day.year - 1
+
+
+def fiscal_year_range(year):
+    """(first day, first day of the next year) of a fiscal year as ISO dates."""
+    start = datetime.date(year, FISCAL_YEAR_START_MONTH, 1)
+    end = datetime.date(year + 1, FISCAL_YEAR_START_MONTH, 1)
+    return start.isoformat(), end.isoformat()
+
+
+# ============================================================
+# One archived year
+# ============================================================
+
+class ReadOnlyPool:
+    """Reader connections to an immutable, memory-mapped SQLite file."""
+
+    def __init__(self, db_path, readers=READER_POOL_SIZE):
+        self.db_path = db_path
+        self._uri = f"{Path(db_path).resolve().as_uri()}?mode=ro&immutable=1"
+        self._readers = queue.LifoQueue(maxsize=readers)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False, factory=connection_factory())
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {ARCHIVE_MMAP_SIZE}")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def read(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                try:
+                    if self._closed:
+                        raise queue.Full
+                    self._readers.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    def write(self):
+        raise sqlite3.OperationalError("archived fiscal years are read-only")
+
+    def close(self):
+        """Close the idle connections; those still in use are closed when returned."""
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+class ArchivedYear(Database):
+    """
+    One archive file. Inherits the read methods of Database, which run
+    against the archive's own invoices/items/search tables.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.generation = int(_ARCHIVE_RE.match(os.path.basename(db_path)).group(2))
+        self._pool = ReadOnlyPool(db_path)
+        with self.read() as conn:
+            info = dict(conn.execute("SELECT key, value FROM archive_info").fetchall())
+        self.fiscal_year = int(info['fiscal_year'])
+        self.date_from = info['date_from']
+        self.date_to = info['date_to']
+        self.invoice_count = int(info['invoices'])
+        self.pack_path = os.path.join(os.path.dirname(db_path), info['pdf_pack'])
+        self._pack = None
+        self._pack_lock = threading.Lock()
+        self._closed = False
+
+    def overlaps(self, filters):
+        """False when the date filters exclude the whole fiscal year."""
+        filters = filters or {}
+        if filters.get('date_from') and filters['date_from'] >= self.date_to:
+            return False
+        if filters.get('date_to') and filters['date_to'] < self.date_from:
+            return False
+        return True
+
+    def _map_pack(self):
+        with open(self.pack_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be mapped (a year without PDFs)
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def read_pdf(self, name):
+        """(bytes, sha256) of a packed PDF, or None."""
+        with self.read() as conn:
+            row = conn.execute(
+                "SELECT offset, size, sha256 FROM archive_pdfs WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        start, size = row['offset'], row['size']
+        with self._pack_lock:
+            if not self._closed:
+                if self._pack is None:
+                    self._pack = self._map_pack()
+                return bytes(self._pack[start:start + size]), row['sha256']
+        # Superseded by a newer generation while this request was running
+        try:
+            with open(self.pack_path, 'rb') as f:
+                f.seek(start)
+                return f.read(size), row['sha256']
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        """Release the connections and the pack mapping of a superseded archive."""
+        self._pool.close()
+        with self._pack_lock:
+            self._closed = True
+            if isinstance(self._pack, mmap.mmap):
+                self._pack.close()
+            self._pack = None
+
+    def summary(self):
+        return {
+            'fiscal_year': self.fiscal_year,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'invoices': self.invoice_count,
+            'file': os.path.basename(self.db_path),
+            'size': os.path.getsize(self.db_path),
+            'pdf_pack_size': os.path.getsize(self.pack_path),
+        }
+
+
+# ============================================================
+# The live database plus every archive
+# ============================================================
+
+def _newest_generations(archive_dir):
+    """fiscal year -> path of its newest archive file."""
+    newest = {}
+    for name in os.listdir(archive_dir):
+        match = _ARCHIVE_RE.match(name)
+        if match:
+            year, generation = int(match.group(1)), int(match.group(2))
+            if generation > newest.get(year, (0, None))[0]:
+                newest[year] = (generation, os.path.join(archive_dir, name))
+    return {year: path for year, (_, path) in newest.items()}
+
+
+def _tag(rows, archive):
+    for row in rows:
+        row['archived'] = archive.fiscal_year if archive is not None else None
+    return rows
+
+
+class Archives:
+    """
+    The archives in ARCHIVE_DIR, rescanned when the directory changes
+    (a new generation written by any process), and the merged reads over
+    the live database and them.
+    """
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._stamp = None
+        self._years = []
+        # (time superseded, ArchivedYear), closed after the grace period
+        self._retired = []
+        self._lock = threading.Lock()
+
+    def years(self):
+        """Current ArchivedYears, newest fiscal year first."""
+        try:
+            stamp = os.stat(self.archive_dir).st_mtime_ns
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    loaded = {archive.db_path: archive for archive in self._years}
+                    paths = _newest_generations(self.archive_dir) if stamp is not None else {}
+                    self._years = [
+                        loaded.get(path) or ArchivedYear(path)
+                        for _, path in sorted(paths.items(), reverse=True)
+                    ]
+                    self._stamp = stamp
+                    # Generations replaced by a newer one (or removed)
+                    current = set(paths.values())
+                    self._retired += [
+                        (time.monotonic(), archive)
+                        for path, archive in loaded.items() if path not in current
+                    ]
+        if self._retired:
+            self._close_retired()
+        return self._years
+
+    def _close_retired(self):
+        cutoff = time.monotonic() - RETIRED_ARCHIVE_GRACE_SECONDS
+        with self._lock:
+            while self._retired and self._retired[0][0] < cutoff:
+                self._retired.pop(0)[1].close()
+
+    def _sources(self, filters=None):
+        """(None for the live database or an ArchivedYear, Database) pairs to query."""
+        return [(None, db)] + [(archive, archive) for archive in self.years() if archive.overlaps(filters)]
+
+    # ------------------------------------------------------------
+    # Invoice list / count / details
+    # ------------------------------------------------------------
+
+    def list_invoices(self, filters=None, cursor=None, limit=INVOICE_PAGE_SIZE):
+        """Database.list_invoices over the live database and the archives."""
+        sources = self._sources(filters)
+        if len(sources) == 1:
+            return db.list_invoices(filters, cursor=cursor, limit=limit)
+
+        limit = max(1, min(int(limit or INVOICE_PAGE_SIZE), MAX_INVOICE_PAGE_SIZE))
+        if cursor:
+            decode_invoice_cursor(cursor)
+
+        rows, seen, more = [], set(), False
+        for archive, source in sources:
+            page = source.list_invoices(filters, cursor=cursor, limit=limit)
+            more = more or page['next_cursor'] is not None
+            # An invoice archived by an interrupted run is still live: live wins
+            for row in _tag(page['invoices'], archive):
+                if row['id'] not in seen:
+                    seen.add(row['id'])
+                    rows.append(row)
+
+        rows.sort(key=lambda row: (row['created_at'] or '', row['id']), reverse=True)
+        more = more or len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'invoices': rows,
+            'next_cursor': encode_invoice_cursor(rows[-1]['created_at'], rows[-1]['id']) if more and rows else None
+        }
+
+    def existing_invoice_numbers(self, numbers):
+        """Database.existing_invoice_numbers, archived numbers included."""
+        numbers = list(numbers)
+        taken = db.existing_invoice_numbers(numbers)
+        for archive in self.years():
+            taken |= archive.existing_invoice_numbers(numbers)
+        return taken
+
+    def count_invoices(self, filters=None):
+        return sum(source.count_invoices(filters) for _, source in self._sources(filters))
+
+    def get_invoices(self, invoice_ids):
+        """Database.get_invoices, looking in the archives for ids not in the live database."""
+        ids = [int(i) for i in invoice_ids]
+        found = {invoice['id']: invoice for invoice in db.get_invoices(ids)}
+        for archive in self.years():
+            missing = [i for i in ids if i not in found]
+            if not missing:
+                break
+            found.update((invoice['id'], invoice) for invoice in archive.get_invoices(missing))
+        return [found[i] for i in dict.fromkeys(ids) if i in found]
+
+    def get_invoice(self, invoice_id):
+        invoices = self.get_invoices([invoice_id])
+        return invoices[0] if invoices else None
+
+    # ------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------
+
+    def search_invoices(self, text, filters=None, offset=0, limit=SEARCH_PAGE_SIZE):
+        """
+        Database.search_invoices over the live database and the archives,
+        merged by rank. (Each file ranks against its own term statistics.)
+        """
+        sources = self._sources(filters)
+        if len(sources) == 1:
+            return db.search_invoices(text, filters, offset=offset, limit=limit)
+
+        limit = max(1, min(int(limit or SEARCH_PAGE_SIZE), MAX_INVOICE_PAGE_SIZE))
+        offset = max(0, int(offset or 0))
+        wanted = offset + limit + 1
+
+        results, seen = [], set()
+        for archive, source in sources:
+            # The top `wanted` of every source, a page at a time
+            page_offset = 0
+            while page_offset is not None and page_offset < wanted:
+                page = source.search_invoices(
+                    text, filters, offset=page_offset,
+                    limit=min(MAX_INVOICE_PAGE_SIZE, wanted - page_offset)
+                )
+                for row in _tag(page['results'], archive):
+                    if row['id'] not in seen:
+                        seen.add(row['id'])
+                        results.append(row)
+                page_offset = page['next_offset']
+
+        results.sort(key=lambda row: row['rank'])
+        page = results[offset:offset + limit]
+        return {
+            'results': page,
+            'next_offset': offset + limit if len(results) > offset + limit else None
+        }
+
+    # ------------------------------------------------------------
+    # Reports and exports
+    # ------------------------------------------------------------
+
+    REPORT_FIELDS = ('subtotal', 'tax', 'shipping', 'grand_total')
+
+    def spend_report(self, dimension, filters=None):
+        """Database.spend_report with the archived years' groups added in."""
+        sources = self._sources(filters)
+        if len(sources) == 1:
+            return db.spend_report(dimension, filters)
+
+        groups = {}
+        for _, source in sources:
+            for row in source.spend_report(dimension, filters):
+                group = groups.setdefault(row['key'], {
+                    'key': row['key'], 'label': row['label'], 'invoices': 0,
+                    **{field: [] for field in self.REPORT_FIELDS}
+                })
+                group['invoices'] += row['invoices']
+                for field in self.REPORT_FIELDS:
+                    group[field].append(row[field])
+
+        rows = []
+        for group in groups.values():
+            for field in self.REPORT_FIELDS:
+                group[field] = float(sum_amounts(group[field]))
+            rows.append(group)
+        if dimension == 'month':
+            rows.sort(key=lambda row: row['key'] or '')
+        else:
+            rows.sort(key=lambda row: row['grand_total'], reverse=True)
+        return rows
+
+    def iter_export_rows(self, sheet, filters=None):
+        """Export rows of the live database, then of each archive (newest year first)."""
+        for _, source in self._sources(filters):
+            yield from source.iter_export_rows(sheet, filters)
+
+    def export_column_lengths(self, sheet, filters=None):
+        lengths = [source.export_column_lengths(sheet, filters) for _, source in self._sources(filters)]
+        return [max(column) for column in zip(*lengths)]
+
+    # ------------------------------------------------------------
+    # PDFs
+    # ------------------------------------------------------------
+
+    def read_pdf(self, filename):
+        """(bytes, sha256) of an archived PDF, or None."""
+        name = os.path.basename(filename)
+        for archive in self.years():
+            pdf = archive.read_pdf(name)
+            if pdf is not None:
+                return pdf
+        return None
+
+    def summary(self):
+        return [archive.summary() for archive in self.years()]
+
+
+archives = Archives()
+
+
+# ============================================================
+# Archiving a fiscal year
+# ============================================================
+
+def _table_sql(conn, schema, kind, names):
+    placeholders = ', '.join('?' for _ in names)
+    return [row[0] for row in conn.execute(
+        f"SELECT sql FROM {schema}.sqlite_master WHERE type = ? AND tbl_name IN ({placeholders}) AND sql IS NOT NULL",
+        [kind, *names]
+    )]
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _create_schema(conn):
+    """Tables, indexes and search index of a new archive, copied from the live database."""
+    for sql in _table_sql(conn, 'hot', 'table', ARCHIVE_TABLES + ('invoice_search',)):
+        conn.execute(sql)
+    for sql in _table_sql(conn, 'hot', 'index', ARCHIVE_TABLES):
+        conn.execute(sql)
+    conn.execute("""
+        CREATE TABLE archive_pdfs (
+            name TEXT PRIMARY KEY,
+            invoice_id INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE TABLE archive_info (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _copy_rows(conn, table, where, params, replace=True):
+    # Columns added to the live table after an older archive was created are left out
+    live = set(_columns(conn, 'hot', table))
+    columns = ', '.join(c for c in _columns(conn, 'main', table) if c in live)
+    conn.execute(
+        f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO main.{table} ({columns}) "
+        f"SELECT {columns} FROM hot.{table} WHERE {where}",
+        params
+    )
+
+
+def _pack_pdfs(conn, pack, rows):
+    """Append the PDFs of `rows` (id, pdf_path) to the open pack file. Returns their paths."""
+    packed = []
+    offset = pack.seek(0, os.SEEK_END)
+    for invoice_id, pdf_path in rows:
+        path = local_pdf_path(pdf_path)
+        if not path or not os.path.isfile(path):
+            continue
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as src:
+            while True:
+                chunk = src.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                pack.write(chunk)
+                size += len(chunk)
+        conn.execute(
+            "INSERT OR REPLACE INTO archive_pdfs (name, invoice_id, offset, size, sha256) VALUES (?, ?, ?, ?, ?)",
+            (os.path.basename(path), invoice_id, offset, size, digest.hexdigest())
+        )
+        offset += size
+        packed.append(path)
+    return packed
+
+
+def _sync(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def remove_old_generations(archive_dir=ARCHIVE_DIR):
+    """Delete superseded archive files no process has open any more."""
+    if not os.path.isdir(archive_dir):
+        return
+    current = set(_newest_generations(archive_dir).values())
+    for name in os.listdir(archive_dir):
+        path = os.path.join(archive_dir, name)
+        if _ARCHIVE_RE.match(name) and path not in current:
+            for old in (path, path[:-len('.db')] + '.pack'):
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+                except PermissionError:
+                    # Still mapped by a running server (Windows); next run
+                    pass
+
+
+def archive_fiscal_year(year, today=None):
+    """
+    Move the invoices dated in a closed fiscal year and their PDFs into
+    that year's archive. Returns a summary dict.
+    Raises ValueError for a fiscal year that is still open or has PDFs
+    waiting to be rendered.
+    """
+    today = today or datetime.date.today()
+    if year >= fiscal_year_of(today):
+        raise ValueError(f"Fiscal year {year} is not closed yet")
+    date_from, date_to = fiscal_year_range(year)
+    last_day = (datetime.date.fromisoformat(date_to) - datetime.timedelta(days=1)).isoformat()
+
+    selected = list(db.iter_invoice_pdf_paths({'date_from': date_from, 'date_to': last_day}))
+    ids = {invoice_id for invoice_id, _, _ in selected}
+    pending = [job for job in db.get_unfinished_render_jobs() if job['invoice_id'] in ids]
+    if pending:
+        raise ValueError(f"{len(pending)} PDF(s) of fiscal year {year} are still rendering; try again later")
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    remove_old_generations()
+    previous = next((a for a in archives.years() if a.fiscal_year == year), None)
+    if not selected:
+        return {'fiscal_year': year, 'archived': 0, 'pdfs': 0, 'file': previous and os.path.basename(previous.db_path)}
+
+    generation = int(time.time())
+    if previous is not None:
+        generation = max(generation, previous.generation + 1)
+    stem = os.path.join(ARCHIVE_DIR, f"fy{year}-{generation}")
+    db_tmp, pack_tmp = f"{stem}.db.tmp", f"{stem}.pack.tmp"
+
+    if previous is not None:
+        shutil.copyfile(previous.db_path, db_tmp)
+        shutil.copyfile(previous.pack_path, pack_tmp)
+    else:
+        for path in (db_tmp, pack_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+        open(pack_tmp, 'wb').close()
+
+    id_json = json.dumps(sorted(ids))
+    conn = sqlite3.connect(db_tmp, isolation_level=None, uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS hot", (f"{Path(db.db_path).resolve().as_uri()}?mode=ro",))
+        conn.execute("BEGIN")
+        if previous is None:
+            _create_schema(conn)
+
+        in_ids = "id IN (SELECT value FROM json_each(?))"
+        _copy_rows(conn, 'invoices', in_ids, (id_json,))
+        conn.execute(f"DELETE FROM main.invoice_items WHERE invoice_{in_ids}", (id_json,))
+        _copy_rows(conn, 'invoice_items', f"invoice_{in_ids}", (id_json,))
+        # Vendors and signatures as they were when their invoices were archived
+        _copy_rows(conn, 'vendors', "id IN (SELECT vendor_id FROM main.invoices)", (), replace=False)
+        _copy_rows(conn, 'signatures', "id IN (SELECT signature_id FROM main.invoices)", (), replace=False)
+
+        conn.execute("DELETE FROM main.invoice_search")
+        conn.execute(SEARCH_INSERT_SQL.format(where="1"))
+        conn.execute("INSERT INTO main.invoice_search (invoice_search) VALUES ('optimize')")
+
+        with open(pack_tmp, 'ab') as pack:
+            packed = _pack_pdfs(conn, pack, [(invoice_id, pdf_path) for invoice_id, _, pdf_path in selected])
+            pack.flush()
+            os.fsync(pack.fileno())
+
+        count = conn.execute("SELECT COUNT(*) FROM main.invoices").fetchone()[0]
+        conn.executemany("INSERT OR REPLACE INTO archive_info (key, value) VALUES (?, ?)", [
+            ('fiscal_year', str(year)),
+            ('date_from', date_from),
+            ('date_to', date_to),
+            ('invoices', str(count)),
+            ('pdf_pack', os.path.basename(f"{stem}.pack")),
+            ('created_at', datetime.datetime.now().isoformat(timespec='seconds')),
+        ])
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE hot")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    _sync(db_tmp)
+
+    # The pack first: an archive database is only visible once its pack is in place
+    os.replace(pack_tmp, f"{stem}.pack")
+    os.replace(db_tmp, f"{stem}.db")
+
+    # Only now leave the live database; a crash before this point leaves
+    # the invoices live (and the list shows the live copy)
+    db.delete_invoices({'ids': sorted(ids)})
+    for path in packed:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    remove_old_generations()
+
+    return {
+        'fiscal_year': year,
+        'archived': len(ids),
+        'pdfs': len(packed),
+        'file': os.path.basename(f"{stem}.db"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive closed fiscal years into read-only files")
+    parser.add_argument('year', nargs='?', type=int, help="fiscal year to archive")
+    parser.add_argument('--list', action='store_true', help="list the archived fiscal years")
+    parser.add_argument('--vacuum', action='store_true', help="compact the live database afterwards")
+    args = parser.parse_args(argv)
+
+    db.init()
+    if args.year is not None:
+        try:
+            result = archive_fiscal_year(args.year)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"📦 Archived {result['archived']} invoice(s) and {result['pdfs']} PDF(s) "
+              f"of fiscal year {args.year} into {result['file']}")
+        if args.vacuum:
+            db.vacuum()
+            print(f"🧹 Live database compacted to {os.path.getsize(db.db_path) // 1024} KB")
+
+    if args.list or args.year is None:
+        for archive in archives.summary():
+            print(f"FY {archive['fiscal_year']} ({archive['date_from']} .. {archive['date_to']}): "
+                  f"{archive['invoices']} invoices, {archive['size'] // 1024} KB + "
+                  f"{archive['pdf_pack_size'] // 1024} KB PDFs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
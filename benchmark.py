@@ -0,0 +1,376 @@
+"""
+Benchmark suite for the PDF, Excel, listing and invoice-creation paths.
+
+Builds a synthetic SQLite database (data/benchmark.db by default, never
+the real one), times each path and writes p50/p95 latency and throughput
+as JSON so runs can be compared over time.
+
+Benchmarks:
+    pdf_classic, pdf_visual   generate_invoice_pdf (cache bypassed)
+    excel_export              export_invoices_to_excel with items + totals
+    list_*, count, search_*   invoice list / count / full-text search queries
+    get_all_invoices          the legacy full-table load
+    create_invoice            POST /api/invoices through the Flask test client
+
+Usage:
+    python benchmark.py [--vendors 50] [--invoices 5000] [--items 5]
+                        [--pdf-samples 20] [--repeat 20]
+                        [--only pdf,excel,list,create]
+                        [--output data/benchmarks/run.json] [--compare old.json]
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import subprocess
+from datetime import date, timedelta
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'data', 'benchmark.db')
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'benchmarks')
+
+GROUPS = ('pdf', 'excel', 'list', 'create')
+
+VENDOR_WORDS = ['Green', 'Valley', 'North', 'Maple', 'River', 'Cedar', 'Prairie', 'Sun', 'Stone', 'Pine']
+VENDOR_SUFFIXES = ['Farms', 'Growers', 'Supply Co.', 'Labs', 'Inc.', 'Cultivation']
+ITEM_NAMES = ['Hemp Seed', 'Flower', 'Pre-roll', 'Oil Tincture', 'Trim', 'Clone', 'Resin', 'Capsules']
+TYPES = ['Order', 'Sample', 'Transfer']
+UNITS = ['Gram', 'Kg', 'Unit']
+
+
+# ------------------------------------------------------------
+# Statistics
+# ------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, units_per_sample=1):
+    """Latency (ms) and throughput (units per second) of a list of timings in seconds."""
+    values = sorted(samples)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'mean_ms': round(total / len(values) * 1000, 3),
+        'min_ms': round(values[0] * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+        'throughput_per_s': round(len(values) * units_per_sample / total, 2) if total else None
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+# ------------------------------------------------------------
+# Synthetic data
+# ------------------------------------------------------------
+
+def synthetic_invoice(rng, vendor, day, items_per_invoice):
+    return {
+        'invoice_number': '',
+        'date': day.isoformat(),
+        'type': rng.choice(TYPES),
+        'vendor_id': vendor['id'],
+        'vendor_name': vendor['name'],
+        'vendor_address': vendor['address'],
+        'hst_gst_number': '747957900 RT0001',
+        'tax_rate': rng.choice([13.0, 5.0, 0.0]),
+        'shipping_cost': round(rng.uniform(0, 80), 2),
+        'comments': rng.choice(['', 'Rush order', 'Deliver to back door', 'Net 30']),
+        'notes': '',
+        'created_by': 'Benchmark',
+        'items': [
+            {
+                'lot_number': f"LOT-{rng.randrange(100000):05d}",
+                'item': rng.choice(ITEM_NAMES),
+                'quantity': rng.randint(1, 500),
+                'units': rng.choice(UNITS),
+                'unit_price': round(rng.uniform(0.5, 40), 2)
+            }
+            for _ in range(items_per_invoice)
+        ]
+    }
+
+
+def build_database(db, vendors, invoices, items_per_invoice, seed=1, chunk_size=500):
+    """Fill an empty database with synthetic vendors and invoices."""
+    rng = random.Random(seed)
+
+    vendor_rows = []
+    for n in range(vendors):
+        name = f"{rng.choice(VENDOR_WORDS)} {rng.choice(VENDOR_WORDS)} {rng.choice(VENDOR_SUFFIXES)} {n}"
+        address = f"{rng.randint(1, 9999)} Concession Rd {rng.randint(1, 20)}, Ontario"
+        vendor_id = db.add_vendor(name, address, '')
+        vendor_rows.append({'id': vendor_id, 'name': name, 'address': address})
+
+    start = date.today() - timedelta(days=730)
+    chunk = []
+    for n in range(invoices):
+        day = start + timedelta(days=n * 730 // max(invoices, 1))
+        chunk.append(synthetic_invoice(rng, rng.choice(vendor_rows), day, items_per_invoice))
+        if len(chunk) >= chunk_size:
+            db.save_invoices_bulk(chunk)
+            chunk = []
+    if chunk:
+        db.save_invoices_bulk(chunk)
+
+    return vendor_rows
+
+
+# ------------------------------------------------------------
+# Benchmarks
+# ------------------------------------------------------------
+
+def bench_pdf(db, args, rendered):
+    from pdf_generator import generate_invoice_pdf
+
+    results = {}
+    rng = random.Random(args.seed)
+    ids = [row[0] for row in db.iter_invoice_pdf_paths()]
+    sample = rng.sample(ids, min(args.pdf_samples, len(ids)))
+    # A per-run suffix keeps every render a PDF cache miss
+    run = f"{int(time.time())}"
+
+    for template in ('classic', 'visual'):
+        samples = []
+        for invoice in db.get_invoices(sample):
+            data = invoice.to_invoice_data()
+            data['template'] = template
+            data['invoice_number'] = f"{data['invoice_number']}-B{run}-{template}"
+            started = time.perf_counter()
+            rendered.append(generate_invoice_pdf(data))
+            samples.append(time.perf_counter() - started)
+        results[f"pdf_{template}"] = summarize(samples)
+    return results
+
+
+def bench_excel(db, args):
+    from excel_export import export_invoices_to_excel
+
+    invoices = db.count_invoices()
+
+    def run():
+        export_invoices_to_excel(io.BytesIO(), include_items=True, include_totals=True)
+
+    samples = timed(run, max(1, args.repeat // 10))
+    stats = summarize(samples, units_per_sample=invoices)
+    stats['unit'] = 'invoices'
+    return {'excel_export': stats}
+
+
+def bench_list(db, args):
+    rng = random.Random(args.seed)
+    results = {}
+
+    first = db.list_invoices()
+    vendor_id = first['invoices'][0]['vendor_id'] if first['invoices'] else None
+
+    def deep_pages():
+        cursor = None
+        for _ in range(10):
+            page = db.list_invoices(cursor=cursor)
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+
+    cases = {
+        'list_first_page': lambda: db.list_invoices(),
+        'list_vendor_filter': lambda: db.list_invoices({'vendor_id': vendor_id}),
+        'list_date_filter': lambda: db.list_invoices({'date_from': (date.today() - timedelta(days=90)).isoformat()}),
+        'list_10_pages': deep_pages,
+        'count': lambda: db.count_invoices(),
+        'search_item': lambda: db.search_invoices(rng.choice(ITEM_NAMES)),
+        'search_lot_prefix': lambda: db.search_invoices(f"LOT-{rng.randrange(100):02d}"),
+        'search_vendor': lambda: db.search_invoices(f"{rng.choice(VENDOR_WORDS)} {rng.choice(VENDOR_SUFFIXES)}"),
+    }
+    for name, fn in cases.items():
+        results[name] = summarize(timed(fn, args.repeat))
+
+    results['get_all_invoices'] = summarize(timed(db.get_all_invoices, max(1, args.repeat // 10)))
+    return results
+
+
+def bench_create(db, args, vendors):
+    from server import app
+    from render_jobs import render_queue
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    samples = []
+    for _ in range(args.repeat):
+        payload = synthetic_invoice(rng, rng.choice(vendors), date.today(), args.items)
+        started = time.perf_counter()
+        response = client.post('/api/invoices', json=payload)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /api/invoices failed: {response.get_json()}")
+
+    # Let the queued renders finish so they don't bleed into the next run
+    render_queue.shutdown(wait=True)
+    return {'create_invoice': summarize(samples)}
+
+
+# ------------------------------------------------------------
+# Run
+# ------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BASE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _cleanup(db, rendered):
+    """Remove the PDFs and cache entries the benchmark produced."""
+    from pdf_cache import pdf_cache
+
+    with db.read() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pdf_path FROM render_jobs WHERE pdf_path IS NOT NULL")
+        rendered = rendered + [row['pdf_path'] for row in cursor.fetchall()]
+        cursor.execute("SELECT hash FROM pdf_cache")
+        cached = [pdf_cache.path(row['hash']) for row in cursor.fetchall()]
+
+    for path in set(rendered) | set(cached):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def compare(results, baseline_path):
+    """Print p50/p95 changes against an earlier results file."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+
+    print(f"\n📈 Compared with {baseline_path}")
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms'):
+            if old[key]:
+                changes.append(f"{key} {(stats[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"   {name:<20} {'  '.join(changes)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF, Excel, listing and creation paths")
+    parser.add_argument('--db', default=DEFAULT_DB, help="Synthetic database file (recreated)")
+    parser.add_argument('--reuse', action='store_true', help="Reuse an existing synthetic database")
+    parser.add_argument('--vendors', type=int, default=50)
+    parser.add_argument('--invoices', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=5, help="Line items per invoice")
+    parser.add_argument('--pdf-samples', type=int, default=20, help="Renders per template")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per query / creation benchmark")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', default=','.join(GROUPS), help="Comma-separated: " + ','.join(GROUPS))
+    parser.add_argument('--output', help="JSON results file")
+    parser.add_argument('--compare', help="Earlier JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    groups = [g.strip() for g in args.only.split(',') if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown benchmark group(s): {', '.join(sorted(unknown))}")
+
+    if os.path.abspath(args.db) == os.path.join(BASE_DIR, 'data', 'invoices.db'):
+        parser.error("refusing to benchmark against the real database")
+
+    db_exists = os.path.exists(args.db)
+    if not args.reuse or not db_exists:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    # Must be set before the app modules are imported; render processes inherit it
+    os.environ['INVOICE_DB_PATH'] = os.path.abspath(args.db)
+    from database import db
+
+    db.init()
+
+    started = time.perf_counter()
+    if args.reuse and db_exists:
+        vendors = [{'id': v['id'], 'name': v['name'], 'address': v['address']} for v in db.get_all_vendors()]
+    else:
+        print(f"🏗  Building {args.invoices} invoices x {args.items} items ({args.vendors} vendors)...")
+        vendors = build_database(db, args.vendors, args.invoices, args.items, args.seed)
+    build_seconds = time.perf_counter() - started
+
+    results = {}
+    rendered = []
+    try:
+        if 'list' in groups:
+            print("⏱  list / search")
+            results.update(bench_list(db, args))
+        if 'excel' in groups:
+            print("⏱  excel")
+            results.update(bench_excel(db, args))
+        if 'pdf' in groups:
+            print("⏱  pdf")
+            results.update(bench_pdf(db, args, rendered))
+        if 'create' in groups:
+            # Last: it leaves render processes busy
+            print("⏱  create")
+            results.update(bench_create(db, args, vendors))
+    finally:
+        _cleanup(db, rendered)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'vendors': len(vendors),
+            'invoices': db.count_invoices(),
+            'items_per_invoice': args.items,
+            'build_seconds': round(build_seconds, 3)
+        },
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'benchmark':<20} {'p50 ms':>10} {'p95 ms':>10} {'per s':>10}")
+    for name, stats in results.items():
+        print(f"{name:<20} {stats['p50_ms']:>10} {stats['p95_ms']:>10} {stats['throughput_per_s']:>10}")
+    print(f"\n✅ Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
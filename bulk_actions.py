@@ -0,0 +1,42 @@
+import os
+import time
+from database import db
+from zip_export import PDF_DIR, local_pdf_path
+
+
+# What happens to the PDFs of deleted invoices
+PDF_ACTIONS = ('trash', 'delete', 'keep')
+# trash: moved to pdfs/deleted/<time>/, out of reach of /pdfs/<filename>
+TRASH_DIR = os.path.join(PDF_DIR, 'deleted')
+
+
+def delete_invoices(filters, pdf_action='trash'):
+    """
+    Delete the invoices selected by ids/filters (one transaction), then
+    trash, delete or keep their PDF files.
+    """
+    if pdf_action not in PDF_ACTIONS:
+        raise ValueError(f"pdfs must be one of: {', '.join(PDF_ACTIONS)}")
+
+    deleted = db.delete_invoices(filters)
+
+    handled = missing = 0
+    trash = os.path.join(TRASH_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    if pdf_action != 'keep':
+        for _, _, pdf_path in deleted:
+            path = local_pdf_path(pdf_path)
+            if not path or not os.path.isfile(path):
+                missing += 1
+                continue
+            if pdf_action == 'delete':
+                os.remove(path)
+            else:
+                os.makedirs(trash, exist_ok=True)
+                os.replace(path, os.path.join(trash, os.path.basename(path)))
+            handled += 1
+
+    return {
+        'deleted': len(deleted),
+        'invoice_numbers': [number for _, number, _ in deleted],
+        'pdfs': {'action': pdf_action, 'handled': handled, 'missing': missing}
+    }
@@ -0,0 +1,355 @@
+"""
+Bulk invoice import from CSV / XLSX.
+
+One row per line item. Rows that share an invoice_number (or, when the
+number is left blank, an invoice_ref) are grouped into one invoice;
+blank numbers are reserved from the sequence in blocks. Invoices are inserted one chunk
+per transaction and their PDFs are handed to the render queue.
+
+Columns:
+    invoice_number, invoice_ref, date, type, vendor (name) or vendor_id,
+    hst_gst_number, tax_rate, shipping_cost, shipping_method,
+    shipping_terms, delivery_date, comments, terms_conditions, notes,
+    lot_number, item, quantity, units, unit_price
+
+Usage:
+    python bulk_import.py invoices.csv [--no-pdf] [--chunk-size 200]
+"""
+import os
+import io
+import csv
+import sys
+import math
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from database import db, normalize_name, is_duplicate_invoice_number
+from archive import archives
+from invoice_totals import ZERO, batch_totals
+from render_jobs import render_queue
+
+
+CHUNK_SIZE = 200
+
+INVOICE_FIELDS = (
+    'date', 'type', 'hst_gst_number', 'shipping_method', 'shipping_terms',
+    'delivery_date', 'comments', 'terms_conditions', 'notes'
+)
+
+
+# ------------------------------------------------------------
+# Readers
+# ------------------------------------------------------------
+
+def _clean_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def read_csv_rows(stream):
+    """Yield (row_number, dict) from a binary CSV stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    headers = [_clean_header(h) for h in next(reader, [])]
+    for row_number, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        yield row_number, dict(zip(headers, values))
+
+
+def read_xlsx_rows(stream):
+    """Yield (row_number, dict) from the first sheet of an XLSX file."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        headers = [_clean_header(h) for h in next(rows, ())]
+        for row_number, values in enumerate(rows, start=2):
+            if not any(v not in (None, '') for v in values):
+                continue
+            yield row_number, dict(zip(headers, values))
+    finally:
+        wb.close()
+
+
+def read_rows(stream, filename):
+    """Pick the reader from the file extension."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        return read_csv_rows(stream)
+    if ext in ('.xlsx', '.xlsm'):
+        return read_xlsx_rows(stream)
+    raise ValueError(f"Unsupported file type: {ext or filename}")
+
+
+# ------------------------------------------------------------
+# Validation
+# ------------------------------------------------------------
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    return str(value).strip()
+
+
+def _number(row, key, default=None):
+    value = _text(row, key)
+    if value == '':
+        if default is None:
+            raise ValueError(f"{key} is required")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{key} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{key} must be a number")
+    return number
+
+
+def parse_item(row):
+    """Validate the line-item columns of a row."""
+    item = _text(row, 'item')
+    if not item:
+        raise ValueError("item is required")
+
+    quantity = _number(row, 'quantity')
+    if quantity <= 0:
+        raise ValueError("quantity must be greater than 0")
+
+    unit_price = _number(row, 'unit_price')
+    if unit_price < 0:
+        raise ValueError("unit_price must not be negative")
+
+    units = _text(row, 'units')
+    if not units:
+        raise ValueError("units is required")
+
+    return {
+        'lot_number': _text(row, 'lot_number'),
+        'item': item,
+        'quantity': quantity,
+        'units': units,
+        'unit_price': unit_price
+    }
+
+
+def parse_invoice(row, vendors):
+    """Validate the invoice-level columns of the first row of a group."""
+    data = {field: _text(row, field) for field in INVOICE_FIELDS}
+
+    try:
+        datetime.strptime(data['date'], '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("date must be YYYY-MM-DD")
+    if not data['type']:
+        raise ValueError("type is required")
+
+    vendor = None
+    vendor_id = _text(row, 'vendor_id')
+    vendor_name = _text(row, 'vendor')
+    if vendor_id:
+        vendor = vendors['by_id'].get(vendor_id)
+    elif vendor_name:
+        vendor = vendors['by_name'].get(normalize_name(vendor_name))
+    if vendor is None:
+        raise ValueError(f"Unknown vendor: {vendor_id or vendor_name or '(blank)'}")
+
+    data.update({
+        'invoice_number': _text(row, 'invoice_number'),
+        'vendor_id': vendor['id'],
+        'vendor_name': vendor['name'],
+        'vendor_address': vendor['address'] or '',
+        'tax_rate': _number(row, 'tax_rate', 13.0),
+        'shipping_cost': _number(row, 'shipping_cost', 0.0),
+        'items': []
+    })
+    if not data['delivery_date']:
+        data.pop('delivery_date')
+    return data
+
+
+# ------------------------------------------------------------
+# Import
+# ------------------------------------------------------------
+
+def _group_key(row):
+    return _text(row, 'invoice_number') or _text(row, 'invoice_ref') or None
+
+
+def group_invoices(rows, vendors, errors):
+    """
+    Group consecutive rows into invoices.
+    Yields (invoice_data, row_numbers); invalid groups are reported in `errors`.
+    """
+    group = None
+
+    for row_number, row in rows:
+        key = _group_key(row)
+        if group is None or key is None or key != group['key']:
+            if group and not group['failed']:
+                yield group['invoice'], group['rows']
+            group = {'key': key, 'invoice': None, 'rows': [], 'failed': False}
+            try:
+                group['invoice'] = parse_invoice(row, vendors)
+            except ValueError as e:
+                errors.append({'row': row_number, 'error': str(e)})
+                group['failed'] = True
+
+        group['rows'].append(row_number)
+        try:
+            item = parse_item(row)
+            if not group['failed']:
+                group['invoice']['items'].append(item)
+        except ValueError as e:
+            errors.append({'row': row_number, 'error': str(e)})
+            group['failed'] = True
+
+    if group and not group['failed']:
+        yield group['invoice'], group['rows']
+
+
+def _load_vendors():
+    vendors = db.get_all_vendors()
+    return {
+        'by_id': {str(v['id']): v for v in vendors},
+        'by_name': {normalize_name(v['name']): v for v in vendors}
+    }
+
+
+def _save_chunk(chunk, created_by, errors, seen_numbers):
+    """Insert one chunk of invoices; missing numbers are reserved as one block."""
+    explicit = [inv for inv, _ in chunk if inv['invoice_number']]
+    taken = archives.existing_invoice_numbers(inv['invoice_number'] for inv in explicit)
+
+    valid, first_rows = [], []
+    for invoice, row_numbers in chunk:
+        number = invoice['invoice_number']
+        if number and (number in taken or number in seen_numbers):
+            errors.append({'row': row_numbers[0], 'error': f"Invoice number {number} already exists"})
+            continue
+        if number:
+            seen_numbers.add(number)
+        invoice['created_by'] = created_by
+        valid.append(invoice)
+        first_rows.append(row_numbers[0])
+
+    blank = [not invoice['invoice_number'] for invoice in valid]
+    _, totals = batch_totals(valid)
+    try:
+        ids = db.save_invoices_bulk(valid, totals)
+    except sqlite3.IntegrityError:
+        # A number was taken between the check above and the insert (e.g. a
+        # concurrent create): insert this chunk one invoice at a time
+        return _save_one_by_one(valid, totals, first_rows, blank, errors)
+    return list(zip(ids, valid, totals))
+
+
+def _save_one_by_one(invoices, totals, first_rows, blank, errors):
+    """Fallback for a chunk whose bulk insert was rolled back; failing rows go to `errors`."""
+    saved = []
+    for invoice, invoice_totals, row, was_blank in zip(invoices, totals, first_rows, blank):
+        if was_blank:
+            # The block reserved by the rolled-back insert was not kept
+            invoice['invoice_number'] = ''
+        try:
+            saved.append((db.save_invoice(invoice), invoice, invoice_totals))
+        except sqlite3.IntegrityError as e:
+            if is_duplicate_invoice_number(e):
+                errors.append({'row': row, 'error': f"Invoice number {invoice['invoice_number']} already exists"})
+            else:
+                errors.append({'row': row, 'error': str(e)})
+    return saved
+
+
+def import_invoices(stream, filename, created_by='Import', render_pdfs=True, chunk_size=CHUNK_SIZE):
+    """
+    Stream invoices from a CSV/XLSX file into the database.
+    Returns a report with per-row errors and throughput.
+    """
+    started = time.perf_counter()
+    errors = []
+    seen_numbers = set()
+    row_count = 0
+    invoice_ids = []
+    item_count = 0
+    render_job_ids = []
+    grand_total = ZERO
+
+    def counted(rows):
+        nonlocal row_count
+        for row in rows:
+            row_count += 1
+            yield row
+
+    vendors = _load_vendors()
+    chunk = []
+
+    def flush():
+        nonlocal item_count, grand_total
+        for invoice_id, invoice, totals in _save_chunk(chunk, created_by, errors, seen_numbers):
+            invoice_ids.append(invoice_id)
+            item_count += len(invoice['items'])
+            grand_total += totals.grand_total
+            if render_pdfs:
+                render_job_ids.append(render_queue.submit(invoice_id, invoice))
+        chunk.clear()
+
+    for group in group_invoices(counted(read_rows(stream, filename)), vendors, errors):
+        chunk.append(group)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda e: e['row'])
+
+    return {
+        'rows': row_count,
+        'imported_invoices': len(invoice_ids),
+        'imported_items': item_count,
+        'grand_total': float(grand_total),
+        'invoice_ids': invoice_ids,
+        'render_job_ids': render_job_ids,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(row_count / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import invoices from CSV/XLSX")
+    parser.add_argument('file', help="CSV or XLSX file")
+    parser.add_argument('--no-pdf', action='store_true', help="Do not render PDFs")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Invoices per transaction")
+    args = parser.parse_args(argv)
+
+    db.init()
+    with open(args.file, 'rb') as stream:
+        report = import_invoices(
+            stream,
+            args.file,
+            render_pdfs=not args.no_pdf,
+            chunk_size=args.chunk_size
+        )
+
+    for error in report['errors']:
+        print(f"❌ Row {error['row']}: {error['error']}")
+    print(f"✅ Imported {report['imported_invoices']} invoices ({report['imported_items']} items) "
+          f"from {report['rows']} rows in {report['seconds']}s "
+          f"({report['rows_per_second']} rows/s)")
+
+    if report['render_job_ids']:
+        print(f"📄 Rendering {len(report['render_job_ids'])} PDFs on {render_queue.workers} processes...")
+        render_queue.shutdown(wait=True)
+        print("✅ PDFs rendered")
+
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,310 @@
 import sqlite3
 import os
+import re
+import time
+import queue
+import base64
+import json
+import threading
+import unicodedata
+from contextlib import contextmanager
+from metrics import connection_factory
+from invoice_totals import batch_totals, compute_totals, invoice_totals
+
+
+# Default and maximum page size for the invoice list
+INVOICE_PAGE_SIZE = 50
+MAX_INVOICE_PAGE_SIZE = 500
+
+
+def encode_invoice_cursor(created_at, invoice_id):
+    """Encode the (created_at, id) position of the last row of a page."""
+    raw = f"{created_at}|{invoice_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_invoice_cursor(cursor):
+    """Decode a cursor produced by encode_invoice_cursor()."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, invoice_id = raw.rsplit('|', 1)
+        return created_at, int(invoice_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+def normalize_name(name):
+    """Case- and accent-insensitive form of a name, used to match and order vendors."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+# Vendor typeahead page size
+VENDOR_SEARCH_LIMIT = 20
+MAX_VENDOR_SEARCH_LIMIT = 200
+
+
+# Connection tuning
+READER_POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+WRITE_RETRIES = 5
+PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",      # ~20 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+INVOICE_STATUSES = ('Draft', 'Sent', 'Paid', 'Void')
+# status -> statuses an invoice may move to from it; Void is final
+STATUS_TRANSITIONS = {
+    'Draft': ('Sent', 'Paid', 'Void'),
+    'Sent': ('Draft', 'Paid', 'Void'),
+    'Paid': ('Sent', 'Void'),
+    'Void': (),
+}
+
+
+# Full-text search: one invoice_search row per invoice (rowid = invoice id)
+SEARCH_COLUMNS = ('invoice_number', 'vendor_name', 'vendor_address', 'items', 'lot_numbers', 'comments', 'notes')
+# bm25 weights, same order as SEARCH_COLUMNS
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 3.0, 8.0, 1.0, 1.0)
+SEARCH_PAGE_SIZE = 25
+
+SEARCH_INSERT_SQL = """
+    INSERT INTO invoice_search (rowid, invoice_number, vendor_name, vendor_address,
+                                items, lot_numbers, comments, notes)
+    SELECT i.id, i.invoice_number, COALESCE(v.name, ''), COALESCE(v.address, ''),
+           COALESCE((SELECT group_concat(item, ' ') FROM invoice_items WHERE invoice_id = i.id), ''),
+           COALESCE((SELECT group_concat(lot_number, ' ') FROM invoice_items WHERE invoice_id = i.id), ''),
+           COALESCE(i.comments, ''), COALESCE(i.notes, '')
+    FROM invoices i LEFT JOIN vendors v ON v.id = i.vendor_id
+    WHERE {where};
+"""
+
+
+def _search_refresh_sql(where):
+    """Statements that rebuild the search rows of the invoices matching `where`."""
+    return (
+        f"DELETE FROM invoice_search WHERE rowid IN (SELECT i.id FROM invoices i WHERE {where});"
+        + SEARCH_INSERT_SQL.format(where=where)
+    )
+
+
+# trigger name -> (event, body)
+SEARCH_TRIGGERS = {
+    'invoice_search_invoices_ai': (
+        "AFTER INSERT ON invoices",
+        SEARCH_INSERT_SQL.format(where="i.id = NEW.id")
+    ),
+    'invoice_search_invoices_au': (
+        "AFTER UPDATE OF invoice_number, vendor_id, comments, notes ON invoices",
+        "DELETE FROM invoice_search WHERE rowid = OLD.id;"
+        + SEARCH_INSERT_SQL.format(where="i.id = NEW.id")
+    ),
+    'invoice_search_invoices_ad': (
+        "AFTER DELETE ON invoices",
+        "DELETE FROM invoice_search WHERE rowid = OLD.id;"
+    ),
+    'invoice_search_items_ai': (
+        "AFTER INSERT ON invoice_items",
+        _search_refresh_sql("i.id = NEW.invoice_id")
+    ),
+    'invoice_search_items_au': (
+        "AFTER UPDATE ON invoice_items",
+        _search_refresh_sql("i.id = OLD.invoice_id") + _search_refresh_sql("i.id = NEW.invoice_id")
+    ),
+    'invoice_search_items_ad': (
+        # Not for the cascade of a deleted invoice: its row is already gone
+        "AFTER DELETE ON invoice_items WHEN EXISTS (SELECT 1 FROM invoices WHERE id = OLD.invoice_id)",
+        _search_refresh_sql("i.id = OLD.invoice_id")
+    ),
+    'invoice_search_vendors_au': (
+        "AFTER UPDATE OF name, address ON vendors",
+        _search_refresh_sql("i.vendor_id = NEW.id")
+    ),
+}
+# Triggers of older versions, dropped by init()
+RETIRED_SEARCH_TRIGGERS = ('invoice_search_vendors_ad',)
+
+
+def is_duplicate_invoice_number(error):
+    """True for the IntegrityError of an invoice_number that is already used."""
+    message = str(error)
+    return isinstance(error, sqlite3.IntegrityError) and 'UNIQUE' in message and 'invoices.invoice_number' in message
+
+
+def build_search_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match,
+    and the last word may be a prefix (search-as-you-type).
+    """
+    terms = [term.replace('"', '') for term in text.split()]
+    terms = [term for term in terms if term]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class InvoiceRecord:
+    """
+    Compact, read-only view of a loaded invoice: the joined invoice row
+    (vendor_* and signature_* columns included) plus its item rows.
+    Supports invoice['col'], invoice.col and invoice.get('col', default),
+    so it can be handed to templates like the dicts it replaces.
+    """
+
+    __slots__ = ('row', 'items')
+
+    def __init__(self, row, items):
+        self.row = row
+        self.items = items
+
+    def __getitem__(self, key):
+        if key == 'items':
+            return self.items
+        if key == 'signature':
+            return self.signature
+        return self.row[key]
+
+    def __getattr__(self, key):
+        try:
+            return self.row[key]
+        except IndexError:
+            raise AttributeError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except IndexError:
+            return default
+        return default if value is None else value
+
+    def keys(self):
+        return list(self.row.keys()) + ['items', 'signature']
+
+    @property
+    def signature(self):
+        if self.row['signature_id'] is None or self.row['signature_name'] is None:
+            return None
+        return {
+            'id': self.row['signature_id'],
+            'name': self.row['signature_name'],
+            'position': self.row['signature_position'] or '',
+            # Older rows store a full (possibly Windows) path, newer ones a file name
+            'image': os.path.basename((self.row['signature_image_path'] or '').replace('\\', '/')) or None
+        }
+
+    def to_invoice_data(self):
+        """Plain dict in the shape generate_invoice_pdf() and the render queue take."""
+        # Leave NULL columns out so the renderer's defaults apply
+        data = {key: value for key, value in dict(self.row).items() if value is not None}
+        data['items'] = [dict(item) for item in self.items]
+        if self.signature:
+            data['signature'] = self.signature
+        return data
+
+
+class ConnectionPool:
+    """
+    SQLite connections for a multi-threaded server.
+
+    - WAL journal mode, so readers never block on the writer
+    - a pool of reader connections, each used by one thread at a time
+    - one writer connection; writes are serialized by a lock and run in
+      BEGIN IMMEDIATE transactions, retried while another process holds
+      the database lock
+    """
+
+    def __init__(self, db_path, readers=READER_POOL_SIZE):
+        self.db_path = db_path
+        self._readers = queue.LifoQueue(maxsize=readers)
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL")
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly below
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            factory=connection_factory()
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """
+        Borrow a reader connection for the duration of the block.
+        A new connection is opened when all pooled ones are busy; at most
+        `readers` idle connections are kept.
+        """
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _begin(self, conn):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+
+    @contextmanager
+    def write(self):
+        """
+        Run the block in a write transaction on the writer connection.
+        Commits on success, rolls back on error. Nested calls from the
+        same thread join the outer transaction.
+        """
+        with self._write_lock:
+            depth = getattr(self._local, 'depth', 0)
+            if depth:
+                self._local.depth = depth + 1
+                try:
+                    yield self._writer
+                finally:
+                    self._local.depth = depth
+                return
+
+            self._begin(self._writer)
+            self._local.depth = 1
+            try:
+                yield self._writer
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.depth = 0
+
+    def vacuum(self):
+        """Run VACUUM on the writer connection; other writes wait for it."""
+        with self._write_lock:
+            self._writer.execute("VACUUM")
+
 
 class Database:
     """
@@ -12,15 +317,35 @@ class Database:
     - HST/GST Settings
     """
 
-    def __init__(self):
-        """Initialize database connection and ensure directory exists."""
-        self.db_path = os.path.join(os.path.dirname(__file__), 'data', 'invoices.db')
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+    def __init__(self, db_path=None):
+        """Resolve the database path; the connection is opened on first use."""
+        # INVOICE_DB_PATH points the app (and its render processes) at another file
+        self.db_path = (
+            db_path
+            or os.environ.get('INVOICE_DB_PATH')
+            or os.path.join(os.path.dirname(__file__), 'data', 'invoices.db')
+        )
+        # Connected on first use, so importing this module costs nothing
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                    self._pool = ConnectionPool(self.db_path)
+                    print("✅ Connected to SQLite database")
+        return self._pool
 
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+    def read(self):
+        """Context manager yielding a pooled reader connection."""
+        return self.pool.read()
 
-        print("✅ Connected to SQLite database")
+    def write(self):
+        """Context manager yielding the writer connection inside a transaction."""
+        return self.pool.write()
 
     # ============================================================
     # Database Initialization
@@ -28,7 +353,16 @@ class Database:
 
     def init(self):
         """Create all required tables if they do not exist."""
-        cursor = self.conn.cursor()
+        with self.write() as conn:
+            self._create_tables(conn.cursor())
+        print("✅ Database tables initialized")
+
+    def vacuum(self):
+        """Rebuild the database file to give the space of deleted rows back."""
+        self.pool.vacuum()
+
+    def _create_tables(self, cursor):
+        """Schema and indexes, run inside the init() transaction."""
 
         # ---------------- Vendors ----------------
         cursor.execute('''
@@ -41,6 +375,29 @@ class Database:
             )
         ''')
 
+        # name_key = normalize_name(name), set by add_vendor/update_vendor
+        if self._add_missing_columns(cursor, 'vendors', {'name_key': 'TEXT'}):
+            cursor.execute("SELECT id, name FROM vendors")
+            cursor.executemany(
+                "UPDATE vendors SET name_key = ? WHERE id = ?",
+                [(normalize_name(row['name']), row['id']) for row in cursor.fetchall()]
+            )
+
+        # Bumped by triggers on every vendor change, so each process knows
+        # when its cached vendor list is stale
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vendor_cache (
+                id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO vendor_cache (id, version) VALUES (1, 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS vendor_cache_{event.lower()} AFTER {event} ON vendors
+                BEGIN UPDATE vendor_cache SET version = version + 1 WHERE id = 1; END
+            """)
+
         # ---------------- Signatures ----------------
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS signatures (
@@ -74,12 +431,24 @@ class Database:
                 status TEXT DEFAULT 'Draft',
                 created_by TEXT,
                 pdf_path TEXT,
+                subtotal REAL DEFAULT 0,
+                tax REAL DEFAULT 0,
+                grand_total REAL DEFAULT 0,
+                template TEXT DEFAULT 'classic',
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (vendor_id) REFERENCES vendors(id),
                 FOREIGN KEY (signature_id) REFERENCES signatures(id)
             )
         ''')
 
+        # Databases created before totals were stored: add + backfill them
+        if self._add_missing_columns(cursor, 'invoices', {
+            'subtotal': 'REAL DEFAULT 0',
+            'tax': 'REAL DEFAULT 0',
+            'grand_total': 'REAL DEFAULT 0'
+        }):
+            self._backfill_invoice_totals(cursor)
+
         # ---------------- Invoice Items ----------------
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS invoice_items (
@@ -90,10 +459,82 @@ class Database:
                 quantity REAL NOT NULL,
                 units TEXT NOT NULL,
                 unit_price REAL NOT NULL,
-                FOREIGN KEY (invoice_id) REFERENCES invoices(id)
+                FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
             )
         ''')
 
+        # ---------------- PDF Render Jobs ----------------
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS render_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                payload TEXT NOT NULL,
+                pdf_path TEXT,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Tables created before deletes cascaded: rebuild them (their
+        # indexes and triggers are recreated further down)
+        for table in ('invoice_items', 'render_jobs'):
+            self._cascade_invoice_deletes(cursor, table)
+
+        # Invoices saved before the template was stored: take it from their last render job
+        if self._add_missing_columns(cursor, 'invoices', {'template': "TEXT DEFAULT 'classic'"}):
+            cursor.execute("""
+                UPDATE invoices SET template = COALESCE((
+                    SELECT json_extract(payload, '$.template') FROM render_jobs
+                    WHERE render_jobs.invoice_id = invoices.id
+                    ORDER BY render_jobs.id DESC LIMIT 1
+                ), 'classic')
+            """)
+
+        # ---------------- Invoice Number Sequence ----------------
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invoice_sequences (
+                name TEXT PRIMARY KEY,
+                prefix TEXT NOT NULL,
+                padding INTEGER NOT NULL,
+                next_value INTEGER NOT NULL
+            )
+        ''')
+
+        # Seeded once from the existing invoices; after that every number
+        # comes from the sequence row and no scan is needed.
+        # (An aggregate always yields a row, so OR IGNORE - not a WHERE - skips reseeding.)
+        cursor.execute("""
+            INSERT OR IGNORE INTO invoice_sequences (name, prefix, padding, next_value)
+            SELECT 'invoice', 'MWR-', 3,
+                   COALESCE(MAX(CAST(SUBSTR(invoice_number, 5) AS INTEGER)), 0) + 1
+            FROM invoices
+        """)
+
+        # ---------------- PDF Cache ----------------
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pdf_cache (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                render_seconds REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pdf_cache_stats (
+                id INTEGER PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                saved_seconds REAL NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute("INSERT OR IGNORE INTO pdf_cache_stats (id) VALUES (1)")
+
         # ---------------- Company Settings ----------------
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings_extended (
@@ -109,6 +550,28 @@ class Database:
 
         cursor.execute("INSERT OR IGNORE INTO settings_extended (id) VALUES (1)")
 
+        # ---------------- Render Cache Version ----------------
+        # Bumped whenever settings, logo or signatures change so every
+        # process drops its cached PDF rendering context.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS render_cache (
+                id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute("INSERT OR IGNORE INTO render_cache (id, version) VALUES (1, 0)")
+
+        # ---------------- Sessions ----------------
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
         # ---------------- HST/GST Settings ----------------
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
@@ -122,8 +585,106 @@ class Database:
             VALUES (1, '747957900 RT0001')
         """)
 
-        self.conn.commit()
-        print("✅ Database tables initialized")
+        # ---------------- Indexes ----------------
+        # created_at + rowid gives the keyset order of the invoice list;
+        # the filter indexes carry created_at so filtered pages stay ordered.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON invoices (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_vendor ON invoices (vendor_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices (status, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items (invoice_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendors_name_key ON vendors (name_key)")
+        # Covering index for the reports: date-range GROUP BYs never touch the table
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_invoices_report ON invoices
+            (date, vendor_id, type, tax_rate, subtotal, tax, shipping_cost, grand_total)
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_status ON render_jobs (status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_invoice ON render_jobs (invoice_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pdf_cache_last_used ON pdf_cache (last_used)")
+
+        # ---------------- Full-Text Search ----------------
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'invoice_search'")
+        search_exists = cursor.fetchone() is not None
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+                {', '.join(SEARCH_COLUMNS)},
+                tokenize = "unicode61 remove_diacritics 2 tokenchars '-_/'"
+            )
+        """)
+
+        for name, (event, body) in SEARCH_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+        # Vendors used by invoices cannot be deleted, so nothing to refresh
+        for name in RETIRED_SEARCH_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+        if not search_exists:
+            cursor.execute(SEARCH_INSERT_SQL.format(where="1"))
+
+    @staticmethod
+    def _cascade_invoice_deletes(cursor, table):
+        """
+        Rebuild an invoice child table whose foreign key lacks ON DELETE
+        CASCADE. Rows of invoices that no longer exist are dropped.
+        """
+        cursor.execute(f"PRAGMA foreign_key_list({table})")
+        if all(row['on_delete'] == 'CASCADE' for row in cursor.fetchall() if row['table'] == 'invoices'):
+            return
+
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        create_sql = cursor.fetchone()['sql']
+        cascading = re.sub(
+            r'REFERENCES\s+invoices\s*\(\s*id\s*\)(?!\s+ON\s+DELETE)',
+            'REFERENCES invoices(id) ON DELETE CASCADE',
+            create_sql,
+            flags=re.IGNORECASE
+        )
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = ', '.join(row['name'] for row in cursor.fetchall())
+
+        cursor.execute(re.sub(rf'\b{table}\b', f'{table}_rebuild', cascading, count=1))
+        cursor.execute(f"""
+            INSERT INTO {table}_rebuild ({columns})
+            SELECT {columns} FROM {table}
+            WHERE invoice_id IN (SELECT id FROM invoices)
+        """)
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+
+    @staticmethod
+    def _add_missing_columns(cursor, table, columns):
+        """ALTER TABLE ADD COLUMN for each missing column. Returns True if any were added."""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row['name'] for row in cursor.fetchall()}
+        added = False
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                added = True
+        return added
+
+    @staticmethod
+    def _backfill_invoice_totals(cursor):
+        cursor.execute("SELECT id, tax_rate, shipping_cost FROM invoices ORDER BY id")
+        invoices = cursor.fetchall()
+        position = {row['id']: idx for idx, row in enumerate(invoices)}
+
+        cursor.execute("SELECT invoice_id, quantity, unit_price FROM invoice_items")
+        lines = [(position[row[0]], row[1], row[2]) for row in cursor.fetchall() if row[0] in position]
+        invoice_index, quantities, unit_prices = zip(*lines) if lines else ((), (), ())
+
+        _, totals = compute_totals(
+            invoice_index, quantities, unit_prices,
+            [row['tax_rate'] or 0 for row in invoices],
+            [row['shipping_cost'] for row in invoices]
+        )
+        cursor.executemany(
+            "UPDATE invoices SET subtotal = ?, tax = ?, grand_total = ? WHERE id = ?",
+            [(*t.as_floats(), row['id']) for row, t in zip(invoices, totals)]
+        )
 
     # ============================================================
     # HST / GST Settings
@@ -131,16 +692,17 @@ class Database:
 
     def get_default_hst_gst(self):
         """Return the stored HST/GST number."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT default_hst_gst_number FROM settings WHERE id = 1")
-        row = cursor.fetchone()
-        return row['default_hst_gst_number'] if row else '747957900 RT0001'
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT default_hst_gst_number FROM settings WHERE id = 1")
+            row = cursor.fetchone()
+            return row['default_hst_gst_number'] if row else '747957900 RT0001'
 
     def set_default_hst_gst(self, number):
         """Update the HST/GST number."""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE settings SET default_hst_gst_number = ? WHERE id = 1", (number,))
-        self.conn.commit()
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE settings SET default_hst_gst_number = ? WHERE id = 1", (number,))
 
     # ============================================================
     # Signatures
@@ -148,178 +710,892 @@ class Database:
 
     def get_all_signatures(self):
         """Return all signatures."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM signatures ORDER BY created_at DESC")
-        return [dict(row) for row in cursor.fetchall()]
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM signatures ORDER BY created_at DESC")
+            return [dict(row) for row in cursor.fetchall()]
 
     def get_default_signature(self):
         """Return the default signature."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM signatures WHERE is_default = 1 LIMIT 1")
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM signatures WHERE is_default = 1 LIMIT 1")
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_signature(self, sig_id):
+        """Return one signature."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM signatures WHERE id = ?", (sig_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
 
     def add_signature(self, name, position, image_path):
         """Insert a new signature."""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO signatures (name, position, image_path)
-            VALUES (?, ?, ?)
-        ''', (name, position, image_path))
-        self.conn.commit()
-        return cursor.lastrowid
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO signatures (name, position, image_path)
+                VALUES (?, ?, ?)
+            ''', (name, position, image_path))
+            return cursor.lastrowid
 
     def set_default_signature(self, signature_id):
         """Set a signature as default."""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE signatures SET is_default = 0")
-        cursor.execute("UPDATE signatures SET is_default = 1 WHERE id = ?", (signature_id,))
-        self.conn.commit()
-
-    def update_signature(self, sig_id, name, position):
-        self.query("UPDATE signatures SET name=?, position=? WHERE id=?", (name, position, sig_id))
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE signatures SET is_default = 0")
+            cursor.execute("UPDATE signatures SET is_default = 1 WHERE id = ?", (signature_id,))
 
-    def delete_signature(self, sig_id):
-        self.query("DELETE FROM signatures WHERE id=?", (sig_id,))
-
-    # ✅ ADD THESE TWO FUNCTIONS RIGHT HERE
     def update_signature(self, sig_id, name, position):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE signatures SET name=?, position=? WHERE id=?",
-            (name, position, sig_id)
-        )
-        conn.commit()
-        conn.close()
+        """Rename a signature / change its position."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE signatures SET name = ?, position = ? WHERE id = ?",
+                (name, position, sig_id)
+            )
 
+    def update_signature_image(self, sig_id, image_path):
+        """Point a signature at another stored image file."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE signatures SET image_path = ? WHERE id = ?",
+                (image_path, sig_id)
+            )
 
     def delete_signature(self, sig_id):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM signatures WHERE id=?", (sig_id,))
-        conn.commit()
-        conn.close()
-
+        """Delete a signature. Raises ValueError while invoices still use it."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM invoices WHERE signature_id = ?", (sig_id,))
+            used = cursor.fetchone()[0]
+            if used:
+                raise ValueError(f"Signature is used by {used} invoice(s) and cannot be deleted")
+            cursor.execute("DELETE FROM signatures WHERE id = ?", (sig_id,))
 
     # ============================================================
     # Vendors
     # ============================================================
 
     def get_all_vendors(self):
-        """Return all vendors sorted alphabetically."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM vendors ORDER BY name ASC")
-        return [dict(row) for row in cursor.fetchall()]
+        """Return all vendors sorted alphabetically (case and accents ignored)."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, address, contact, created_at
+                FROM vendors ORDER BY name_key, id
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def search_vendors(self, query, limit=VENDOR_SEARCH_LIMIT):
+        """
+        Vendors whose name starts with `query`, then those containing it,
+        ignoring case and accents. An empty query returns the first vendors.
+        """
+        limit = max(1, min(int(limit), MAX_VENDOR_SEARCH_LIMIT))
+        key = normalize_name(query)
+        with self.read() as conn:
+            cursor = conn.cursor()
+            if not key:
+                cursor.execute("""
+                    SELECT id, name, address, contact, created_at
+                    FROM vendors ORDER BY name_key, id LIMIT ?
+                """, (limit,))
+                return [dict(row) for row in cursor.fetchall()]
+
+            # A range on idx_vendors_name_key rather than LIKE: the default
+            # case-insensitive LIKE cannot use a BINARY index, and the keys
+            # may contain % and _
+            cursor.execute("""
+                SELECT id, name, address, contact, created_at
+                FROM vendors
+                WHERE name_key >= ? AND name_key < ?
+                ORDER BY name_key, id LIMIT ?
+            """, (key, key + '\U0010ffff', limit))
+            matches = [dict(row) for row in cursor.fetchall()]
+            if len(matches) < limit:
+                # Substring matches need a scan; only when the prefix ones run short
+                cursor.execute("""
+                    SELECT id, name, address, contact, created_at
+                    FROM vendors
+                    WHERE instr(name_key, ?) > 1
+                    ORDER BY name_key, id LIMIT ?
+                """, (key, limit - len(matches)))
+                matches.extend(dict(row) for row in cursor.fetchall())
+            return matches
+
+    def get_vendor_version(self):
+        """Counter bumped by every vendor insert, update and delete."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM vendor_cache WHERE id = 1")
+            return cursor.fetchone()['version']
 
     def add_vendor(self, name, address, contact):
         """Insert a new vendor."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO vendors (name, address, contact)
-            VALUES (?, ?, ?)
-        """, (name, address, contact))
-        self.conn.commit()
-        return cursor.lastrowid
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO vendors (name, address, contact, name_key)
+                VALUES (?, ?, ?, ?)
+            """, (name, address, contact, normalize_name(name)))
+            return cursor.lastrowid
 
     def update_vendor(self, vendor_id, name, address, contact):
         """Update vendor details."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            UPDATE vendors
-            SET name = ?, address = ?, contact = ?
-            WHERE id = ?
-        """, (name, address, contact, vendor_id))
-        self.conn.commit()
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE vendors
+                SET name = ?, address = ?, contact = ?, name_key = ?
+                WHERE id = ?
+            """, (name, address, contact, normalize_name(name), vendor_id))
 
     def delete_vendor(self, vendor_id):
-        """Delete a vendor."""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM vendors WHERE id = ?", (vendor_id,))
-        self.conn.commit()
+        """Delete a vendor. Raises ValueError while invoices still use it."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM invoices WHERE vendor_id = ?", (vendor_id,))
+            used = cursor.fetchone()[0]
+            if used:
+                raise ValueError(f"Vendor is used by {used} invoice(s) and cannot be deleted")
+            cursor.execute("DELETE FROM vendors WHERE id = ?", (vendor_id,))
 
     # ============================================================
     # Invoices
     # ============================================================
 
+    # ============================================================
+    # Invoice Number Sequence
+    # ============================================================
+
+    INVOICE_SEQUENCE = 'invoice'
+
+    @staticmethod
+    def _format_number(prefix, padding, value):
+        return f"{prefix}{str(value).zfill(padding)}"
+
+    def get_invoice_sequence(self):
+        """Return the sequence settings: prefix, padding and next_value."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT prefix, padding, next_value FROM invoice_sequences WHERE name = ?",
+                (self.INVOICE_SEQUENCE,)
+            )
+            return dict(cursor.fetchone())
+
+    def update_invoice_sequence(self, prefix=None, padding=None, next_value=None):
+        """Change the prefix / padding, or move the sequence forward."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE invoice_sequences
+                SET prefix = COALESCE(?, prefix),
+                    padding = COALESCE(?, padding),
+                    next_value = MAX(next_value, COALESCE(?, next_value))
+                WHERE name = ?
+            """, (prefix, padding, next_value, self.INVOICE_SEQUENCE))
+
     def get_next_invoice_number(self):
-        """Generate the next invoice number in the format MWR-XXX."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT MAX(CAST(SUBSTR(invoice_number, 5) AS INTEGER)) AS max_num FROM invoices")
-        row = cursor.fetchone()
-        next_num = (row['max_num'] or 0) + 1
-        return f"MWR-{str(next_num).zfill(3)}"
+        """
+        Return the number the next invoice will get (format MWR-XXX by default).
+        This only peeks; numbers are handed out by reserve_invoice_numbers().
+        """
+        seq = self.get_invoice_sequence()
+        return self._format_number(seq['prefix'], seq['padding'], seq['next_value'])
 
-    def save_invoice(self, invoice_data):
-        """Insert invoice and its items."""
-        cursor = self.conn.cursor()
+    def reserve_invoice_numbers(self, count=1):
+        """Atomically reserve a block of `count` consecutive invoice numbers."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT prefix, padding, next_value FROM invoice_sequences WHERE name = ?",
+                (self.INVOICE_SEQUENCE,)
+            )
+            seq = cursor.fetchone()
+            cursor.execute(
+                "UPDATE invoice_sequences SET next_value = next_value + ? WHERE name = ?",
+                (count, self.INVOICE_SEQUENCE)
+            )
 
-        cursor.execute('''
-            INSERT INTO invoices (
-                invoice_number, date, type, vendor_id, hst_gst_number,
-                comments, terms_conditions, signature_id, shipping_method,
-                shipping_terms, delivery_date, tax_rate, shipping_cost,
-                notes, created_by
+        start = seq['next_value']
+        return [
+            self._format_number(seq['prefix'], seq['padding'], value)
+            for value in range(start, start + count)
+        ]
+
+    def _assign_invoice_numbers(self, invoices):
+        """
+        Give invoices without a number one from the sequence, and move the
+        sequence past explicit numbers so it never hands them out again.
+        Must run inside the write transaction that inserts the invoices.
+        """
+        # Read through the writer: a reader would not see this transaction
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT prefix FROM invoice_sequences WHERE name = ?",
+                (self.INVOICE_SEQUENCE,)
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            prefix = cursor.fetchone()['prefix']
+
+        highest = 0
+        for inv in invoices:
+            number = inv.get('invoice_number') or ''
+            if number.startswith(prefix) and number[len(prefix):].isdigit():
+                highest = max(highest, int(number[len(prefix):]))
+        if highest:
+            self.update_invoice_sequence(next_value=highest + 1)
+
+        missing = [inv for inv in invoices if not inv.get('invoice_number')]
+        numbers = []
+        while len(numbers) < len(missing):
+            block = self.reserve_invoice_numbers(len(missing) - len(numbers))
+            # Skip numbers already used, e.g. typed in before the sequence reached them
+            with self.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT invoice_number FROM invoices WHERE invoice_number IN ({', '.join('?' for _ in block)})",
+                    block
+                )
+                used = {row['invoice_number'] for row in cursor.fetchall()}
+            numbers += [number for number in block if number not in used]
+        for inv, number in zip(missing, numbers):
+            inv['invoice_number'] = number
+
+    def existing_invoice_numbers(self, numbers):
+        """Return the subset of `numbers` that are already used."""
+        numbers = list(numbers)
+        if not numbers:
+            return set()
+        with self.read() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' for _ in numbers)
+            cursor.execute(f"SELECT invoice_number FROM invoices WHERE invoice_number IN ({placeholders})", numbers)
+            return {row['invoice_number'] for row in cursor.fetchall()}
+
+    INSERT_INVOICE_SQL = '''
+        INSERT INTO invoices (
+            invoice_number, date, type, vendor_id, hst_gst_number,
+            comments, terms_conditions, signature_id, shipping_method,
+            shipping_terms, delivery_date, tax_rate, shipping_cost,
+            notes, created_by, template, subtotal, tax, grand_total
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    INSERT_ITEM_SQL = '''
+        INSERT INTO invoice_items (invoice_id, lot_number, item, quantity, units, unit_price)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+
+    @staticmethod
+    def _invoice_values(invoice_data, totals=None):
+        if totals is None:
+            _, totals = invoice_totals(invoice_data)
+        return (
             invoice_data['invoice_number'],
             invoice_data['date'],
             invoice_data['type'],
-            invoice_data.get('vendor_id'),
+            invoice_data.get('vendor_id') or None,
             invoice_data.get('hst_gst_number'),
             invoice_data.get('comments'),
             invoice_data.get('terms_conditions'),
-            invoice_data.get('signature_id'),
+            invoice_data.get('signature_id') or None,
             invoice_data.get('shipping_method'),
             invoice_data.get('shipping_terms'),
             invoice_data.get('delivery_date'),
             invoice_data.get('tax_rate', 13.0),
             invoice_data.get('shipping_cost', 0),
             invoice_data.get('notes'),
-            invoice_data.get('created_by', 'User')
-        ))
+            invoice_data.get('created_by', 'User'),
+            invoice_data.get('template') or 'classic',
+            *totals.as_floats()
+        )
+
+    @staticmethod
+    def _item_values(invoice_id, item):
+        return (
+            invoice_id,
+            item.get('lot_number'),
+            item['item'],
+            item['quantity'],
+            item['units'],
+            item['unit_price']
+        )
+
+    def save_invoice(self, invoice_data):
+        """
+        Insert invoice and its items.
+        A missing invoice_number is taken from the sequence and written
+        back into `invoice_data`.
+        """
+        with self.write() as conn:
+            cursor = conn.cursor()
 
-        invoice_id = cursor.lastrowid
+            self._assign_invoice_numbers([invoice_data])
+            cursor.execute(self.INSERT_INVOICE_SQL, self._invoice_values(invoice_data))
+            invoice_id = cursor.lastrowid
 
-        # Insert invoice items
-        for item in invoice_data.get('items', []):
-            cursor.execute('''
-                INSERT INTO invoice_items (invoice_id, lot_number, item, quantity, units, unit_price)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                invoice_id,
-                item.get('lot_number'),
-                item['item'],
-                item['quantity'],
-                item['units'],
-                item['unit_price']
-            ))
-
-        self.conn.commit()
-        return invoice_id
+            # Insert invoice items
+            cursor.executemany(self.INSERT_ITEM_SQL, [
+                self._item_values(invoice_id, item)
+                for item in invoice_data.get('items', [])
+            ])
+
+            return invoice_id
+
+    def save_invoices_bulk(self, invoices, totals=None):
+        """
+        Insert many invoices and their items in a single transaction.
+        Missing invoice numbers are reserved from the sequence as one block.
+        `totals` ([InvoiceTotals]) is computed for the batch when not given.
+        Returns the new invoice ids in the same order as `invoices`.
+        """
+        if not invoices:
+            return []
+
+        with self.write() as conn:
+            cursor = conn.cursor()
+            self._assign_invoice_numbers(invoices)
+            if totals is None:
+                # Totals of the whole batch in one pass over its line items
+                _, totals = batch_totals(invoices)
+            cursor.executemany(self.INSERT_INVOICE_SQL, [
+                self._invoice_values(inv, inv_totals) for inv, inv_totals in zip(invoices, totals)
+            ])
+
+            numbers = [inv['invoice_number'] for inv in invoices]
+            placeholders = ', '.join('?' for _ in numbers)
+            cursor.execute(f"SELECT id, invoice_number FROM invoices WHERE invoice_number IN ({placeholders})", numbers)
+            ids = {row['invoice_number']: row['id'] for row in cursor.fetchall()}
+
+            cursor.executemany(self.INSERT_ITEM_SQL, [
+                self._item_values(ids[inv['invoice_number']], item)
+                for inv in invoices
+                for item in inv.get('items', [])
+            ])
+
+        return [ids[number] for number in numbers]
 
     def update_invoice_pdf_path(self, invoice_id, pdf_path):
         """Store the generated PDF path."""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE invoices SET pdf_path = ? WHERE id = ?", (pdf_path, invoice_id))
-        self.conn.commit()
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE invoices SET pdf_path = ? WHERE id = ?", (pdf_path, invoice_id))
 
     def get_all_invoices(self):
         """Return all invoices with vendor + signature info."""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT i.*, 
-                   v.name AS vendor_name, 
-                   v.address AS vendor_address,
-                   s.name AS signature_name, 
-                   s.position AS signature_position
-            FROM invoices i
-            LEFT JOIN vendors v ON i.vendor_id = v.id
-            LEFT JOIN signatures s ON i.signature_id = s.id
-            ORDER BY i.created_at DESC
-        ''')
-        return [dict(row) for row in cursor.fetchall()]
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT i.*, 
+                       v.name AS vendor_name, 
+                       v.address AS vendor_address,
+                       s.name AS signature_name, 
+                       s.position AS signature_position
+                FROM invoices i
+                LEFT JOIN vendors v ON i.vendor_id = v.id
+                LEFT JOIN signatures s ON i.signature_id = s.id
+                ORDER BY i.created_at DESC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _invoice_filter_sql(self, filters):
+        """
+        Build WHERE clauses for the invoice list filters.
+        Supported keys: date_from, date_to, vendor_id, type, status, number_prefix, ids.
+        """
+        filters = filters or {}
+        clauses = []
+        params = []
+
+        if filters.get('ids') is not None:
+            # One JSON parameter instead of one placeholder per id
+            clauses.append("i.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(i) for i in filters['ids']]))
+
+        if filters.get('date_from'):
+            clauses.append("i.date >= ?")
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            clauses.append("i.date <= ?")
+            params.append(filters['date_to'])
+        if filters.get('vendor_id'):
+            clauses.append("i.vendor_id = ?")
+            params.append(int(filters['vendor_id']))
+        if filters.get('type'):
+            clauses.append("i.type = ?")
+            params.append(filters['type'])
+        if filters.get('status'):
+            clauses.append("i.status = ?")
+            params.append(filters['status'])
+        if filters.get('number_prefix'):
+            # Range instead of LIKE so the UNIQUE index on invoice_number is used
+            prefix = filters['number_prefix']
+            clauses.append("i.invoice_number >= ? AND i.invoice_number < ?")
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+
+        return clauses, params
+
+    def list_invoices(self, filters=None, cursor=None, limit=INVOICE_PAGE_SIZE):
+        """
+        Return one page of invoices, newest first, using keyset pagination.
+        Result: {'invoices': [...], 'next_cursor': str or None}
+        """
+        limit = max(1, min(int(limit or INVOICE_PAGE_SIZE), MAX_INVOICE_PAGE_SIZE))
+        clauses, params = self._invoice_filter_sql(filters)
+
+        if cursor:
+            created_at, invoice_id = decode_invoice_cursor(cursor)
+            clauses.append("(i.created_at, i.id) < (?, ?)")
+            params.extend([created_at, invoice_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.read() as conn:
+            cur = conn.cursor()
+            cur.execute(f'''
+                SELECT i.*,
+                       v.name AS vendor_name,
+                       v.address AS vendor_address,
+                       s.name AS signature_name,
+                       s.position AS signature_position
+                FROM invoices i
+                LEFT JOIN vendors v ON i.vendor_id = v.id
+                LEFT JOIN signatures s ON i.signature_id = s.id
+                {where}
+                ORDER BY i.created_at DESC, i.id DESC
+                LIMIT ?
+            ''', params + [limit + 1])
+            rows = cur.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_invoice_cursor(last['created_at'], last['id'])
+
+        return {
+            'invoices': [dict(row) for row in rows],
+            'next_cursor': next_cursor
+        }
+
+    def count_invoices(self, filters=None):
+        """Return the number of invoices matching the list filters."""
+        clauses, params = self._invoice_filter_sql(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM invoices i {where}", params)
+            return cursor.fetchone()[0]
+
+    def iter_invoice_pdf_paths(self, filters=None, batch_size=500):
+        """Yield (id, invoice_number, pdf_path) for the matching invoices, oldest first."""
+        clauses, params = self._invoice_filter_sql(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT i.id, i.invoice_number, i.pdf_path
+                FROM invoices i
+                {where}
+                ORDER BY i.date, i.id
+            """, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield tuple(row)
+
+    # ============================================================
+    # Bulk Invoice Operations
+    # ============================================================
+
+    def _bulk_where(self, filters):
+        """`id IN (...)` condition for the invoices selected by ids/filters."""
+        clauses, params = self._invoice_filter_sql(filters)
+        if not clauses:
+            raise ValueError("Select invoices by ids or filters first")
+        return f"id IN (SELECT i.id FROM invoices i WHERE {' AND '.join(clauses)})", params
+
+    def delete_invoices(self, filters):
+        """
+        Delete the matching invoices in one statement; their items and
+        render jobs are removed by ON DELETE CASCADE.
+        Returns [(id, invoice_number, pdf_path)] of the deleted invoices.
+        """
+        where, params = self._bulk_where(filters)
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM invoices WHERE {where} RETURNING id, invoice_number, pdf_path",
+                params
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def set_invoice_status(self, filters, status):
+        """
+        Move the matching invoices to `status` in one statement, where
+        STATUS_TRANSITIONS allows it.
+        Returns {'updated', 'unchanged', 'rejected'} counts.
+        """
+        if status not in INVOICE_STATUSES:
+            raise ValueError(f"Status must be one of: {', '.join(INVOICE_STATUSES)}")
+        sources = [source for source, targets in STATUS_TRANSITIONS.items() if status in targets]
+        where, params = self._bulk_where(filters)
+
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT COUNT(*) AS matched,
+                       COALESCE(SUM(COALESCE(status, 'Draft') = ?), 0) AS unchanged
+                FROM invoices WHERE {where}
+            """, [status, *params])
+            counts = cursor.fetchone()
+            cursor.execute(f"""
+                UPDATE invoices SET status = ?
+                WHERE {where}
+                  AND COALESCE(status, 'Draft') IN (SELECT value FROM json_each(?))
+            """, [status, *params, json.dumps(sources)])
+            updated = cursor.rowcount
+
+        return {
+            'updated': updated,
+            'unchanged': counts['unchanged'],
+            'rejected': counts['matched'] - counts['unchanged'] - updated
+        }
+
+    # ============================================================
+    # Invoice Details
+    # ============================================================
+
+    DETAIL_SQL = '''
+        SELECT i.*,
+               v.name AS vendor_name,
+               v.address AS vendor_address,
+               v.contact AS vendor_contact,
+               s.name AS signature_name,
+               s.position AS signature_position,
+               s.image_path AS signature_image_path
+        FROM invoices i
+        LEFT JOIN vendors v ON v.id = i.vendor_id
+        LEFT JOIN signatures s ON s.id = i.signature_id
+        WHERE i.id IN (SELECT value FROM json_each(?))
+    '''
+
+    DETAIL_ITEMS_SQL = '''
+        SELECT invoice_id, lot_number, item, quantity, units, unit_price
+        FROM invoice_items
+        WHERE invoice_id IN (SELECT value FROM json_each(?))
+        ORDER BY invoice_id, id
+    '''
+
+    def get_invoices(self, invoice_ids):
+        """
+        Load invoices with vendor, signature and line items in two queries,
+        however many ids are asked for. Returns InvoiceRecords in the order
+        of `invoice_ids`; unknown ids are skipped.
+        """
+        ids = json.dumps([int(i) for i in invoice_ids])
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.DETAIL_SQL, (ids,))
+            rows = {row['id']: row for row in cursor.fetchall()}
+
+            items = {invoice_id: [] for invoice_id in rows}
+            cursor.execute(self.DETAIL_ITEMS_SQL, (ids,))
+            for item in cursor.fetchall():
+                items[item['invoice_id']].append(item)
+
+        return [
+            InvoiceRecord(rows[invoice_id], items[invoice_id])
+            for invoice_id in dict.fromkeys(int(i) for i in invoice_ids)
+            if invoice_id in rows
+        ]
+
+    def get_invoice(self, invoice_id):
+        """Load one invoice (see get_invoices). Returns None if it does not exist."""
+        invoices = self.get_invoices([invoice_id])
+        return invoices[0] if invoices else None
+
+    def iter_invoices(self, filters=None, batch_size=200):
+        """Yield InvoiceRecords matching the list filters, oldest first, one batch at a time."""
+        batch = []
+        for invoice_id, _, _ in self.iter_invoice_pdf_paths(filters):
+            batch.append(invoice_id)
+            if len(batch) >= batch_size:
+                yield from self.get_invoices(batch)
+                batch = []
+        if batch:
+            yield from self.get_invoices(batch)
+
+    # ============================================================
+    # Full-Text Search
+    # ============================================================
+
+    def search_invoices(self, text, filters=None, offset=0, limit=SEARCH_PAGE_SIZE):
+        """
+        Ranked full-text search over invoice numbers, vendor names and
+        addresses, item descriptions, lot numbers, comments and notes.
+        Result: {'results': [...], 'next_offset': int or None}
+        """
+        match = build_search_query(text or '')
+        if match is None:
+            return {'results': [], 'next_offset': None}
+
+        limit = max(1, min(int(limit or SEARCH_PAGE_SIZE), MAX_INVOICE_PAGE_SIZE))
+        offset = max(0, int(offset or 0))
+        clauses, params = self._invoice_filter_sql(filters)
+        where = ''.join(f" AND {clause}" for clause in clauses)
+        weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT i.id, i.invoice_number, i.date, i.type, i.status, i.pdf_path,
+                       i.grand_total,
+                       v.name AS vendor_name,
+                       snippet(invoice_search, -1, '[', ']', '…', 10) AS snippet,
+                       bm25(invoice_search, {weights}) AS rank
+                FROM invoice_search
+                JOIN invoices i ON i.id = invoice_search.rowid
+                LEFT JOIN vendors v ON v.id = i.vendor_id
+                WHERE invoice_search MATCH ?{where}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, [match] + params + [limit + 1, offset])
+            rows = cursor.fetchall()
+
+        next_offset = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_offset = offset + limit
+
+        return {
+            'results': [dict(row) for row in rows],
+            'next_offset': next_offset
+        }
+
+    # ============================================================
+    # Reports
+    # ============================================================
+
+    # dimension -> (key expression, label expression)
+    REPORT_DIMENSIONS = {
+        'vendor': ("i.vendor_id", "COALESCE((SELECT name FROM vendors WHERE id = i.vendor_id), 'N/A')"),
+        'month': ("SUBSTR(i.date, 1, 7)", "SUBSTR(i.date, 1, 7)"),
+        'type': ("i.type", "i.type"),
+        'tax_rate': ("i.tax_rate", "i.tax_rate"),
+    }
+
+    def spend_report(self, dimension, filters=None):
+        """
+        Invoice count and summed totals grouped by vendor, month, type or tax rate.
+        Runs entirely in SQL over the stored totals.
+        """
+        if dimension not in self.REPORT_DIMENSIONS:
+            raise ValueError(f"Unknown report: {dimension}")
+        key, label = self.REPORT_DIMENSIONS[dimension]
+
+        clauses, params = self._invoice_filter_sql(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {key} AS key,
+                       {label} AS label,
+                       COUNT(*) AS invoices,
+                       ROUND(SUM(i.subtotal), 2) AS subtotal,
+                       ROUND(SUM(i.tax), 2) AS tax,
+                       ROUND(SUM(i.shipping_cost), 2) AS shipping,
+                       ROUND(SUM(i.grand_total), 2) AS grand_total
+                FROM invoices i
+                {where}
+                GROUP BY {key}
+                ORDER BY {'key' if dimension == 'month' else 'grand_total DESC'}
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    # ============================================================
+    # Excel Export
+    # ============================================================
+
+    # sheet -> (select expressions, FROM/JOIN clause, GROUP/ORDER clause)
+    EXPORT_QUERIES = {
+        'invoices': (
+            [
+                "i.invoice_number", "i.date", "i.type", "COALESCE(v.name, 'N/A')",
+                "i.status", "i.created_by", "i.pdf_path"
+            ],
+            "FROM invoices i LEFT JOIN vendors v ON i.vendor_id = v.id",
+            "ORDER BY i.created_at DESC, i.id DESC"
+        ),
+        'items': (
+            [
+                "i.invoice_number", "i.date", "COALESCE(v.name, 'N/A')", "ii.lot_number",
+                "ii.item", "ii.quantity", "ii.units", "ii.unit_price"
+                # + the line total, added by excel_export with invoice_totals.line_total
+            ],
+            "FROM invoice_items ii JOIN invoices i ON ii.invoice_id = i.id "
+            "LEFT JOIN vendors v ON i.vendor_id = v.id",
+            "ORDER BY i.created_at DESC, i.id DESC, ii.id"
+        ),
+        'totals': (
+            [
+                "i.invoice_number", "i.date", "COALESCE(v.name, 'N/A')", "i.subtotal",
+                "i.tax_rate", "i.tax", "ROUND(i.shipping_cost, 2)", "i.grand_total"
+            ],
+            "FROM invoices i LEFT JOIN vendors v ON i.vendor_id = v.id",
+            "ORDER BY i.created_at DESC, i.id DESC"
+        ),
+    }
+
+    def _export_sql(self, sheet, filters):
+        columns, from_sql, tail_sql = self.EXPORT_QUERIES[sheet]
+        clauses, params = self._invoice_filter_sql(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        select = ', '.join(f"{expr} AS c{idx}" for idx, expr in enumerate(columns))
+        return f"SELECT {select} {from_sql} {where} {tail_sql}", params, len(columns)
+
+    def iter_export_rows(self, sheet, filters=None, batch_size=500):
+        """Yield the rows of an export sheet as tuples, straight from the cursor."""
+        sql, params, _ = self._export_sql(sheet, filters)
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield tuple(row)
+
+    def export_column_lengths(self, sheet, filters=None):
+        """Return the longest text length of every column of an export sheet."""
+        sql, params, count = self._export_sql(sheet, filters)
+        lengths = ', '.join(f"MAX(LENGTH(COALESCE(c{idx}, '')))" for idx in range(count))
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {lengths} FROM ({sql})", params)
+            return [length or 0 for length in cursor.fetchone()]
+
+    # ============================================================
+    # PDF Render Jobs
+    # ============================================================
+
+    def create_render_job(self, invoice_id, invoice_data):
+        """Queue a PDF render for an invoice. Returns the job id."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO render_jobs (invoice_id, status, payload)
+                VALUES (?, 'queued', ?)
+            """, (invoice_id, json.dumps(invoice_data)))
+            return cursor.lastrowid
+
+    def update_render_job(self, job_id, status, pdf_path=None, error=None):
+        """Move a render job to a new status (queued/rendering/done/failed)."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE render_jobs
+                SET status = ?, pdf_path = COALESCE(?, pdf_path), error = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, pdf_path, error, job_id))
+
+    def get_render_job(self, job_id):
+        """Return a render job without its payload."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, invoice_id, status, pdf_path, error, created_at, updated_at
+                FROM render_jobs WHERE id = ?
+            """, (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_unfinished_render_jobs(self):
+        """Return queued/rendering jobs (with payload) left over from a previous run."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, invoice_id, payload FROM render_jobs
+                WHERE status IN ('queued', 'rendering')
+                ORDER BY id
+            """)
+            return [
+                {'id': row['id'], 'invoice_id': row['invoice_id'], 'invoice_data': json.loads(row['payload'])}
+                for row in cursor.fetchall()
+            ]
+
+    # ============================================================
+    # PDF Cache
+    # ============================================================
+
+    def add_pdf_cache_entry(self, pdf_hash, size, render_seconds):
+        """Record a freshly rendered PDF (a cache miss)."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO pdf_cache (hash, size, render_seconds, hits, last_used)
+                VALUES (?, ?, ?, 0, ?)
+            """, (pdf_hash, size, render_seconds, time.time()))
+            cursor.execute("UPDATE pdf_cache_stats SET misses = misses + 1 WHERE id = 1")
+
+    def record_pdf_cache_hit(self, pdf_hash):
+        """Mark a cached PDF as used and count the render time it saved."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE pdf_cache SET hits = hits + 1, last_used = ?
+                WHERE hash = ?
+            """, (time.time(), pdf_hash))
+            cursor.execute("""
+                UPDATE pdf_cache_stats
+                SET hits = hits + 1,
+                    saved_seconds = saved_seconds +
+                        COALESCE((SELECT render_seconds FROM pdf_cache WHERE hash = ?), 0)
+                WHERE id = 1
+            """, (pdf_hash,))
+
+    def pdf_cache_overflow(self, max_bytes):
+        """Return the least recently used hashes that push the cache over max_bytes."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT hash FROM (
+                    SELECT hash, SUM(size) OVER (ORDER BY last_used DESC) AS running
+                    FROM pdf_cache
+                )
+                WHERE running > ?
+            """, (max_bytes,))
+            return [row['hash'] for row in cursor.fetchall()]
+
+    def remove_pdf_cache_entries(self, hashes):
+        """Forget evicted cache entries."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM pdf_cache WHERE hash = ?", [(h,) for h in hashes])
+
+    def get_pdf_cache_stats(self):
+        """Return hit/miss counters plus the current cache size."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT hits, misses, saved_seconds FROM pdf_cache_stats WHERE id = 1")
+            stats = dict(cursor.fetchone())
+            cursor.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes FROM pdf_cache")
+            stats.update(dict(cursor.fetchone()))
+            return stats
 
     # ============================================================
     # Company Settings
@@ -327,32 +1603,93 @@ class Database:
 
     def get_settings(self):
         """Return company settings."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM settings_extended WHERE id = 1")
-        row = cursor.fetchone()
-        return dict(row) if row else {}
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM settings_extended WHERE id = 1")
+            row = cursor.fetchone()
+            return dict(row) if row else {}
+
+    SETTINGS_FIELDS = (
+        'company_name', 'company_address', 'company_phone',
+        'default_logo_path', 'default_shipping_method', 'default_shipping_terms'
+    )
 
     def update_settings(self, data):
-        """Update company settings."""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE settings_extended
-            SET company_name = ?,
-                company_address = ?,
-                company_phone = ?,
-                default_logo_path = ?,
-                default_shipping_method = ?,
-                default_shipping_terms = ?
-            WHERE id = 1
-        ''', (
-            data.get('company_name'),
-            data.get('company_address'),
-            data.get('company_phone'),
-            data.get('default_logo_path'),
-            data.get('default_shipping_method'),
-            data.get('default_shipping_terms')
-        ))
-        self.conn.commit()
+        """
+        Update company settings.
+        Keys missing from `data` keep their current value.
+        """
+        current = self.get_settings()
+        values = {field: data.get(field, current.get(field)) for field in self.SETTINGS_FIELDS}
+        if all(values[field] == current.get(field) for field in self.SETTINGS_FIELDS):
+            return
+
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE settings_extended
+                SET company_name = ?,
+                    company_address = ?,
+                    company_phone = ?,
+                    default_logo_path = ?,
+                    default_shipping_method = ?,
+                    default_shipping_terms = ?
+                WHERE id = 1
+            ''', tuple(values[field] for field in self.SETTINGS_FIELDS))
+            self.bump_render_version()
+
+    # ============================================================
+    # Render Cache Version
+    # ============================================================
+
+    def get_render_version(self):
+        """Return the current render cache version."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM render_cache WHERE id = 1")
+            row = cursor.fetchone()
+            return row['version'] if row else 0
+
+    def bump_render_version(self):
+        """Invalidate cached PDF rendering state in every process."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE render_cache SET version = version + 1 WHERE id = 1")
+
+    # ============================================================
+    # Sessions
+    # ============================================================
+
+    def get_session(self, session_id):
+        """Return the stored data of an unexpired session, or None."""
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                (session_id, time.time())
+            )
+            row = cursor.fetchone()
+            return (json.loads(row['data']), row['expires_at']) if row else None
+
+    def save_session(self, session_id, data, expires_at):
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            """, (session_id, json.dumps(data, separators=(',', ':')), expires_at))
+
+    def delete_session(self, session_id):
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_expired_sessions(self):
+        """Delete every expired session in one statement. Returns the number removed."""
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
 
 
 # Create global instance
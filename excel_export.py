@@ -1,23 +1,22 @@
-import os
-import tempfile
+import queue
+import threading
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from archive import archives
+from invoice_totals import ZERO, line_total, to_cents, to_decimal
 
 
-def export_invoices_to_excel(invoices):
-    """
-    Export invoice records to an Excel file.
-    Returns the full path to the generated .xlsx file.
-    """
+MAX_COLUMN_WIDTH = 50
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Invoices"
+# Bytes buffered before a chunk is handed to the HTTP response
+STREAM_CHUNK_SIZE = 64 * 1024
+# Chunks that may wait in the pipe (bounds memory to ~1 MB)
+STREAM_QUEUE_SIZE = 16
 
-    # ------------------------------------------------------------
-    # Headers
-    # ------------------------------------------------------------
-    headers = [
+SHEETS = {
+    'invoices': ('Invoices', [
         'Invoice Number',
         'Date',
         'Type',
@@ -25,54 +24,180 @@ def export_invoices_to_excel(invoices):
         'Status',
         'Created By',
         'PDF Path'
-    ]
+    ]),
+    'items': ('Line Items', [
+        'Invoice Number',
+        'Date',
+        'Vendor',
+        'Lot Number',
+        'Item',
+        'Quantity',
+        'Units',
+        'Unit Price',
+        'Line Total'
+    ]),
+    'totals': ('Totals', [
+        'Invoice Number',
+        'Date',
+        'Vendor',
+        'Subtotal',
+        'Tax Rate (%)',
+        'Tax',
+        'Shipping',
+        'Grand Total'
+    ]),
+}
 
-    ws.append(headers)
 
-    # Make header bold
-    for cell in ws[1]:
+def _bold_row(ws, values):
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
         cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+
+def _start_sheet(wb, sheet, filters):
+    """Create a write-only sheet with sized columns and a bold, frozen header."""
+    title, headers = SHEETS[sheet]
+    ws = wb.create_sheet(title)
+
+    # Write-only sheets emit column widths before the first row,
+    # so the widths come from a MAX(LENGTH()) pass over the same query.
+    lengths = archives.export_column_lengths(sheet, filters)
+    if sheet == 'items':
+        # Line totals are computed in Python: quantity x unit price has at
+        # most as many digits as the two together
+        lengths.append(lengths[5] + lengths[7])
+    for idx, (header, length) in enumerate(zip(headers, lengths), start=1):
+        width = min(max(len(header), length) + 2, MAX_COLUMN_WIDTH)
+        ws.column_dimensions[get_column_letter(idx)].width = width
 
     # Freeze header row
     ws.freeze_panes = "A2"
 
-    # ------------------------------------------------------------
-    # Data rows
-    # ------------------------------------------------------------
-    for inv in invoices:
-        ws.append([
-            inv.get('invoice_number', '') or '',
-            inv.get('date', '') or '',
-            inv.get('type', '') or '',
-            inv.get('vendor_name', 'N/A') or 'N/A',
-            inv.get('status', '') or '',
-            inv.get('created_by', '') or '',
-            inv.get('pdf_path', '') or ''
-        ])
-
-    # ------------------------------------------------------------
-    # Auto-size columns (max width 50)
-    # ------------------------------------------------------------
-    for col in ws.columns:
-        max_length = 0
-        column_letter = col[0].column_letter
-
-        for cell in col:
+    ws.append(_bold_row(ws, headers))
+    return ws
+
+
+def _write_sheet(wb, sheet, filters):
+    """Stream one sheet from SQLite into a write-only workbook."""
+    ws = _start_sheet(wb, sheet, filters)
+    for row in archives.iter_export_rows(sheet, filters):
+        ws.append(row)
+
+
+def _write_items_sheet(wb, filters):
+    """Line items, with line totals rounded the way the invoice PDF rounds them."""
+    ws = _start_sheet(wb, 'items', filters)
+    for row in archives.iter_export_rows('items', filters):
+        ws.append((*row, float(line_total(row[5], row[7]))))
+
+
+def _write_totals_sheet(wb, filters):
+    """Per-invoice totals plus a summary row."""
+    ws = _start_sheet(wb, 'totals', filters)
+
+    subtotal = tax = shipping = grand_total = ZERO
+    for row in archives.iter_export_rows('totals', filters):
+        ws.append(row)
+        subtotal += to_decimal(row[3])
+        tax += to_decimal(row[5])
+        shipping += to_decimal(row[6])
+        grand_total += to_decimal(row[7])
+
+    ws.append([])
+    ws.append(_bold_row(ws, [
+        'TOTAL', None, None, float(to_cents(subtotal)), None,
+        float(to_cents(tax)), float(to_cents(shipping)), float(to_cents(grand_total))
+    ]))
+
+
+def export_invoices_to_excel(dest, filters=None, include_items=False, include_totals=False):
+    """
+    Export the invoice registry to an Excel file.
+
+    Rows are read from SQLite with a cursor and written through a
+    write-only workbook, so memory stays flat however many invoices exist.
+    `dest` is a path or a writable file object; `filters` takes the same
+    keys as the invoice list.
+    """
+    wb = Workbook(write_only=True)
+
+    _write_sheet(wb, 'invoices', filters)
+    if include_items:
+        _write_items_sheet(wb, filters)
+    if include_totals:
+        _write_totals_sheet(wb, filters)
+
+    wb.save(dest)
+    return dest
+
+
+class _PipeWriter:
+    """Write-only file object that hands buffered chunks to a reader thread."""
+
+    def __init__(self):
+        self.chunks = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.buffer = bytearray()
+        self.cancelled = threading.Event()
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
             try:
-                value = str(cell.value)
-                if len(value) > max_length:
-                    max_length = len(value)
-            except Exception:
-                pass
-
-        ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
-
-    # ------------------------------------------------------------
-    # Save to temp file
-    # ------------------------------------------------------------
-    safe_pid = str(os.getpid())
-    temp_filename = f"invoice_registry_{safe_pid}.xlsx"
-    temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-
-    wb.save(temp_path)
-    return temp_path
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise IOError("Export cancelled by client")
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= STREAM_CHUNK_SIZE:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+def stream_invoices_to_excel(filters=None, include_items=False, include_totals=False):
+    """
+    Build the registry workbook in a background thread and yield the
+    .xlsx bytes as they are produced. No shared temp file is used.
+    """
+    pipe = _PipeWriter()
+    done = object()
+
+    def produce():
+        try:
+            export_invoices_to_excel(pipe, filters, include_items, include_totals)
+            pipe.close()
+            pipe._put(done)
+        except Exception as e:
+            if not pipe.cancelled.is_set():
+                print(f"❌ Excel export failed: {e}")
+                try:
+                    pipe._put(e)
+                except IOError:
+                    pass
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            chunk = pipe.chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        pipe.cancelled.set()
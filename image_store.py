@@ -0,0 +1,109 @@
+"""
+Content-addressed storage for uploaded signature and logo images.
+
+An upload is stored under the sha256 of its bytes, so the same image
+uploaded twice is kept once and a new image never replaces an older one
+that shares its file name. Images are downscaled at upload time to twice
+the size the invoice templates draw them (sharp in print, small in every
+PDF) and re-encoded as PNG.
+
+Pillow (listed in requirements.txt) is imported on the first upload,
+not when the server starts.
+
+`python image_store.py` moves images uploaded before this storage existed
+into it and repoints the signatures and the company logo at them.
+"""
+import io
+import os
+import hashlib
+from database import db
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HASH_LENGTH = 20
+
+IMAGE_KINDS = {
+    # .logo-img is drawn 180px wide
+    'logo': {
+        'folder': os.path.join(BASE_DIR, 'public'),
+        'prefix': 'logo-',
+        'max_size': (360, 720),
+    },
+    # .signature-img is drawn at most 80px high
+    'signature': {
+        'folder': os.path.join(BASE_DIR, 'signatures'),
+        'prefix': 'sig-',
+        'max_size': (800, 160),
+    },
+}
+
+
+def normalize_image(image, max_size):
+    """Upright, downscaled RGB/RGBA copy of a PIL image."""
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail(max_size, Image.LANCZOS)
+    return image
+
+
+def store_image(stream, kind):
+    """
+    Store an uploaded image (a file-like object) and return the absolute
+    path of the stored PNG. Raises ValueError if it is not a readable image.
+    """
+    from PIL import Image
+
+    profile = IMAGE_KINDS[kind]
+    data = stream.read()
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    path = os.path.join(profile['folder'], f"{profile['prefix']}{digest}.png")
+    if os.path.exists(path):
+        return path
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = normalize_image(image, profile['max_size'])
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError('File is not a readable image') from e
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+
+    os.makedirs(profile['folder'], exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _is_stored(path, kind):
+    name = os.path.basename(path.replace('\\', '/'))
+    return name.startswith(IMAGE_KINDS[kind]['prefix']) and name.endswith('.png')
+
+
+def migrate_existing():
+    """Store every signature/logo file still kept under its upload name."""
+    migrated = 0
+    for sig in db.get_all_signatures():
+        path = sig['image_path']
+        if _is_stored(path, 'signature') or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            db.update_signature_image(sig['id'], store_image(f, 'signature'))
+        migrated += 1
+
+    logo_path = db.get_settings().get('default_logo_path')
+    if logo_path and not _is_stored(logo_path, 'logo') and os.path.isfile(logo_path):
+        with open(logo_path, 'rb') as f:
+            db.update_settings({'default_logo_path': store_image(f, 'logo')})
+        migrated += 1
+    return migrated
+
+
+if __name__ == '__main__':
+    db.init()
+    print(f"🖼️  Moved {migrate_existing()} image(s) into content-addressed storage")
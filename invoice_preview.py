@@ -0,0 +1,116 @@
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+from pdf_generator import render_context, build_template_data, template_name_for
+
+
+# Template blocks that are rendered once per distinct input and reused;
+# everything outside them (line items, totals) is rendered on every request.
+FRAGMENT_BLOCKS = {
+    'header': (
+        'COMPANY_NAME', 'COMPANY_ADDRESS', 'COMPANY_PHONE', 'LOGO_IMAGE',
+        'customer_name', 'customer_address', 'customer_city', 'customer_phone', 'customer_email'
+    ),
+    'vendor': (
+        'vendor_name', 'vendor_address', 'vendor_city', 'vendor_phone', 'vendor_email',
+        'shipping_method', 'shipping_terms', 'delivery_date', 'INVOICE_NUMBER', 'DATE'
+    ),
+    'terms': ('COMMENTS', 'TERMS_CONDITIONS'),
+    'signature': ('SIGNATURE_NAME', 'SIGNATURE_POSITION', 'SIGNATURE_IMAGE'),
+}
+
+MAX_FRAGMENTS = 512
+
+# Extends the real template and swaps each cacheable block for its cached HTML
+FRAGMENT_OVERRIDES = '{% extends BASE_TEMPLATE %}' + ''.join(
+    f'{{% block {name} %}}{{{{ FRAGMENTS.{name} }}}}{{% endblock %}}' for name in FRAGMENT_BLOCKS
+)
+
+
+class FragmentRenderer:
+    """
+    Renders invoice templates with the static sections (company header,
+    vendor block, terms, signature) cached as HTML fragments, so a draft
+    edit only re-renders the line items and totals.
+    """
+
+    def __init__(self, max_fragments=MAX_FRAGMENTS):
+        self.max_fragments = max_fragments
+        self._fragments = OrderedDict()
+        self._overrides = {}
+        self._lock = threading.Lock()
+
+    def _fragment(self, base, name, template_data):
+        # The template object is part of the key: an edited template file is
+        # reloaded by Jinja as a new object, which makes old fragments unreachable.
+        key = (base, name, tuple(str(template_data.get(field)) for field in FRAGMENT_BLOCKS[name]))
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+                return html
+
+        # Already escaped by the template; Markup keeps the overrides from escaping it again
+        html = Markup(''.join(base.blocks[name](base.new_context(template_data))))
+        with self._lock:
+            self._fragments[key] = html
+            while len(self._fragments) > self.max_fragments:
+                self._fragments.popitem(last=False)
+        return html
+
+    def render(self, template_name, template_data):
+        base = render_context.get_template(template_name)
+        overrides = self._overrides.get(base)
+        if overrides is None:
+            overrides = self._overrides[base] = render_context.env.from_string(FRAGMENT_OVERRIDES)
+
+        fragments = {name: self._fragment(base, name, template_data) for name in FRAGMENT_BLOCKS}
+        return overrides.render(BASE_TEMPLATE=base, FRAGMENTS=fragments, **template_data)
+
+
+fragment_renderer = FragmentRenderer()
+
+
+def _number(value, default=0.0):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+def normalize_draft(draft):
+    """Make unsaved form data safe to render: numeric fields, placeholders."""
+    data = dict(draft or {})
+    data['invoice_number'] = data.get('invoice_number') or 'DRAFT'
+    data['date'] = data.get('date') or ''
+    data['tax_rate'] = _number(data.get('tax_rate'), 13.0)
+    data['shipping_cost'] = _number(data.get('shipping_cost'))
+    data['items'] = [
+        {
+            'lot_number': item.get('lot_number', ''),
+            'item': item.get('item', ''),
+            'quantity': _number(item.get('quantity')),
+            'units': item.get('units', ''),
+            'unit_price': _number(item.get('unit_price'))
+        }
+        for item in data.get('items') or []
+    ]
+    return data
+
+
+def draft_etag(draft):
+    """ETag of a draft preview: the draft itself plus the settings/assets version."""
+    render_context.refresh()
+    payload = json.dumps([render_context.version, draft], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def render_draft_preview(draft):
+    """HTML preview of an unsaved invoice, exactly as the PDF would show it."""
+    render_context.refresh()
+    data = normalize_draft(draft)
+    return fragment_renderer.render(template_name_for(data), build_template_data(data))
@@ -0,0 +1,134 @@
+"""
+Invoice totals with exact decimal rounding.
+
+Every place that shows or stores a total (the PDF, the database columns
+used by search and reports, exports) computes it here, with one set of
+rules:
+
+    line total   = quantity x unit price, rounded to the cent
+    subtotal     = sum of the rounded line totals
+    tax          = subtotal x tax rate / 100, rounded to the cent
+    grand total  = subtotal + tax + shipping (shipping rounded to the cent)
+
+Rounding is ROUND_HALF_UP on Decimal values, so 2.675 is 2.68 and not the
+2.67 that float rounding gives. Floats are converted through their
+shortest repr (0.1 -> Decimal('0.1')), never their binary expansion.
+
+The engine is columnar: `compute_totals` takes the line items of any
+number of invoices as parallel arrays plus an invoice index per line and
+computes everything in a single pass over the lines, which is how bulk
+import and the totals backfill feed it whole batches.
+"""
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from typing import NamedTuple
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+DEFAULT_TAX_RATE = 13
+
+
+class InvoiceTotals(NamedTuple):
+    subtotal: Decimal
+    tax: Decimal
+    shipping: Decimal
+    grand_total: Decimal
+
+    def as_floats(self):
+        """(subtotal, tax, grand_total) for the REAL columns of `invoices`."""
+        return float(self.subtotal), float(self.tax), float(self.grand_total)
+
+
+def to_decimal(value):
+    """Exact Decimal for a number, numeric string, None or ''."""
+    if isinstance(value, Decimal):
+        return value
+    if value is None or value == '':
+        return ZERO
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        result = Decimal(value)
+    except (InvalidOperation, TypeError) as e:
+        raise ValueError(f"Not a number: {value!r}") from e
+    if not result.is_finite():
+        raise ValueError(f"Not a number: {value!r}")
+    return result
+
+
+def to_cents(value):
+    return to_decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def line_total(quantity, unit_price):
+    """Rounded total of one line item."""
+    return (to_decimal(quantity) * to_decimal(unit_price)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def sum_amounts(values):
+    """Exact sum of cent amounts (e.g. stored totals) for report/summary rows."""
+    return sum((to_decimal(value) for value in values), ZERO).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compute_totals(invoice_index, quantities, unit_prices, tax_rates, shipping_costs):
+    """
+    Totals for many invoices from columnar arrays.
+
+    `invoice_index`, `quantities` and `unit_prices` describe the lines:
+    line i belongs to invoice `invoice_index[i]` (0 .. n-1). `tax_rates`
+    and `shipping_costs` have one entry per invoice. Returns
+    (line totals, [InvoiceTotals per invoice]).
+    """
+    count = len(tax_rates)
+    if len(shipping_costs) != count:
+        raise ValueError("tax_rates and shipping_costs must have one entry per invoice")
+
+    quantize = Decimal.quantize
+    convert = to_decimal
+    subtotals = [ZERO] * count
+    lines = []
+    append = lines.append
+    for idx, quantity, unit_price in zip(invoice_index, quantities, unit_prices, strict=True):
+        amount = quantize(convert(quantity) * convert(unit_price), CENT, ROUND_HALF_UP)
+        append(amount)
+        subtotals[idx] += amount
+
+    invoices = []
+    for subtotal, rate, shipping in zip(subtotals, tax_rates, shipping_costs):
+        if rate is None or rate == '':
+            rate = DEFAULT_TAX_RATE
+        tax = (subtotal * convert(rate) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        shipping = to_cents(shipping)
+        invoices.append(InvoiceTotals(subtotal, tax, shipping, subtotal + tax + shipping))
+    return lines, invoices
+
+
+def batch_totals(invoices):
+    """
+    Totals for a list of invoice dicts (with 'items', 'tax_rate' and
+    'shipping_cost'), computed in one columnar pass. The dicts are not
+    modified. Returns (line totals per invoice, [InvoiceTotals]).
+    """
+    invoice_index, quantities, unit_prices = [], [], []
+    for idx, invoice in enumerate(invoices):
+        for item in invoice.get('items') or []:
+            invoice_index.append(idx)
+            quantities.append(item['quantity'])
+            unit_prices.append(item['unit_price'])
+
+    lines, totals = compute_totals(
+        invoice_index, quantities, unit_prices,
+        [invoice.get('tax_rate', DEFAULT_TAX_RATE) for invoice in invoices],
+        [invoice.get('shipping_cost', 0) for invoice in invoices]
+    )
+
+    per_invoice = [[] for _ in invoices]
+    for idx, amount in zip(invoice_index, lines):
+        per_invoice[idx].append(amount)
+    return per_invoice, totals
+
+
+def invoice_totals(invoice_data):
+    """(line totals, InvoiceTotals) of one invoice dict."""
+    lines, totals = batch_totals([invoice_data])
+    return lines[0], totals[0]
@@ -0,0 +1,357 @@
+"""
+Opt-in instrumentation.
+
+INVOICE_METRICS=1
+    Per-route request latency, per-phase PDF rendering timers and SQL
+    statement timing, served in Prometheus text format at /metrics.
+    PDF phases are timed inside the render processes and reported back
+    to the server with each finished job.
+
+    Under wsgi_server.py every worker process keeps its own histograms
+    and writes them to INVOICE_METRICS_DIR/<pid>.json every
+    FLUSH_INTERVAL seconds; /metrics, answered by any worker, adds up
+    the files of all workers (including ones since reloaded or crashed,
+    so counters never go back).
+
+INVOICE_PROFILE=1
+    cProfile every request and keep the PROFILE_KEEP slowest ones that
+    took longer than INVOICE_PROFILE_MIN_MS (default 200) as
+    data/profiles/<ms>ms-<route>-<time>.prof (open with pstats or snakeviz).
+
+Both are off by default and cost nothing when disabled.
+"""
+import os
+import re
+import json
+import time
+import heapq
+import sqlite3
+import threading
+import cProfile
+from contextlib import contextmanager
+
+
+ENABLED = os.environ.get('INVOICE_METRICS') == '1'
+PROFILE_ENABLED = os.environ.get('INVOICE_PROFILE') == '1'
+PROFILE_MIN_MS = float(os.environ.get('INVOICE_PROFILE_MIN_MS', 200))
+PROFILE_KEEP = 20
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'profiles')
+# Set by wsgi_server.py for its workers: one snapshot file per process
+MULTIPROCESS_DIR = os.environ.get('INVOICE_METRICS_DIR')
+FLUSH_INTERVAL = 5
+
+# Seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with labels."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for idx, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[idx] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self):
+        """[[labels, bucket counts, sum, count]] of every series, JSON-ready."""
+        with self._lock:
+            return [[list(labels), list(s[0]), s[1], s[2]] for labels, s in self._series.items()]
+
+    def render(self, snapshots=None):
+        """
+        Exposition text of this process's series, or of several
+        processes' snapshot() lists added together.
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        merged = {}
+        for snapshot in snapshots:
+            for labels, counts, total, count in snapshot:
+                series = merged.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        series = sorted(merged.items())
+
+        for labels, (counts, total, count) in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            base = ','.join(pairs)
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'invoice_http_request_duration_seconds',
+    'Time spent in the Flask view, by route.',
+    ('route', 'method', 'status')
+)
+PDF_PHASE_SECONDS = Histogram(
+    'invoice_pdf_phase_duration_seconds',
+    'Time per phase of generate_invoice_pdf.',
+    ('phase',)
+)
+SQL_SECONDS = Histogram(
+    'invoice_sql_duration_seconds',
+    'Time spent executing SQL statements, by statement kind and table.',
+    ('operation', 'table'),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+HISTOGRAMS = (REQUEST_SECONDS, PDF_PHASE_SECONDS, SQL_SECONDS)
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format."""
+    if not MULTIPROCESS_DIR:
+        return '\n'.join(h.render() for h in HISTOGRAMS) + '\n'
+
+    flush()
+    snapshots = []
+    for name in os.listdir(MULTIPROCESS_DIR):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(MULTIPROCESS_DIR, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return '\n'.join(h.render([s.get(h.name, []) for s in snapshots]) for h in HISTOGRAMS) + '\n'
+
+
+# ------------------------------------------------------------
+# Several worker processes
+# ------------------------------------------------------------
+
+def prepare_multiprocess(directory):
+    """
+    Called by the wsgi_server master before it starts workers: empty the
+    snapshot directory and point the workers (via the environment) at it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+    os.environ['INVOICE_METRICS_DIR'] = directory
+
+
+def flush():
+    """Write this process's histograms to its snapshot file (multi-process mode only)."""
+    if not (ENABLED and MULTIPROCESS_DIR):
+        return
+    path = os.path.join(MULTIPROCESS_DIR, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({h.name: h.snapshot() for h in HISTOGRAMS}, f)
+    os.replace(tmp, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+# ------------------------------------------------------------
+# PDF phases
+# ------------------------------------------------------------
+
+_phase_local = threading.local()
+
+
+@contextmanager
+def pdf_phase(name):
+    """Time one phase of a PDF render (no-op unless metrics are enabled)."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        collected = getattr(_phase_local, 'collected', None)
+        if collected is not None:
+            collected.append((name, seconds))
+        else:
+            PDF_PHASE_SECONDS.observe(seconds, name)
+
+
+@contextmanager
+def collect_pdf_phases():
+    """
+    Gather the phase timings of the block into a list instead of the
+    local histogram; render processes send that list back to the server.
+    """
+    collected = _phase_local.collected = []
+    try:
+        yield collected
+    finally:
+        _phase_local.collected = None
+
+
+def record_pdf_phases(samples):
+    """Record phase timings sent back by a render process."""
+    for name, seconds in samples or ():
+        PDF_PHASE_SECONDS.observe(seconds, name)
+
+
+# ------------------------------------------------------------
+# SQL
+# ------------------------------------------------------------
+
+_SQL_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|EXISTS)\s+(\w+)', re.IGNORECASE)
+
+
+def _sql_labels(sql):
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ''
+    match = _SQL_TABLE_RE.search(sql)
+    return operation, match.group(1) if match else ''
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - started, *_sql_labels(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - started, *_sql_labels(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose statements are timed into SQL_SECONDS."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Connection class for sqlite3.connect(factory=...)."""
+    return TimedConnection if ENABLED else sqlite3.Connection
+
+
+# ------------------------------------------------------------
+# Flask
+# ------------------------------------------------------------
+
+class _SlowestProfiles:
+    """Keeps the PROFILE_KEEP slowest request profiles on disk."""
+
+    def __init__(self):
+        self._heap = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def offer(self, profiler, seconds, route):
+        if seconds * 1000 < PROFILE_MIN_MS:
+            return
+        with self._lock:
+            if len(self._heap) >= PROFILE_KEEP and seconds <= self._heap[0][0]:
+                return
+            self._counter += 1
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+            path = os.path.join(
+                PROFILE_DIR,
+                f"{int(seconds * 1000)}ms-{slug}-{time.strftime('%Y%m%d-%H%M%S')}-{self._counter}.prof"
+            )
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(path)
+            heapq.heappush(self._heap, (seconds, self._counter, path))
+            if len(self._heap) > PROFILE_KEEP:
+                _, _, dropped = heapq.heappop(self._heap)
+                try:
+                    os.remove(dropped)
+                except FileNotFoundError:
+                    pass
+
+
+def init_app(app):
+    """Install request timing, profiling and the /metrics endpoint when enabled."""
+    from flask import Response, g, request
+
+    if not ENABLED and not PROFILE_ENABLED:
+        return
+
+    profiles = _SlowestProfiles()
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        if PROFILE_ENABLED:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        if ENABLED:
+            REQUEST_SECONDS.observe(seconds, route, request.method, response.status_code)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            profiles.offer(profiler, seconds, f"{request.method} {route}")
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    if ENABLED and MULTIPROCESS_DIR:
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+    if ENABLED:
+        @app.route('/metrics')
+        def metrics():
+            return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import hashlib
+import xhtml2pdf
+from database import db
+
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'pdf_cache')
+MAX_CACHE_BYTES = 500 * 1024 * 1024
+
+# Bump when the rendering pipeline changes in a way the inputs don't show
+CACHE_VERSION = 1
+
+
+def _link_or_copy(src, dest):
+    """Place `src` at `dest` without ever writing into an existing file."""
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return
+    tmp = dest + '.tmp'
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+class PdfCache:
+    """
+    Content-addressed store of rendered PDFs.
+
+    The key is a hash of the rendered HTML (invoice data, settings and
+    template) plus digests of every file it references (logo, signature,
+    stylesheets). Entries live in data/pdf_cache/<hash>.pdf and are
+    hard-linked (or copied) to the file name in pdfs/. Least recently
+    used entries are evicted once the cache exceeds MAX_CACHE_BYTES.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, html_content, asset_digests):
+        payload = json.dumps(
+            [CACHE_VERSION, xhtml2pdf.__version__, html_content, sorted(asset_digests.items())],
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, pdf_hash):
+        return os.path.join(self.cache_dir, f"{pdf_hash}.pdf")
+
+    def temp_path(self, pdf_hash):
+        """Where a renderer writes before store(); unique per process."""
+        return os.path.join(self.cache_dir, f"{pdf_hash}.{os.getpid()}.tmp")
+
+    def fetch(self, pdf_hash, dest):
+        """Place the cached PDF at `dest`. Returns False on a miss."""
+        cached = self.path(pdf_hash)
+        if not os.path.isfile(cached):
+            return False
+        _link_or_copy(cached, dest)
+        db.record_pdf_cache_hit(pdf_hash)
+        return True
+
+    def store(self, pdf_hash, rendered_path, dest, render_seconds):
+        """Move a freshly rendered PDF into the cache and place it at `dest`."""
+        cached = self.path(pdf_hash)
+        os.replace(rendered_path, cached)
+        _link_or_copy(cached, dest)
+        db.add_pdf_cache_entry(pdf_hash, os.path.getsize(cached), render_seconds)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        hashes = db.pdf_cache_overflow(self.max_bytes)
+        if not hashes:
+            return
+        for pdf_hash in hashes:
+            try:
+                os.remove(self.path(pdf_hash))
+            except FileNotFoundError:
+                pass
+        db.remove_pdf_cache_entries(hashes)
+
+    def stats(self):
+        stats = db.get_pdf_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+# Create global instance
+pdf_cache = PdfCache()
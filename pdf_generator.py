@@ -1,7 +1,20 @@
 import os
-from jinja2 import Environment, FileSystemLoader
-from xhtml2pdf import pisa
+import io
+import re
+import time
+import hashlib
+import threading
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from database import db
+from pdf_cache import pdf_cache
+from metrics import pdf_phase
+from invoice_totals import invoice_totals
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# Files pulled in by the rendered HTML (logo, signature, stylesheets)
+ASSET_URI_RE = re.compile(r'(?:src|href)="([^"]+)"')
 
 
 def link_callback(uri, rel):
@@ -16,49 +29,137 @@ def link_callback(uri, rel):
     return uri
 
 
-def generate_invoice_pdf(invoice_data):
-    template_dir = os.path.join(os.path.dirname(__file__), 'templates')
-    env = Environment(loader=FileSystemLoader(template_dir))
-
-    template_name = "invoice_template_visual.html" if invoice_data.get("template") == "visual" else "invoice_template.html"
-    template = env.get_template(template_name)
-
-    settings = db.get_settings()
+def resolve_logo_image(logo_path):
+    """
+    Find the logo file (case-insensitive) and return its "/filename" URI,
+    or None when there is no usable logo.
+    """
+    if not logo_path:
+        return None
+
+    if not os.path.isfile(logo_path):
+        folder = os.path.dirname(logo_path)
+        filename_lower = os.path.basename(logo_path).lower()
+
+        if os.path.isdir(folder):
+            for f in os.listdir(folder):
+                if f.lower() == filename_lower:
+                    logo_path = os.path.join(folder, f)
+                    break
+
+    if os.path.isfile(logo_path):
+        return f"/{os.path.basename(logo_path)}"
+    return None
+
+
+class RenderContext:
+    """
+    Long-lived state shared by every PDF render in this process:
+    the Jinja environment (compiled templates), company settings,
+    the resolved logo and the link_callback path lookups.
+
+    Reloaded only when the render version in the database changes,
+    i.e. after a settings or logo update. Signatures are not cached:
+    every invoice carries its own, and the signature image's path and
+    digest are looked up by URI and file stamp.
+    """
+
+    def __init__(self):
+        # Invoice fields are user input: escape them in the PDF and the HTML previews
+        self.env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(['html']))
+        self.version = None
+        self.settings = {}
+        self.logo_image = None
+        self._paths = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reload settings and assets if they changed since the last render."""
+        version = db.get_render_version()
+        if version == self.version:
+            return
+
+        with self._lock:
+            self.settings = db.get_settings()
+            self.logo_image = resolve_logo_image(self.settings.get('default_logo_path'))
+            self._paths = {}
+            self.version = version
+
+    def invalidate(self):
+        self.version = None
+
+    def get_template(self, name):
+        return self.env.get_template(name)
+
+    def link_callback(self, uri, rel):
+        path = self._paths.get(uri)
+        if path is None:
+            path = self._paths[uri] = link_callback(uri, rel)
+        return path
+
+    def asset_digests(self, html_content):
+        """
+        sha256 of every local file the HTML references.
+        Digests are reused while the file's size and mtime are unchanged.
+        """
+        digests = {}
+        for uri in set(ASSET_URI_RE.findall(html_content)):
+            path = self.link_callback(uri, None)
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError, ValueError):
+                continue
+            stamp = (path, stat.st_size, stat.st_mtime_ns)
+            digest = self._digests.get(stamp)
+            if digest is None:
+                with open(path, 'rb') as f:
+                    digest = self._digests[stamp] = hashlib.sha256(f.read()).hexdigest()
+            digests[uri] = digest
+        return digests
+
+
+render_context = RenderContext()
+
+
+# invoice template setting -> template file
+TEMPLATES = {
+    'classic': "invoice_template.html",
+    'visual': "invoice_template_visual.html",
+}
+DEFAULT_TEMPLATE = 'classic'
+
+
+def template_key(invoice_data):
+    template = invoice_data.get("template")
+    return template if template in TEMPLATES else DEFAULT_TEMPLATE
+
+
+def template_name_for(invoice_data):
+    return TEMPLATES[template_key(invoice_data)]
+
+
+def build_template_data(invoice_data):
+    """Template variables for an invoice; call render_context.refresh() first."""
+    settings = render_context.settings
 
     COMPANY_NAME = settings.get('company_name', "Medicine Wheel Ranch Inc.")
     COMPANY_ADDRESS = settings.get('company_address', "443 North Russell Road, Russell, ON, Canada - K4R 1E5")
     COMPANY_PHONE = settings.get('company_phone', "(613) 266-4806")
 
-    logo_path = settings.get('default_logo_path')
-    LOGO_IMAGE = None
-
-    if logo_path:
-        if not os.path.isfile(logo_path):
-            folder = os.path.dirname(logo_path)
-            filename_lower = os.path.basename(logo_path).lower()
-
-            if os.path.isdir(folder):
-                for f in os.listdir(folder):
-                    if f.lower() == filename_lower:
-                        logo_path = os.path.join(folder, f)
-                        break
-
-        if os.path.isfile(logo_path):
-            LOGO_IMAGE = f"/{os.path.basename(logo_path)}"
+    LOGO_IMAGE = render_context.logo_image
 
     DEFAULT_SHIPPING_METHOD = settings.get('default_shipping_method', "Seller")
     DEFAULT_SHIPPING_TERMS = settings.get('default_shipping_terms', "Seller")
 
-    items = invoice_data.get('items', [])
-    for item in items:
-        item['total'] = item['quantity'] * item['unit_price']
-
-    subtotal = sum(item['total'] for item in items)
-    tax = subtotal * (float(invoice_data.get('tax_rate', 13)) / 100)
-    shipping = float(invoice_data.get('shipping_cost', 0))
-    total = subtotal + tax + shipping
+    # Copies of the items: the caller's dicts are left untouched
+    line_totals, totals = invoice_totals(invoice_data)
+    items = [
+        dict(item, total=amount)
+        for item, amount in zip(invoice_data.get('items') or [], line_totals)
+    ]
 
-    signature = invoice_data.get('signature', {})
+    signature = invoice_data.get('signature') or {}
 
     template_data = {
         'LOGO_IMAGE': LOGO_IMAGE,
@@ -87,11 +188,11 @@ def generate_invoice_pdf(invoice_data):
 
         'HST_GST_NUMBER': invoice_data.get('hst_gst_number', ''),
         'ITEMS': items,
-        'SUBTOTAL': f"{subtotal:.2f}",
+        'SUBTOTAL': f"{totals.subtotal}",
         'TAX_RATE': f"{invoice_data.get('tax_rate', 13)}%",
-        'TAX': f"{tax:.2f}",
-        'SHIPPING': f"{shipping:.2f}",
-        'GRAND_TOTAL': f"{total:.2f}",
+        'TAX': f"{totals.tax}",
+        'SHIPPING': f"{totals.shipping}",
+        'GRAND_TOTAL': f"{totals.grand_total}",
 
         'COMMENTS': invoice_data.get('comments', ''),
         'TERMS_CONDITIONS': invoice_data.get('terms_conditions', ''),
@@ -102,26 +203,87 @@ def generate_invoice_pdf(invoice_data):
 
         'CREATED_BY': invoice_data.get('created_by', 'User')
     }
+    return template_data
 
-    html_content = template.render(**template_data)
+
+def generate_invoice_pdf(invoice_data, template=None):
+    """
+    Render an invoice to pdfs/ and return the path. `template` renders it
+    with another template than its own; that PDF gets the template name
+    in its file name so both versions can exist side by side.
+    """
+    own_template = template_key(invoice_data)
+    template = template if template in TEMPLATES else own_template
+
+    with pdf_phase('context'):
+        render_context.refresh()
+        jinja_template = render_context.get_template(TEMPLATES[template])
+
+    with pdf_phase('template_render'):
+        html_content = jinja_template.render(**build_template_data(invoice_data))
 
     vendor_clean = (invoice_data.get('vendor_name', 'Unknown')).replace(' ', '_')
     vendor_clean = ''.join(c for c in vendor_clean if c.isalnum() or c in '_-')
     date = invoice_data['date']
-    number = invoice_data['invoice_number'].split('-')[1]
+    number = invoice_data['invoice_number']
     type_clean = invoice_data['type']
+    variant = f" ({template})" if template != own_template else ""
 
-    filename = f"{date} - MWR-{number} - {type_clean} PO - {vendor_clean}.pdf"
+    filename = f"{date} - {number} - {type_clean} PO - {vendor_clean}{variant}.pdf"
     pdf_path = os.path.join(os.path.dirname(__file__), 'pdfs', filename)
 
-    with open(pdf_path, "wb") as pdf_file:
+    # Identical inputs -> reuse the PDF rendered before
+    with pdf_phase('cache_lookup'):
+        pdf_hash = pdf_cache.key(html_content, render_context.asset_digests(html_content))
+        if pdf_cache.fetch(pdf_hash, pdf_path):
+            return pdf_path
+
+    started = time.perf_counter()
+
+    with pdf_phase('html_to_pdf'):
+        # xhtml2pdf/reportlab take most of a second to import: only
+        # processes that actually render PDFs pay for it
+        from xhtml2pdf import pisa
+        pdf_buffer = io.BytesIO()
         pisa_status = pisa.CreatePDF(
             html_content,
-            dest=pdf_file,
-            link_callback=link_callback
+            dest=pdf_buffer,
+            link_callback=render_context.link_callback
         )
 
     if pisa_status.err:
         raise Exception(f"PDF generation failed: {pisa_status.err}")
 
+    with pdf_phase('disk_write'):
+        rendered_path = pdf_cache.temp_path(pdf_hash)
+        with open(rendered_path, "wb") as pdf_file:
+            pdf_file.write(pdf_buffer.getbuffer())
+        pdf_cache.store(pdf_hash, rendered_path, pdf_path, time.perf_counter() - started)
     return pdf_path
+
+
+# Rendered once when a render process starts
+WARM_UP_INVOICE = {
+    'invoice_number': 'WARM-UP',
+    'date': '2000-01-01',
+    'type': 'Sale',
+    'items': [{'lot_number': '', 'item': 'Warm-up', 'quantity': 1, 'units': 'unit', 'unit_price': 0}]
+}
+
+
+def warm_up():
+    """
+    Pay this process's one-time render costs up front: settings and logo,
+    every template compiled, and one throwaway xhtml2pdf render, which
+    loads reportlab's fonts, the default CSS and the image decoders.
+    """
+    from xhtml2pdf import pisa
+
+    render_context.refresh()
+    for name in TEMPLATES.values():
+        render_context.get_template(name)
+    for template in TEMPLATES:
+        html_content = render_context.get_template(TEMPLATES[template]).render(
+            **build_template_data(dict(WARM_UP_INVOICE, template=template))
+        )
+        pisa.CreatePDF(html_content, dest=io.BytesIO(), link_callback=render_context.link_callback)
@@ -1,59 +1,186 @@
 // Dashboard functions
-async function loadInvoices() {
+let nextCursor = null;
+let searchQuery = '';
+let searchTimer = null;
+
+function currentFilters() {
+    const params = new URLSearchParams();
+    const fields = ['date_from', 'date_to', 'type', 'status', 'number_prefix'];
+    fields.forEach(field => {
+        const el = document.getElementById(`filter_${field}`);
+        if (el && el.value) params.set(field, el.value);
+    });
+    return params;
+}
+
+function renderInvoiceRow(inv) {
+    const pdfFile = inv.pdf_path
+        ? inv.pdf_path.replace(/\\/g, '/').split('/').pop()
+        : null;
+
+    return `
+        <tr>
+            <td><input type="checkbox" class="invoice-select" value="${inv.id}"></td>
+            <td>${inv.invoice_number}</td>
+            <td>${inv.date}</td>
+            <td><span class="badge">${inv.type}</span></td>
+            <td>${inv.vendor_name || 'N/A'}</td>
+            <td><span class="badge badge-${inv.status.toLowerCase()}">${inv.status}</span></td>
+            <td>
+                ${pdfFile ? `<a href="/pdfs/${pdfFile}" target="_blank" class="btn-small">📄 PDF</a>` : ''}
+            </td>
+        </tr>
+    `;
+}
+
+async function loadStats() {
+    const now = new Date();
+    const month = `${now.getFullYear()}-${String(now.getMonth() + 1).padStart(2, '0')}`;
+
+    const [total, thisMonth] = await Promise.all([
+        fetch('/api/invoices/count').then(res => res.json()),
+        fetch(`/api/invoices/count?date_from=${month}-01&date_to=${month}-31`).then(res => res.json())
+    ]);
+
+    document.getElementById('totalCount').textContent = total.count;
+    document.getElementById('monthCount').textContent = thisMonth.count;
+}
+
+async function loadInvoices(append = false) {
     try {
+        const params = currentFilters();
+        let url = '/api/invoices';
+        if (searchQuery) {
+            // Ranked full-text search; nextCursor holds the result offset
+            url = '/api/search';
+            params.set('q', searchQuery);
+            if (append && nextCursor) params.set('offset', nextCursor);
+        } else if (append && nextCursor) {
+            params.set('cursor', nextCursor);
+        }
+
         console.log("Loading invoices...");
-        const response = await fetch('/api/invoices');
-        const invoices = await response.json();
-        
-        console.log("Invoices loaded:", invoices.length);
-        document.getElementById('totalCount').textContent = invoices.length;
-        
-        const currentMonth = new Date().getMonth();
-        const monthCount = invoices.filter(inv => new Date(inv.date.replace(/-/g, '/')).getMonth() === currentMonth).length;
-        document.getElementById('monthCount').textContent = monthCount;
-        
+        const response = await fetch(`${url}?${params.toString()}`);
+        const page = await response.json();
+        if (searchQuery) {
+            page.invoices = page.results;
+            page.next_cursor = page.next_offset;
+        }
+
+        console.log("Invoices loaded:", page.invoices.length);
+
         const tbody = document.getElementById('invoiceTable');
-        tbody.innerHTML = invoices.map(inv => {
-            const pdfFile = inv.pdf_path
-                ? inv.pdf_path.replace(/\\/g, '/').split('/').pop()
-                : null;
-
-            return `
-                <tr>
-                    <td>${inv.invoice_number}</td>
-                    <td>${inv.date}</td>
-                    <td><span class="badge">${inv.type}</span></td>
-                    <td>${inv.vendor_name || 'N/A'}</td>
-                    <td><span class="badge badge-${inv.status.toLowerCase()}">${inv.status}</span></td>
-                    <td>
-                        ${pdfFile ? `<a href="/pdfs/${pdfFile}" target="_blank" class="btn-small">📄 PDF</a>` : ''}
-                    </td>
-                </tr>
-            `;
-        }).join('');
+        const html = page.invoices.map(renderInvoiceRow).join('');
+        if (append) {
+            tbody.insertAdjacentHTML('beforeend', html);
+        } else {
+            tbody.innerHTML = html;
+        }
+
+        nextCursor = page.next_cursor;
+        const loadMore = document.getElementById('loadMoreBtn');
+        if (loadMore) loadMore.style.display = nextCursor ? '' : 'none';
+
+        if (!append) loadStats();
     } catch (err) {
         console.error('Failed to load invoices:', err);
     }
 }
 
+function loadMoreInvoices() {
+    loadInvoices(true);
+}
+
+function applyFilters() {
+    nextCursor = null;
+    loadInvoices();
+}
+
 function exportToExcel() {
     console.log("Exporting to Excel...");
-    window.location.href = '/api/export-excel';
+    const params = currentFilters();
+    params.set('items', '1');
+    params.set('totals', '1');
+    window.location.href = `/api/export-excel?${params.toString()}`;
+}
+
+function toggleSelectAll(checked) {
+    document.querySelectorAll('.invoice-select').forEach(box => {
+        box.checked = checked;
+    });
+}
+
+function selectedInvoiceIds() {
+    return Array.from(document.querySelectorAll('.invoice-select:checked')).map(box => Number(box.value));
+}
+
+function downloadPdfs() {
+    // Selected invoices, or everything matching the current filters
+    const ids = selectedInvoiceIds();
+    const params = ids.length ? new URLSearchParams({ ids: ids.join(',') }) : currentFilters();
+    window.location.href = `/api/invoices/download-zip?${params.toString()}`;
+}
+
+async function postSelection(url, body) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+    const result = await response.json();
+    if (!response.ok) throw new Error(result.error || response.statusText);
+    return result;
+}
+
+async function deleteSelected() {
+    const ids = selectedInvoiceIds();
+    if (!ids.length) {
+        alert('Select the invoices to delete first');
+        return;
+    }
+    if (!confirm(`Delete ${ids.length} invoice(s)? Their PDFs are moved to pdfs/deleted.`)) return;
+
+    try {
+        const result = await postSelection('/api/invoices/bulk-delete', { ids });
+        alert(`Deleted ${result.deleted} invoice(s)`);
+        applyFilters();
+    } catch (err) {
+        alert('Error deleting invoices: ' + err.message);
+    }
+}
+
+async function setSelectedStatus(status) {
+    const ids = selectedInvoiceIds();
+    if (!status) return;
+    if (!ids.length) {
+        alert('Select the invoices to update first');
+        return;
+    }
+
+    try {
+        const result = await postSelection('/api/invoices/status', { ids, status });
+        if (result.rejected) {
+            alert(`${result.rejected} invoice(s) cannot be marked ${status}`);
+        }
+        applyFilters();
+    } catch (err) {
+        alert('Error updating status: ' + err.message);
+    }
 }
 
 // Search functionality
 if (document.getElementById('search')) {
     document.getElementById('search').addEventListener('input', (e) => {
-        const filter = e.target.value.toLowerCase();
-        const rows = document.querySelectorAll('#invoiceTable tr');
-        rows.forEach(row => {
-            const text = row.textContent.toLowerCase();
-            row.style.display = text.includes(filter) ? '' : 'none';
-        });
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            searchQuery = e.target.value.trim();
+            nextCursor = null;
+            loadInvoices();
+        }, 250);
     });
 }
 
 // Load invoices on page load
 if (window.location.pathname.includes('index.html') || window.location.pathname === '/') {
-    document.addEventListener('DOMContentLoaded', loadInvoices);
+    document.addEventListener('DOMContentLoaded', () => loadInvoices());
 }
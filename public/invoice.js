@@ -10,6 +10,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         document.getElementById('invoice_number').value = data.invoice_number;
 
         await loadVendors();
+        document.getElementById('vendorSearch').addEventListener('input', scheduleVendorSearch);
         await loadSignatures();
         await loadDefaultSignature();
 
@@ -22,6 +23,10 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         document.getElementById('signatureSelect').addEventListener('change', updateSignaturePreview);
 
+        document.getElementById('invoiceForm').addEventListener('input', scheduleLivePreview);
+        document.getElementById('invoiceForm').addEventListener('change', scheduleLivePreview);
+        document.getElementById('templateSelect').addEventListener('change', scheduleLivePreview);
+
         document.getElementById("previewInvoiceBtn").addEventListener("click", function () {
             if (!currentInvoiceId) {
                 alert("Please create the invoice first (submit the form).");
@@ -39,14 +44,44 @@ document.addEventListener('DOMContentLoaded', async () => {
 // ===============================
 // LOAD VENDORS
 // ===============================
-async function loadVendors() {
-    const response = await fetch('/api/vendors');
+let vendorSearchTimer = null;
+let vendorSearchSeq = 0;
+
+function scheduleVendorSearch() {
+    clearTimeout(vendorSearchTimer);
+    vendorSearchTimer = setTimeout(loadVendors, 200);
+}
+
+// Fills the vendor dropdown with the matches for the search box
+// (the first vendors when it is empty); the selected vendor is kept.
+async function loadVendors(selectId = null) {
+    const seq = ++vendorSearchSeq;
+    const query = document.getElementById('vendorSearch').value.trim();
+    const response = await fetch(`/api/vendors/search?q=${encodeURIComponent(query)}&limit=50`);
     const vendors = await response.json();
+    if (seq !== vendorSearchSeq) return;
+
     const select = document.getElementById('vendorSelect');
+    const selected = select.selectedOptions[0];
+    const keep = selectId === null && selected && selected.value ? selected : null;
+
     select.innerHTML = '<option value="">-- Select Vendor --</option>';
+    if (keep && !vendors.some(v => String(v.id) === keep.value)) {
+        select.appendChild(keep);
+    }
     vendors.forEach(v => {
-        select.innerHTML += `<option value="${v.id}" data-address="${v.address}" data-contact="${v.contact}">${v.name}</option>`;
+        const option = document.createElement('option');
+        option.value = v.id;
+        option.textContent = v.name;
+        option.dataset.address = v.address || '';
+        option.dataset.contact = v.contact || '';
+        select.appendChild(option);
     });
+
+    const value = selectId !== null ? String(selectId) : keep?.value;
+    if (value) select.value = value;
+    else if (query && vendors.length === 1) select.value = vendors[0].id;
+    scheduleLivePreview();
 }
 
 // ===============================
@@ -149,14 +184,56 @@ function calculateTotals() {
     const grandTotal = subtotal + tax + shipping;
 
     document.getElementById('grand_total').value = `$${grandTotal.toFixed(2)}`;
+    scheduleLivePreview();
 }
 
 // ===============================
-// SUBMIT INVOICE
+// LIVE PREVIEW
 // ===============================
-document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
-    e.preventDefault();
+let previewTimer = null;
+let previewEtag = null;
+let previewSeq = 0;
+
+function scheduleLivePreview() {
+    clearTimeout(previewTimer);
+    previewTimer = setTimeout(updateLivePreview, 300);
+}
 
+async function updateLivePreview() {
+    const frame = document.getElementById('livePreview');
+    if (!frame) return;
+
+    const data = collectInvoiceData();
+    data.invoice_number = document.getElementById('invoice_number').value;
+
+    const headers = { 'Content-Type': 'application/json' };
+    if (previewEtag) headers['If-None-Match'] = previewEtag;
+
+    const seq = ++previewSeq;
+    try {
+        const res = await fetch('/api/invoices/preview', {
+            method: 'POST',
+            headers: headers,
+            body: JSON.stringify(data)
+        });
+        // 304: unchanged since the last preview; stale: a newer edit is on its way
+        if (res.status === 304 || !res.ok || seq !== previewSeq) return;
+
+        previewEtag = res.headers.get('ETag');
+        const html = await res.text();
+
+        const scrollY = frame.contentWindow ? frame.contentWindow.scrollY : 0;
+        frame.onload = () => frame.contentWindow.scrollTo(0, scrollY);
+        frame.srcdoc = html;
+    } catch (err) {
+        console.error('Preview failed:', err);
+    }
+}
+
+// ===============================
+// COLLECT FORM DATA
+// ===============================
+function collectInvoiceData() {
     const items = Array.from(document.querySelectorAll('#itemsBody tr')).map(row => ({
         lot_number: row.querySelector('.lot-number').value,
         item: row.querySelector('.item-desc').value,
@@ -165,18 +242,13 @@ document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
         unit_price: parseFloat(row.querySelector('.unit-price').value) || 0
     })).filter(item => item.item);
 
-    if (items.length === 0) {
-        alert('Add at least one item');
-        return;
-    }
-
     const sigSelect = document.getElementById('signatureSelect');
     const sigOption = sigSelect.selectedOptions[0];
 
     const template = document.getElementById('templateSelect').value;
 
     const invoiceData = {
-        invoice_number: document.getElementById('invoice_number').value,
+        // invoice_number is assigned by the server when the invoice is saved
         date: document.getElementById('date').value,
         type: document.getElementById('type').value,
         vendor_id: document.getElementById('vendorSelect').value,
@@ -202,6 +274,22 @@ document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
         template: template
     };
 
+    return invoiceData;
+}
+
+// ===============================
+// SUBMIT INVOICE
+// ===============================
+document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const invoiceData = collectInvoiceData();
+
+    if (invoiceData.items.length === 0) {
+        alert('Add at least one item');
+        return;
+    }
+
     try {
         const response = await fetch('/api/invoices', {
             method: 'POST',
@@ -213,11 +301,20 @@ document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
 
         if (response.ok && result.success) {
             currentInvoiceId = result.invoice_id;
+            document.getElementById('invoice_number').value = result.invoice_number;
 
-            const pdfFile = result.pdf_path.replace(/\\/g, '/').split('/').pop();
-            window.open('/pdfs/' + pdfFile, '_blank');
+            // Open a window now (inside the click) so popup blockers allow it,
+            // then point it at the PDF once the background render finishes.
+            const pdfWindow = window.open('', '_blank');
+            const job = await waitForRenderJob(result.render_job_id);
 
-            alert('Invoice created. You can now use Preview to see the HTML version.');
+            if (job.status === 'done') {
+                if (pdfWindow) pdfWindow.location = '/pdfs/' + job.pdf_file;
+                alert('Invoice created. You can now use Preview to see the HTML version.');
+            } else {
+                if (pdfWindow) pdfWindow.close();
+                alert('Invoice saved, but the PDF failed: ' + (job.error || 'Unknown error'));
+            }
         } else {
             alert('Error: ' + (result.error || 'Unknown error'));
         }
@@ -227,6 +324,19 @@ document.getElementById('invoiceForm').addEventListener('submit', async (e) => {
     }
 });
 
+// ===============================
+// WAIT FOR PDF RENDER JOB
+// ===============================
+async function waitForRenderJob(jobId) {
+    while (true) {
+        const res = await fetch(`/api/render-jobs/${jobId}`);
+        const job = await res.json();
+        if (!res.ok) return { status: 'failed', error: job.error };
+        if (job.status === 'done' || job.status === 'failed') return job;
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+}
+
 // ===============================
 // ADD NEW VENDOR
 // ===============================
@@ -245,7 +355,8 @@ function showAddVendor() {
     .then(res => res.json())
     .then(data => {
         alert("Vendor added successfully");
-        loadVendors();
+        document.getElementById('vendorSearch').value = name;
+        loadVendors(data.id);
     })
     .catch(err => alert("Error adding vendor"));
 }
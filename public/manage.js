@@ -69,7 +69,11 @@ function deleteVendor(id) {
     if (!confirm("Delete this vendor?")) return;
 
     fetch(`/api/vendors/${id}`, { method: "DELETE" })
-        .then(() => loadVendors());
+        .then(res => res.json())
+        .then(result => {
+            if (result.error) alert(result.error);
+            loadVendors();
+        });
 }
 
 
@@ -200,5 +204,9 @@ function deleteSignature(id) {
     if (!confirm("Delete this signature?")) return;
 
     fetch(`/api/signatures/${id}/delete`, { method: "DELETE" })
-        .then(() => loadSignatures());
+        .then(res => res.json())
+        .then(result => {
+            if (result.error) alert(result.error);
+            loadSignatures();
+        });
 }
@@ -154,6 +154,8 @@ async function deleteVendor(id) {
         if (result.success) {
             alert("Vendor deleted");
             loadVendors();
+        } else {
+            alert(result.error || "Error deleting vendor");
         }
     } catch (err) {
         alert("Error deleting vendor");
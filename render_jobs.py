@@ -0,0 +1,243 @@
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from database import db
+from metrics import record_pdf_phases
+
+
+def _init_worker():
+    """
+    Runs once in every pool process when it starts: import xhtml2pdf and
+    reportlab, compile the templates and load fonts, CSS and the logo, so
+    that no job pays for them.
+    """
+    from pdf_generator import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        # The first real job reports the problem with its own error
+        print(f"⚠️  PDF worker warm-up failed: {e}")
+
+
+def _ready():
+    return os.getpid()
+
+
+def _render_pdf(invoice_data, template):
+    """Runs inside a pool process: one (invoice, template) job of a batch."""
+    from pdf_generator import generate_invoice_pdf
+    from metrics import collect_pdf_phases
+
+    with collect_pdf_phases() as phases:
+        pdf_path = generate_invoice_pdf(invoice_data, template)
+    return pdf_path, phases
+
+
+def _render_job(job_id, invoice_data):
+    """
+    Runs inside a pool process.
+    Marks the job as rendering and returns the generated PDF path
+    with the render's phase timings (empty unless metrics are enabled).
+    """
+    from database import db as worker_db
+    from pdf_generator import generate_invoice_pdf
+    from metrics import collect_pdf_phases
+
+    worker_db.update_render_job(job_id, 'rendering')
+    with collect_pdf_phases() as phases:
+        pdf_path = generate_invoice_pdf(invoice_data)
+    return pdf_path, phases
+
+
+class RenderQueue:
+    """
+    Background PDF rendering.
+    Jobs are persisted in the render_jobs table and rendered by a
+    process pool sized to the number of CPU cores (or
+    INVOICE_RENDER_WORKERS), so invoice creation does not wait for xhtml2pdf.
+
+    The pool processes are long-lived and warmed up when they start
+    (_init_worker), so every render after the first costs only the render.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = (
+            workers
+            or int(os.environ.get('INVOICE_RENDER_WORKERS') or 0)
+            or os.cpu_count()
+            or 1
+        )
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """Start the process pool on first use."""
+        with self._lock:
+            if self._pool is None:
+                # spawn: workers open their own SQLite connection instead of
+                # inheriting the parent's one through fork()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._pool
+
+    def warm_up(self):
+        """
+        Start every pool process now rather than on the first renders.
+        Returns futures that finish as each process is ready.
+        """
+        pool = self._get_pool()
+        # The pool starts one process per submission until it is full
+        return [pool.submit(_ready) for _ in range(self.workers)]
+
+    def submit(self, invoice_id, invoice_data):
+        """Persist a render job for the invoice and hand it to the pool."""
+        job_id = db.create_render_job(invoice_id, invoice_data)
+        self._dispatch(job_id, invoice_id, invoice_data)
+        return job_id
+
+    def _dispatch(self, job_id, invoice_id, invoice_data):
+        future = self._get_pool().submit(_render_job, job_id, invoice_data)
+        future.add_done_callback(
+            lambda f: self._on_done(job_id, invoice_id, f)
+        )
+        return future
+
+    def _stream(self, entries, start, key_of, max_pending):
+        """
+        Run `start(entry)` -> future for each entry, keeping at most
+        `max_pending` in flight, and return an iterator of
+        (key_of(entry), pdf_path, error) in completion order. The next
+        entry is only pulled when a job completes, so a long input never
+        sits in memory. Closing the iterator stops new submissions.
+
+        If reading the next entry raises, the error is yielded once as
+        (None, None, error) and the stream ends after the jobs in flight.
+        """
+        entries = iter(entries)
+        results = queue.Queue()
+        lock = threading.Lock()
+        state = {'outstanding': 0, 'exhausted': False}
+
+        def submit_next():
+            while True:
+                with lock:
+                    if state['exhausted']:
+                        return
+                    # Also runs in a done-callback, where an exception would
+                    # be swallowed and leave the consumer waiting forever
+                    try:
+                        entry = next(entries, None)
+                        key = None if entry is None else key_of(entry)
+                    except Exception as e:
+                        state['exhausted'] = True
+                        state['outstanding'] += 1
+                        results.put((None, None, f"Reading the next entry failed: {e}"))
+                        return
+                    if entry is None:
+                        state['exhausted'] = True
+                        return
+                    state['outstanding'] += 1
+                try:
+                    future = start(entry)
+                except Exception as e:
+                    # Report it and use the free slot for the next entry
+                    results.put((key, None, str(e)))
+                    continue
+                future.add_done_callback(lambda f: finished(key, f))
+                return
+
+        def finished(key, future):
+            # Refill before reporting so `outstanding` never drops to zero early
+            try:
+                submit_next()
+            finally:
+                error = future.exception()
+                if error is not None:
+                    results.put((key, None, str(error)))
+                else:
+                    results.put((key, future.result()[0], None))
+
+        def collect():
+            try:
+                while True:
+                    with lock:
+                        if state['outstanding'] == 0 and state['exhausted']:
+                            return
+                    result = results.get()
+                    with lock:
+                        state['outstanding'] -= 1
+                    yield result
+            finally:
+                with lock:
+                    state['exhausted'] = True
+
+        # Start the first jobs now, not on the caller's first next()
+        for _ in range(max_pending):
+            submit_next()
+        return collect()
+
+    def render_many(self, invoices, max_pending=None):
+        """
+        Render (invoice_id, invoice_data) pairs on the pool as render jobs.
+        Returns an iterator of (invoice_id, pdf_path, error) in completion
+        order, with at most `max_pending` jobs in flight (see _stream).
+        """
+        def start(entry):
+            invoice_id, invoice_data = entry
+            job_id = db.create_render_job(invoice_id, invoice_data)
+            return self._dispatch(job_id, invoice_id, invoice_data)
+
+        return self._stream(invoices, start, lambda entry: entry[0], max_pending or self.workers * 2)
+
+    def render_batch(self, jobs, max_pending=None):
+        """
+        Render (key, invoice_data, template) jobs, e.g. every template of
+        an invoice or a whole batch, spread over all pool processes.
+        Nothing is recorded in render_jobs and invoices keep their stored
+        PDF path. Returns an iterator of ((key, template), pdf_path, error)
+        in completion order.
+        """
+        pool = self._get_pool()
+
+        def start(entry):
+            _, invoice_data, template = entry
+            future = pool.submit(_render_pdf, invoice_data, template)
+            future.add_done_callback(lambda f: f.exception() or record_pdf_phases(f.result()[1]))
+            return future
+
+        return self._stream(jobs, start, lambda entry: (entry[0], entry[2]), max_pending or self.workers * 2)
+
+    def _on_done(self, job_id, invoice_id, future):
+        try:
+            pdf_path, phases = future.result()
+        except Exception as e:
+            db.update_render_job(job_id, 'failed', error=str(e))
+            print(f"❌ PDF render job {job_id} failed: {e}")
+            return
+
+        record_pdf_phases(phases)
+        db.update_invoice_pdf_path(invoice_id, pdf_path)
+        db.update_render_job(job_id, 'done', pdf_path=pdf_path)
+
+    def resume(self):
+        """Re-queue jobs that were still pending when the server stopped."""
+        jobs = db.get_unfinished_render_jobs()
+        for job in jobs:
+            db.update_render_job(job['id'], 'queued')
+            self._dispatch(job['id'], job['invoice_id'], job['invoice_data'])
+        return len(jobs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+
+# Create global instance
+render_queue = RenderQueue()
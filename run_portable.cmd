@@ -75,6 +75,8 @@ echo 💾 Database: %PROJECT_DIR%\data
 echo ✍️  Signatures: %PROJECT_DIR%\signatures
 echo.
 echo Press CTRL+C to stop
+echo To reload after an update: python wsgi_server.py --reload
 echo.
 
-python "%PROJECT_DIR%\server.py"
\ No newline at end of file
+REM Worker processes (default: one per CPU core); set INVOICE_WORKERS to override
+python "%PROJECT_DIR%\wsgi_server.py"
\ No newline at end of file
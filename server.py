@@ -1,36 +1,42 @@
-from flask import Flask, request, jsonify, session, send_file, send_from_directory, render_template
-from flask_session import Session
+from flask import Flask, Response, request, jsonify, session, send_file, send_from_directory
+import io
 import os
+import json
 import sys
+import sqlite3
 import webbrowser
 import threading
 import time
-from werkzeug.utils import secure_filename
-from database import db
-from pdf_generator import generate_invoice_pdf
-from excel_export import export_invoices_to_excel
+from database import db, is_duplicate_invoice_number, VENDOR_SEARCH_LIMIT
+from render_jobs import render_queue
+from pdf_generator import TEMPLATES, template_key
+from pdf_cache import pdf_cache
+from zip_export import stream_invoice_pdfs_zip
+from invoice_preview import fragment_renderer, draft_etag, render_draft_preview
+from bulk_import import import_invoices
+from bulk_actions import delete_invoices
+from session_store import SqliteSessionInterface
+from static_assets import static_assets
+from image_store import store_image
+from vendor_cache import vendor_cache
+from invoice_totals import line_total, sum_amounts
+from archive import archives, archive_fiscal_year
+import static_assets as asset_pipeline
+import metrics
 
 app = Flask(__name__, static_folder='public', static_url_path='')
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.config['SECRET_KEY'] = 'portable-invoice-software'
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(BASE_DIR, 'data', 'sessions')
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
 app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'signatures')
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
 
-os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, 'pdfs'), exist_ok=True)
 
-Session(app)
-
-
-@app.route('/')
-def index():
-    return send_file('public/index.html')
+app.session_interface = SqliteSessionInterface()
+metrics.init_app(app)
+asset_pipeline.init_app(app)
 
 
 @app.route('/api/settings/hst-gst')
@@ -87,13 +93,13 @@ def upload_signature_legacy():
             return jsonify({'error': 'No file selected'}), 400
         if not file.content_type.startswith('image/'):
             return jsonify({'error': 'File must be an image'}), 400
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filepath = store_image(file.stream, 'signature')
         name = request.form.get('name', 'Unknown')
         position = request.form.get('position', '')
         signature_id = db.add_signature(name, position, filepath)
         return jsonify({'id': signature_id, 'success': True})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -108,9 +114,8 @@ def upload_signature():
             return jsonify({'error': 'No file selected'}), 400
         if not file.content_type.startswith('image/'):
             return jsonify({'error': 'File must be an image'}), 400
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filepath = store_image(file.stream, 'signature')
+        filename = os.path.basename(filepath)
         name = request.form.get('name', 'Unknown')
         position = request.form.get('position', '')
         signature_id = db.add_signature(name, position, filepath)
@@ -121,6 +126,8 @@ def upload_signature():
             'name': name,
             'position': position
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -145,7 +152,10 @@ def edit_signature(sig_id):
 
 @app.route('/api/signatures/<int:sig_id>/delete', methods=['DELETE'])
 def delete_signature(sig_id):
-    db.delete_signature(sig_id)
+    try:
+        db.delete_signature(sig_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
     return jsonify({'success': True})
 
 
@@ -156,7 +166,7 @@ def get_company_settings():
         logo_path = settings.get('default_logo_path')
         if logo_path:
             filename = os.path.basename(logo_path)
-            settings['default_logo_url'] = f"/{filename}"
+            settings['default_logo_url'] = static_assets.url(filename)
         else:
             settings['default_logo_url'] = None
         return jsonify(settings)
@@ -198,15 +208,16 @@ def upload_company_logo():
             return jsonify({'error': 'No file selected'}), 400
         if not file.content_type.startswith('image/'):
             return jsonify({'error': 'File must be an image'}), 400
-        filename = secure_filename(file.filename)
-        save_path = os.path.join(BASE_DIR, 'public', filename)
-        file.save(save_path)
+        save_path = store_image(file.stream, 'logo')
+        filename = os.path.basename(save_path)
         db.update_settings({'default_logo_path': save_path})
         return jsonify({
             'success': True,
             'logo_file': filename,
-            'logo_url': f"/{filename}"
+            'logo_url': static_assets.url(filename)
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -220,11 +231,58 @@ def get_next_invoice_number():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/settings/invoice-sequence', methods=['GET'])
+def get_invoice_sequence():
+    try:
+        return jsonify(db.get_invoice_sequence())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/settings/invoice-sequence', methods=['POST'])
+def update_invoice_sequence():
+    try:
+        data = request.json or {}
+        db.update_invoice_sequence(
+            prefix=data.get('prefix'),
+            padding=data.get('padding'),
+            next_value=data.get('next_value')
+        )
+        return jsonify({'success': True, **db.get_invoice_sequence()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoice-numbers/reserve', methods=['POST'])
+def reserve_invoice_numbers():
+    try:
+        count = int((request.json or {}).get('count', 1))
+        if count < 1 or count > 10000:
+            return jsonify({'error': 'count must be between 1 and 10000'}), 400
+        return jsonify({'invoice_numbers': db.reserve_invoice_numbers(count)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/vendors', methods=['GET'])
 def get_vendors():
     try:
-        vendors = db.get_all_vendors()
-        return jsonify(vendors)
+        body, etag = vendor_cache.full_list()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/vendors/search')
+def search_vendors():
+    try:
+        return jsonify(db.search_vendors(
+            request.args.get('q', ''),
+            request.args.get('limit', VENDOR_SEARCH_LIMIT, type=int)
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -254,19 +312,76 @@ def delete_vendor(vendor_id):
     try:
         db.delete_vendor(vendor_id)
         return jsonify({'success': True, 'message': 'Vendor deleted'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+INVOICE_FILTER_KEYS = ('date_from', 'date_to', 'vendor_id', 'type', 'status', 'number_prefix')
+
+
+def invoice_filters_from_args(args):
+    """Pick the invoice list filters out of a query string / JSON body."""
+    return {key: args.get(key) for key in INVOICE_FILTER_KEYS if args.get(key)}
+
+
+def invoice_selection_from_args(args):
+    """List filters plus the selected ids (a list or "1,2,3"), if any."""
+    filters = invoice_filters_from_args(args)
+    ids = args.get('ids')
+    if isinstance(ids, str):
+        ids = [i for i in ids.split(',') if i.strip()]
+    if ids:
+        filters['ids'] = [int(i) for i in ids]
+    return filters
+
+
+def invoice_selection_from_json(data):
+    """Selection of a bulk request body: {"ids": [...]} or {"filters": {...}}."""
+    selection = dict(data.get('filters') or {})
+    if data.get('ids'):
+        selection['ids'] = data['ids']
+    return invoice_selection_from_args(selection)
+
+
 @app.route('/api/invoices', methods=['GET'])
 def get_invoices():
     try:
-        invoices = db.get_all_invoices()
-        return jsonify(invoices)
+        filters = invoice_filters_from_args(request.args)
+        page = archives.list_invoices(
+            filters,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/count', methods=['GET'])
+def count_invoices():
+    try:
+        filters = invoice_filters_from_args(request.args)
+        return jsonify({'count': archives.count_invoices(filters)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def invoice_number_taken(number):
+    """409 for an invoice number entered by the user that is already used."""
+    return jsonify({
+        'error': f"Invoice number {number} is already used. Leave it blank to get the next number.",
+        'code': 'invoice_number_taken',
+        'invoice_number': number,
+        'next_invoice_number': db.get_next_invoice_number()
+    }), 409
+
+
 @app.route('/api/invoices', methods=['POST'])
 def create_invoice():
     try:
@@ -277,21 +392,176 @@ def create_invoice():
         if signature:
             invoice_data['signature_id'] = signature.get('id')
 
-        pdf_path = generate_invoice_pdf(invoice_data)
-
-        invoice_id = db.save_invoice(invoice_data)
-        db.update_invoice_pdf_path(invoice_id, pdf_path)
+        # Fast path; the UNIQUE constraint below settles concurrent creates.
+        # Numbers from the sequence skip used ones, so only a number the
+        # client typed in can collide.
+        number = invoice_data.get('invoice_number')
+        if number and archives.existing_invoice_numbers([number]):
+            return invoice_number_taken(number)
+
+        try:
+            invoice_id = db.save_invoice(invoice_data)
+        except sqlite3.IntegrityError as e:
+            if is_duplicate_invoice_number(e):
+                return invoice_number_taken(number)
+            return jsonify({'error': str(e)}), 400
+        job_id = render_queue.submit(invoice_id, invoice_data)
 
         return jsonify({
             'success': True,
             'invoice_id': invoice_id,
-            'pdf_path': pdf_path,
+            'invoice_number': invoice_data['invoice_number'],
+            'render_job_id': job_id,
+            'render_status': 'queued',
             'message': 'Invoice created successfully!'
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/invoices/import', methods=['POST'])
+def import_invoices_file():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No import file provided'}), 400
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        report = import_invoices(
+            file.stream,
+            file.filename,
+            created_by=session.get('username', 'User'),
+            render_pdfs=request.form.get('render_pdfs', '1') != '0'
+        )
+        return jsonify({'success': True, **report})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/search')
+def search_invoices():
+    try:
+        filters = invoice_filters_from_args(request.args)
+        page = archives.search_invoices(
+            request.args.get('q', ''),
+            filters,
+            offset=request.args.get('offset', type=int),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/reports/<dimension>')
+def spend_report(dimension):
+    try:
+        filters = invoice_filters_from_args(request.args)
+        rows = archives.spend_report(dimension, filters)
+        totals = {
+            field: float(sum_amounts(row[field] for row in rows))
+            for field in ('subtotal', 'tax', 'shipping', 'grand_total')
+        }
+        totals['invoices'] = sum(row['invoices'] for row in rows)
+        return jsonify({'group_by': dimension, 'rows': rows, 'totals': totals})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/<int:invoice_id>/regenerate', methods=['POST'])
+def regenerate_invoice_pdf(invoice_id):
+    try:
+        invoice = db.get_invoice(invoice_id)
+        if not invoice:
+            return jsonify({'error': 'Invoice not found'}), 404
+
+        job_id = render_queue.submit(invoice_id, invoice.to_invoice_data())
+        return jsonify({
+            'success': True,
+            'render_job_id': job_id,
+            'render_status': 'queued'
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/render', methods=['POST'])
+def render_invoice_batch():
+    """
+    Render the selected invoices ({"ids": [...]} or {"filters": {...}})
+    with every template in "templates" (default: all) on the render
+    processes. Streams one JSON line per PDF as it finishes, then a summary.
+    """
+    try:
+        data = request.json or {}
+        selection = invoice_selection_from_json(data)
+        if not selection:
+            raise ValueError("Select invoices by ids or filters first")
+        templates = data.get('templates') or list(TEMPLATES)
+        unknown = [t for t in templates if t not in TEMPLATES]
+        if unknown:
+            raise ValueError(f"Unknown template(s): {', '.join(unknown)}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    own_templates = {}
+
+    def jobs():
+        for invoice in db.iter_invoices(selection):
+            invoice_data = invoice.to_invoice_data()
+            own_templates[invoice['id']] = template_key(invoice_data)
+            for template in templates:
+                yield invoice['id'], invoice_data, template
+
+    def generate():
+        started = time.perf_counter()
+        rendered = failed = 0
+        results = render_queue.render_batch(jobs())
+        try:
+            for key, pdf_path, error in results:
+                invoice_id, template = key or (None, None)
+                if error:
+                    failed += 1
+                else:
+                    rendered += 1
+                    if template == own_templates.get(invoice_id):
+                        db.update_invoice_pdf_path(invoice_id, pdf_path)
+                yield json.dumps({
+                    'invoice_id': invoice_id,
+                    'template': template,
+                    'pdf_file': os.path.basename(pdf_path) if pdf_path else None,
+                    'error': error
+                }) + '\n'
+        finally:
+            results.close()
+        yield json.dumps({
+            'done': True,
+            'rendered': rendered,
+            'failed': failed,
+            'seconds': round(time.perf_counter() - started, 3)
+        }) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/api/render-jobs/<int:job_id>')
+def get_render_job(job_id):
+    try:
+        job = db.get_render_job(job_id)
+        if not job:
+            return jsonify({'error': 'Render job not found'}), 404
+        job['pdf_file'] = os.path.basename(job['pdf_path']) if job['pdf_path'] else None
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================
 # Invoice Live Preview
 # ============================
@@ -299,27 +569,23 @@ def create_invoice():
 @app.route('/preview-invoice/<int:invoice_id>')
 def preview_invoice(invoice_id):
     try:
-        invoice = db.get_invoice(invoice_id)
+        invoice = archives.get_invoice(invoice_id)
         if not invoice:
             return "Invoice not found", 404
 
-        template_override = request.args.get("template")
-        if template_override:
-            invoice["template"] = template_override
+        template = request.args.get("template") or invoice.get("template")
 
         settings = db.get_settings()
 
-        signature = None
-        if invoice.get('signature_id'):
-            signature = db.get_signature(invoice['signature_id'])
-            if signature:
-                signature['image_path'] = f"/signatures/{os.path.basename(signature['image_path'])}"
+        signature = invoice.signature
+        if signature and signature['image']:
+            signature['image_path'] = f"/signatures/{signature['image']}"
 
         logo_image = None
         if settings.get('default_logo_path'):
             logo_image = f"/{os.path.basename(settings.get('default_logo_path'))}"
 
-        template_name = "invoice_template_visual.html" if invoice.get("template") == "visual" else "invoice_template.html"
+        template_name = "invoice_template_visual.html" if template == "visual" else "invoice_template.html"
 
         template_data = {
             'COMPANY_NAME': settings.get('company_name'),
@@ -346,7 +612,10 @@ def preview_invoice(invoice_id):
             'shipping_terms': invoice.get('shipping_terms'),
             'delivery_date': invoice.get('delivery_date'),
 
-            'ITEMS': invoice.get('items', []),
+            'ITEMS': [
+                dict(item, total=line_total(item['quantity'], item['unit_price']))
+                for item in invoice.items
+            ],
 
             'HST_GST_NUMBER': invoice.get('hst_gst_number'),
             'TAX_RATE': f"{invoice.get('tax_rate', 13)}%",
@@ -364,35 +633,201 @@ def preview_invoice(invoice_id):
             'PDF_FILENAME': os.path.basename(invoice.get('pdf_path', "")) if invoice.get('pdf_path') else ""
         }
 
-        return render_template(template_name, **template_data)
+        response = Response(fragment_renderer.render(template_name, template_data), mimetype='text/html')
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         return f"Error: {str(e)}", 500
 
 
+@app.route('/api/invoices/preview', methods=['POST'])
+def preview_draft_invoice():
+    """HTML preview of unsaved invoice JSON; 304 when the draft has not changed."""
+    try:
+        draft = request.get_json(silent=True)
+        if not isinstance(draft, dict):
+            return jsonify({'error': 'Invoice JSON required'}), 400
+
+        etag = draft_etag(draft)
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        return Response(render_draft_preview(draft), mimetype='text/html', headers=headers)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/export-excel')
 def export_excel():
     try:
-        invoices = db.get_all_invoices()
-        excel_path = export_invoices_to_excel(invoices)
-        return send_file(excel_path, as_attachment=True, download_name='invoice_registry.xlsx')
+        # openpyxl is imported on the first export, not at startup
+        from excel_export import stream_invoices_to_excel
+
+        filters = invoice_filters_from_args(request.args)
+        stream = stream_invoices_to_excel(
+            filters,
+            include_items=request.args.get('items') == '1',
+            include_totals=request.args.get('totals') == '1'
+        )
+        return Response(
+            stream,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': 'attachment; filename=invoice_registry.xlsx'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/download-zip', methods=['GET', 'POST'])
+def download_invoice_pdfs():
+    """ZIP of the PDFs of the selected invoices (ids=1,2,3) or of the list filters."""
+    try:
+        filters = invoice_selection_from_args(request.values)
+        stream = stream_invoice_pdfs_zip(
+            filters,
+            render_missing=request.values.get('render', '1') != '0'
+        )
+        return Response(
+            stream,
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=invoices.zip'}
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/bulk-delete', methods=['POST'])
+def bulk_delete_invoices():
+    """Delete the selected invoices (ids) or everything matching the filters."""
+    try:
+        data = request.json or {}
+        return jsonify(delete_invoices(
+            invoice_selection_from_json(data),
+            pdf_action=data.get('pdfs', 'trash')
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/<int:invoice_id>', methods=['DELETE'])
+def delete_invoice(invoice_id):
+    try:
+        result = delete_invoices({'ids': [invoice_id]}, pdf_action=request.args.get('pdfs', 'trash'))
+        if not result['deleted']:
+            return jsonify({'error': 'Invoice not found'}), 404
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/status', methods=['POST'])
+def bulk_set_invoice_status():
+    """Move the selected invoices (ids or filters) to a new status."""
+    try:
+        data = request.json or {}
+        return jsonify(db.set_invoice_status(invoice_selection_from_json(data), data.get('status')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/<int:invoice_id>/status', methods=['POST'])
+def set_invoice_status(invoice_id):
+    try:
+        data = request.json or {}
+        result = db.set_invoice_status({'ids': [invoice_id]}, data.get('status'))
+        if result['rejected']:
+            return jsonify({'error': f"Invoice cannot move to {data.get('status')}"}), 409
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/pdf-cache/stats')
+def get_pdf_cache_stats():
+    try:
+        return jsonify(pdf_cache.stats())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/pdfs/<filename>')
 def serve_pdf(filename):
+    if not os.path.isfile(os.path.join(BASE_DIR, 'pdfs', os.path.basename(filename))):
+        # PDFs of archived fiscal years are served from their year's pack
+        pdf = archives.read_pdf(filename)
+        if pdf is not None:
+            data, digest = pdf
+            return send_file(io.BytesIO(data), mimetype='application/pdf', download_name=filename, etag=digest)
     return send_from_directory('pdfs', filename)
 
 
+@app.route('/api/archives', methods=['GET'])
+def list_archives():
+    try:
+        return jsonify(archives.summary())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/archives', methods=['POST'])
+def archive_year():
+    try:
+        data = request.json or {}
+        return jsonify({'success': True, **archive_fiscal_year(int(data.get('fiscal_year')))})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 def open_browser():
-    time.sleep(2)
+    # Called once the socket is listening: the first page can load right away
     webbrowser.open('http://localhost:3000')
     print("🌐 Browser opened automatically!")
 
 
-if __name__ == '__main__':
+def warm_up():
+    """
+    Load what the first export, upload and PDF render would otherwise
+    load on demand: openpyxl, Pillow, the fingerprinted assets and the
+    (self-warming) PDF render processes.
+    """
+    started = time.perf_counter()
+    import excel_export  # noqa: F401 (openpyxl)
+    import PIL.Image  # noqa: F401 (uploads)
+    static_assets.build()
+    for future in render_queue.warm_up():
+        future.result()
+    print(f"🔥 Warm-up finished in {time.perf_counter() - started:.1f}s")
+
+
+def start_warm_up():
+    """Run warm_up() in the background unless INVOICE_WARMUP=0."""
+    if os.environ.get('INVOICE_WARMUP', '1') == '0':
+        return
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def prepare():
+    """One-time startup work, done by the launching process only."""
     db.init()
+    resumed = render_queue.resume()
+    if resumed:
+        print(f"🔁 Resumed {resumed} pending PDF render job(s)")
 
+
+def print_banner(mode=None):
     print("="*60)
     print("✅ PORTABLE Invoice Software")
     print("="*60)
@@ -401,9 +836,25 @@ if __name__ == '__main__':
     print(f"📄 PDFs: {os.path.join(BASE_DIR, 'pdfs')}")
     print(f"✍️  Signatures: {app.config['UPLOAD_FOLDER']}")
     print(f"🌐 Server: http://localhost:3000")
+    if mode:
+        print(f"⚙️  Mode: {mode}")
     print("="*60)
     print("Ready to use by Rasesh Pradhan")
     print("="*60)
 
+
+if __name__ == '__main__':
+    from werkzeug.serving import make_server
+
+    prepare()
+    print_banner()
+
+    server = make_server('0.0.0.0', 3000, app, threaded=True)
+    start_warm_up()
     threading.Thread(target=open_browser, daemon=True).start()
-    app.run(host='0.0.0.0', port=3000, debug=False, threaded=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_queue.shutdown(wait=False)
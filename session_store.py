@@ -0,0 +1,122 @@
+import time
+import secrets
+import threading
+from flask.sessions import SessionInterface, SessionMixin
+from database import db
+
+
+# Seconds between batch deletes of expired sessions
+PURGE_INTERVAL = 600
+MAX_SESSION_ID_LENGTH = 64
+
+
+class LazySession(SessionMixin):
+    """
+    Server-side session that reads its row from SQLite the first time it
+    is used. Requests that never touch `session` (static files, most API
+    calls) cost no database access at all.
+    """
+
+    def __init__(self, sid=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.expires_at = None
+        self._data = {} if sid is None else None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            stored = db.get_session(self.sid)
+            if stored is None:
+                # Unknown or expired id: start over with a fresh one
+                self._data = {}
+                self.new = True
+            else:
+                self._data, self.expires_at = stored
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Sessions stored as JSON in the `sessions` table, keyed by a random id
+    kept in the session cookie. Expired rows are deleted in batches.
+    """
+
+    def __init__(self):
+        self._last_purge = 0
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > MAX_SESSION_ID_LENGTH:
+            sid = None
+        return LazySession(sid)
+
+    def _purge_expired(self):
+        with self._lock:
+            if time.time() - self._last_purge < PURGE_INTERVAL:
+                return
+            self._last_purge = time.time()
+        db.purge_expired_sessions()
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.loaded:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+
+        if not session:
+            if session.modified and not session.new:
+                db.delete_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Unchanged sessions are only rewritten to slide their expiry
+        # forward once half of the lifetime has passed.
+        if not session.modified and session.expires_at and session.expires_at - now > lifetime / 2:
+            return
+
+        if session.new:
+            session.sid = secrets.token_urlsafe(32)
+        db.save_session(session.sid, dict(session), now + lifetime)
+        self._purge_expired()
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
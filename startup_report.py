@@ -0,0 +1,140 @@
+"""
+Cold-start report: where the server's first second goes.
+
+Starts a fresh interpreter, the way run_portable.cmd does, and times:
+    import server          every module the app loads before serving
+    db.init()              schema check / migrations
+    first GET /            the dashboard page
+    first GET /api/invoices
+    warm_up()              only with --warm-up (normally runs in the background)
+
+Then lists the slowest modules imported by server.py (from
+`python -X importtime`). It also flags the heavy stacks (xhtml2pdf,
+reportlab, openpyxl, Pillow) if any of them was imported before the
+first page was served. They should load lazily or during the warm-up.
+
+Usage:
+    python startup_report.py [--db data/invoices.db] [--top 15] [--warm-up]
+
+Without --db a new, empty database is used, so nothing is changed.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Must not be imported before the first page is served
+HEAVY_MODULES = ('xhtml2pdf.pisa', 'reportlab.pdfgen', 'openpyxl', 'PIL.Image')
+
+# Runs in the measured interpreter; prints the milestones as JSON
+CHILD_SCRIPT = r'''
+import sys, json, time
+marks = [('interpreter', time.perf_counter())]
+import server
+marks.append(('import server', time.perf_counter()))
+server.db.init()
+marks.append(('db.init()', time.perf_counter()))
+client = server.app.test_client()
+assert client.get('/').status_code == 200
+marks.append(('first GET /', time.perf_counter()))
+assert client.get('/api/invoices').status_code == 200
+marks.append(('first GET /api/invoices', time.perf_counter()))
+heavy = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+if sys.argv[2] == '1':
+    server.warm_up()
+    marks.append(('warm_up()', time.perf_counter()))
+    server.render_queue.shutdown(wait=True)
+print(json.dumps({'marks': marks, 'heavy': heavy}))
+'''
+
+
+def parse_importtime(stderr):
+    """(module, cumulative_us, depth) for every `-X importtime` line, in output order."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules.append((name.strip(), int(cumulative_us), depth))
+    return modules
+
+
+def server_imports(modules):
+    """
+    Modules imported directly by server.py, with their cumulative time.
+    importtime prints a module after its own imports, so these are the
+    depth-1 lines just before the top-level `server` line.
+    """
+    end = next((i for i, (name, _, depth) in enumerate(modules) if name == 'server' and depth == 0), None)
+    if end is None:
+        return None, []
+    begin = end
+    while begin > 0 and modules[begin - 1][2] > 0:
+        begin -= 1
+    direct = [(name, cumulative_us) for name, cumulative_us, depth in modules[begin:end] if depth == 1]
+    return modules[end][1], sorted(direct, key=lambda m: m[1], reverse=True)
+
+
+def run_child(db_path, warm_up):
+    # The background warm-up would import the heavy stacks mid-measurement
+    env = dict(os.environ, INVOICE_DB_PATH=db_path, INVOICE_WARMUP='0')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT,
+         json.dumps(HEAVY_MODULES), '1' if warm_up else '0'],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Measured process failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report, parse_importtime(result.stderr)
+
+
+def print_report(report, modules, top):
+    marks = report['marks']
+    start = previous = marks[0][1]
+    print("⏱️  Cold start (after interpreter start-up)")
+    for name, at in marks[1:]:
+        print(f"   {name:<26} +{(at - previous) * 1000:7.1f} ms   {(at - start) * 1000:7.1f} ms")
+        previous = at
+
+    total_us, direct = server_imports(modules)
+    if total_us is not None:
+        print(f"\n📦 import server: {total_us / 1000:.1f} ms, slowest direct imports:")
+        for name, cumulative_us in direct[:top]:
+            print(f"   {name:<32} {cumulative_us / 1000:7.1f} ms")
+
+    if report['heavy']:
+        print(f"\n⚠️  Imported before the first page: {', '.join(report['heavy'])}")
+    else:
+        print("\n✅ No PDF/Excel/image stack imported before the first page")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the server's cold start")
+    parser.add_argument('--db', help="Database to start against (default: a new, empty one)")
+    parser.add_argument('--top', type=int, default=15, help="Slowest imports to list")
+    parser.add_argument('--warm-up', action='store_true', help="Also time the background warm-up")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.db:
+            report, modules = run_child(os.path.abspath(args.db), args.warm_up)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                report, modules = run_child(os.path.join(tmp, 'startup.db'), args.warm_up)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print_report(report, modules, args.top)
+    return 1 if report['heavy'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
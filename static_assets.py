@@ -0,0 +1,270 @@
+"""
+Fingerprinted, precompressed static assets.
+
+Every script, stylesheet and image in public/ is copied to data/static as
+<name>.<hash>.<ext> (plus .gz, and .br when the `brotli` package is
+installed) and served from /assets/ with a one-year immutable Cache-Control.
+The HTML pages are served with their asset references rewritten to the
+fingerprinted URLs and `no-cache`, so a repeat visit costs one 304 per page.
+
+Assets are re-fingerprinted when their source file changes (an edited
+script, an uploaded logo); builds made by this process stay servable
+because their content never changes. /assets/ only serves names in the
+manifest: an unknown name rebuilds it only if public/ changed since the
+last build, so made-up names cost a directory scan, not a build.
+`python static_assets.py` prebuilds everything.
+"""
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+from flask import Response, abort, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(BASE_DIR, 'public')
+BUILD_DIR = os.path.join(BASE_DIR, 'data', 'static')
+ASSET_URL_PREFIX = '/assets/'
+
+FINGERPRINT_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2')
+COMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.html')
+# Compressing tiny files costs more in headers than it saves
+MIN_COMPRESS_SIZE = 512
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+
+# href="style.css" / src="/app.js": plain local references only
+_REFERENCE_RE = re.compile(r'''(\b(?:href|src)=)(["'])/?([\w.\-]+)\2''')
+
+
+def _compress(data, ext):
+    """(encoding, bytes) variants worth storing next to the original."""
+    if ext not in COMPRESS_EXTENSIONS or len(data) < MIN_COMPRESS_SIZE:
+        return []
+    variants = [('gzip', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', brotli.compress(data, quality=11)))
+    return [(encoding, body) for encoding, body in variants if len(body) < len(data)]
+
+
+_ENCODING_SUFFIX = {'gzip': '.gz', 'br': '.br'}
+
+
+def _write_once(path, data):
+    """Content-addressed files never change; write them atomically once."""
+    if os.path.exists(path):
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _accepted_encodings(available):
+    """Encodings from `available` the client accepts, best first."""
+    accepted = request.accept_encodings
+    return [encoding for encoding in ('br', 'gzip') if encoding in available and accepted[encoding]]
+
+
+class StaticAssets:
+    """Manifest of fingerprinted assets and rewritten HTML pages."""
+
+    def __init__(self, public_dir=PUBLIC_DIR, build_dir=BUILD_DIR):
+        self.public_dir = public_dir
+        self.build_dir = build_dir
+        # name -> (mtime_ns, size, fingerprinted name)
+        self._assets = {}
+        # page -> (stamp, body, etag, {encoding: body}, source)
+        self._pages = {}
+        # Every fingerprinted name built by this process: what /assets/ serves
+        self._built = set()
+        # public/ as of the last build(), None before the first one
+        self._build_stamp = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _source(self, name):
+        path = os.path.join(self.public_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        return path, (stat.st_mtime_ns, stat.st_size)
+
+    def fingerprint(self, name):
+        """Fingerprinted file name for public/<name>, or None if not an asset."""
+        if os.path.splitext(name)[1].lower() not in FINGERPRINT_EXTENSIONS:
+            return None
+        path, stamp = self._source(name)
+        if path is None:
+            return None
+
+        cached = self._assets.get(name)
+        if cached and cached[:2] == stamp:
+            return cached[2]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        built = f"{stem}.{digest}{ext}"
+
+        os.makedirs(self.build_dir, exist_ok=True)
+        target = os.path.join(self.build_dir, built)
+        _write_once(target, data)
+        for encoding, body in _compress(data, ext.lower()):
+            _write_once(target + _ENCODING_SUFFIX[encoding], body)
+
+        with self._lock:
+            self._assets[name] = (stamp[0], stamp[1], built)
+            self._built.add(built)
+        return built
+
+    def url(self, name):
+        """Cacheable URL for public/<name>, falling back to the plain path."""
+        built = self.fingerprint(name)
+        return f"{ASSET_URL_PREFIX}{built}" if built else f"/{name}"
+
+    def _rewrite(self, html):
+        def replace(match):
+            attr, quote, name = match.groups()
+            built = self.fingerprint(name)
+            if built is None:
+                return match.group(0)
+            return f"{attr}{quote}{ASSET_URL_PREFIX}{built}{quote}"
+        return _REFERENCE_RE.sub(replace, html)
+
+    def page(self, name):
+        """(body, etag, compressed variants) of an HTML page, or None."""
+        path, stamp = self._source(name)
+        if path is None:
+            return None
+
+        cached = self._pages.get(name)
+        if cached and cached[0] == stamp:
+            # Referenced assets may have changed without the page changing
+            body = self._rewrite(cached[4]).encode('utf-8')
+            if body == cached[1]:
+                return cached[1:4]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        body = self._rewrite(source).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:HASH_LENGTH * 2]
+        variants = dict(_compress(body, '.html'))
+        with self._lock:
+            self._pages[name] = (stamp, body, etag, variants, source)
+        return body, etag, variants
+
+    def _public_stamp(self):
+        """(name, mtime_ns, size) of every file in public/."""
+        stamp = []
+        with os.scandir(self.public_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stamp.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return sorted(stamp)
+
+    def build(self):
+        """Fingerprint every asset and page in public/ ahead of the first request."""
+        with self._build_lock:
+            stamp = self._public_stamp()
+            for name, _, _ in stamp:
+                if name.lower().endswith('.html'):
+                    self.page(name)
+                else:
+                    self.fingerprint(name)
+            self._build_stamp = stamp
+
+    def _build_if_stale(self):
+        """Rebuild only when public/ changed since the last build (or never built)."""
+        if self._public_stamp() != self._build_stamp:
+            self.build()
+
+    # ------------------------------------------------------------
+    # Responses
+    # ------------------------------------------------------------
+
+    def page_response(self, name):
+        page = self.page(name)
+        if page is None:
+            abort(404)
+        body, etag, variants = page
+
+        encodings = _accepted_encodings(variants)
+        if encodings:
+            body = variants[encodings[0]]
+        response = Response(body, mimetype='text/html')
+        if encodings:
+            response.headers['Content-Encoding'] = encodings[0]
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{etag}-{encodings[0]}" if encodings else etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def asset_response(self, built):
+        if os.path.basename(built) != built:
+            abort(404)
+        if built not in self._built:
+            # Not built yet in this process, or a name we never produced
+            self._build_if_stale()
+            if built not in self._built:
+                abort(404)
+        path = os.path.join(self.build_dir, built)
+        if not os.path.isfile(path):
+            abort(404)
+
+        available = [e for e, suffix in _ENCODING_SUFFIX.items() if os.path.isfile(path + suffix)]
+        encodings = _accepted_encodings(available)
+        digest = built.rsplit('.', 2)[-2]
+        if encodings:
+            response = send_file(
+                path + _ENCODING_SUFFIX[encodings[0]],
+                mimetype=mimetypes.guess_type(built)[0] or 'application/octet-stream',
+                etag=f"{digest}-{encodings[0]}",
+                max_age=IMMUTABLE_MAX_AGE
+            )
+            response.headers['Content-Encoding'] = encodings[0]
+        else:
+            response = send_file(path, etag=digest, max_age=IMMUTABLE_MAX_AGE)
+        if available:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+static_assets = StaticAssets()
+
+
+def init_app(app):
+    """Serve HTML pages and /assets/ through the fingerprinting pipeline."""
+
+    @app.route('/')
+    def index():
+        return static_assets.page_response('index.html')
+
+    @app.route('/<page>.html')
+    def html_page(page):
+        return static_assets.page_response(f"{page}.html")
+
+    @app.route(f"{ASSET_URL_PREFIX}<built>")
+    def fingerprinted_asset(built):
+        return static_assets.asset_response(built)
+
+    # Assets are fingerprinted as pages reference them; build() is run by
+    # the server's background warm-up instead of delaying startup
+
+
+if __name__ == '__main__':
+    static_assets.build()
+    for name, (_, _, built) in sorted(static_assets._assets.items()):
+        print(f"{name} -> {ASSET_URL_PREFIX}{built}")
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads these at import time: point it at a throwaway database
+# and keep the background warm-up out of the tests.
+_DATA_DIR = tempfile.mkdtemp(prefix='invoice-tests-')
+os.environ['INVOICE_DB_PATH'] = os.path.join(_DATA_DIR, 'invoices.db')
+os.environ['INVOICE_WARMUP'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def db():
+    from database import db
+    db.init()
+    return db
+
+
+@pytest.fixture
+def client(db):
+    from server import app
+    return app.test_client()
+
+
+def make_invoice(number=None, **fields):
+    """Invoice dict for db.save_invoice with one line item."""
+    invoice = {
+        'invoice_number': number,
+        'date': '2026-02-01',
+        'type': 'Sample',
+        'items': [{'item': 'hay bale', 'quantity': 2, 'units': 'u', 'unit_price': 10}],
+    }
+    invoice.update(fields)
+    return invoice
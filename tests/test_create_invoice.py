@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import make_invoice
+
+
+@pytest.fixture(autouse=True)
+def no_render(monkeypatch):
+    # Creating an invoice queues a PDF render; these tests only check the rows
+    from render_jobs import render_queue
+    monkeypatch.setattr(render_queue, 'submit', lambda *args, **kwargs: None)
+
+
+def test_explicit_number_already_used_is_rejected(db, client):
+    assert client.post('/api/invoices', json=make_invoice('DUP-1')).status_code == 200
+
+    response = client.post('/api/invoices', json=make_invoice('DUP-1'))
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body['code'] == 'invoice_number_taken'
+    assert body['next_invoice_number'] == db.get_next_invoice_number()
+
+
+def test_other_constraint_failures_are_bad_requests(client):
+    invoice = make_invoice('NULL-ITEM-1', items=[{'item': None, 'quantity': 1, 'units': 'u', 'unit_price': 1}])
+    response = client.post('/api/invoices', json=invoice)
+    assert response.status_code == 400
+    assert 'NOT NULL' in response.get_json()['error']
+
+
+def test_sequence_skips_numbers_already_used(db, client):
+    taken = db.get_next_invoice_number()
+    # A row with the next number that did not move the sequence (e.g. an old import)
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO invoices (invoice_number, date, type) VALUES (?, '2026-02-01', 'Sample')",
+            (taken,)
+        )
+    assert db.get_next_invoice_number() == taken
+
+    response = client.post('/api/invoices', json=make_invoice(None))
+    assert response.status_code == 200
+    assert response.get_json()['invoice_number'] not in (None, taken)
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from conftest import make_invoice
+
+
+def _count(db, sql, *params):
+    with db.read() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def test_delete_invoices_cascades_to_items_and_render_jobs(db):
+    ids = [db.save_invoice(make_invoice(f'DEL-{n}')) for n in range(3)]
+    db.create_render_job(ids[0], {'invoice_number': 'DEL-0'})
+
+    deleted = db.delete_invoices({'ids': ids[:2]})
+
+    assert sorted(number for _, number, _ in deleted) == ['DEL-0', 'DEL-1']
+    assert _count(db, "SELECT COUNT(*) FROM invoice_items WHERE invoice_id IN (?, ?)", *ids[:2]) == 0
+    assert _count(db, "SELECT COUNT(*) FROM render_jobs WHERE invoice_id = ?", ids[0]) == 0
+    assert _count(db, "SELECT COUNT(*) FROM invoice_items WHERE invoice_id = ?", ids[2]) == 1
+    assert _count(db, "SELECT COUNT(*) FROM invoice_search WHERE rowid IN (?, ?)", *ids[:2]) == 0
+
+
+def test_foreign_keys_are_enforced(db):
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.write() as conn:
+            conn.execute(
+                "INSERT INTO invoice_items (invoice_id, item, quantity, units, unit_price) "
+                "VALUES (-1, 'orphan', 1, 'u', 1)"
+            )
+
+
+def test_vendor_used_by_invoices_cannot_be_deleted(db, client):
+    used = db.add_vendor('Used Vendor', '', '')
+    unused = db.add_vendor('Unused Vendor', '', '')
+    db.save_invoice(make_invoice('VENDOR-USED-1', vendor_id=used))
+
+    response = client.delete(f'/api/vendors/{used}')
+    assert response.status_code == 409
+    assert '1 invoice' in response.get_json()['error']
+    assert client.delete(f'/api/vendors/{unused}').status_code == 200
+
+
+def test_old_schema_is_rebuilt_with_cascades(tmp_path):
+    from database import Database
+
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE invoices (id INTEGER PRIMARY KEY AUTOINCREMENT, invoice_number TEXT UNIQUE NOT NULL,
+            date TEXT NOT NULL, type TEXT NOT NULL, vendor_id INTEGER, hst_gst_number TEXT, comments TEXT,
+            terms_conditions TEXT, signature_id INTEGER, shipping_method TEXT, shipping_terms TEXT,
+            delivery_date TEXT, tax_rate REAL DEFAULT 13.0, shipping_cost REAL DEFAULT 0, notes TEXT,
+            status TEXT DEFAULT 'Draft', created_by TEXT, pdf_path TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE invoice_items (id INTEGER PRIMARY KEY AUTOINCREMENT, invoice_id INTEGER NOT NULL,
+            lot_number TEXT, item TEXT NOT NULL, quantity REAL NOT NULL, units TEXT NOT NULL,
+            unit_price REAL NOT NULL, FOREIGN KEY (invoice_id) REFERENCES invoices(id));
+        INSERT INTO invoices (invoice_number, date, type) VALUES ('OLD-1', '2025-01-01', 'Sample');
+        INSERT INTO invoice_items (invoice_id, item, quantity, units, unit_price)
+        VALUES (1, 'kept', 1, 'u', 1), (99, 'orphan', 1, 'u', 1);
+    """)
+    conn.close()
+
+    old = Database(path)
+    old.init()
+    assert _count(old, "SELECT COUNT(*) FROM invoice_items") == 1
+    old.delete_invoices({'ids': [1]})
+    assert _count(old, "SELECT COUNT(*) FROM invoice_items") == 0
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from conftest import make_invoice
+
+
+@pytest.fixture(autouse=True)
+def no_render(monkeypatch):
+    from render_jobs import render_queue
+    monkeypatch.setattr(render_queue, 'submit', lambda *args, **kwargs: None)
+
+
+def run_together(count, target):
+    """Run target(index) on `count` threads released at the same moment."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not errors, errors
+
+
+def suffixes(numbers):
+    return sorted(int(number.rsplit('-', 1)[1]) for number in numbers)
+
+
+def test_concurrent_creates_get_unique_consecutive_numbers(db):
+    numbers = []
+    first = suffixes([db.get_next_invoice_number()])[0]
+
+    def create(index):
+        for _ in range(5):
+            invoice = make_invoice(None)
+            db.save_invoice(invoice)
+            numbers.append(invoice['invoice_number'])
+
+    run_together(8, create)
+
+    assert suffixes(numbers) == list(range(first, first + 40))
+
+
+def test_concurrent_single_and_bulk_creates_share_the_sequence(db):
+    numbers = []
+
+    def create(index):
+        if index % 2:
+            invoices = [make_invoice(None) for _ in range(5)]
+            db.save_invoices_bulk(invoices)
+            numbers.extend(invoice['invoice_number'] for invoice in invoices)
+        else:
+            invoice = make_invoice(None)
+            db.save_invoice(invoice)
+            numbers.append(invoice['invoice_number'])
+
+    run_together(6, create)
+
+    assert len(numbers) == 18
+    assert len(set(numbers)) == 18
+
+
+def test_concurrent_requests_for_the_same_number_conflict(db):
+    from server import app
+    statuses = []
+
+    def create(index):
+        with app.test_client() as own_client:
+            statuses.append(own_client.post('/api/invoices', json=make_invoice('RACE-1')).status_code)
+
+    run_together(6, create)
+
+    assert sorted(statuses) == [200] + [409] * 5
@@ -0,0 +1,30 @@
+import io
+
+import pytest
+
+from conftest import make_invoice
+
+# 1.005 x 1 is 1.00499999... as a binary float: SQL rounding gives 1.00,
+# invoice_totals (Decimal, ROUND_HALF_UP) gives 1.01
+ITEM = {'item': 'half cent', 'quantity': 1, 'units': 'u', 'unit_price': 1.005}
+
+
+@pytest.fixture(scope='module')
+def invoice_id(db):
+    return db.save_invoice(make_invoice('HALF-CENT-1', items=[ITEM]))
+
+
+def test_preview_line_total_uses_decimal_rounding(client, invoice_id):
+    html = client.get(f'/preview-invoice/{invoice_id}').get_data(as_text=True)
+    assert '<td class="right total-col">$1.01</td>' in html
+
+
+def test_excel_line_total_uses_decimal_rounding(invoice_id):
+    import openpyxl
+    from excel_export import export_invoices_to_excel
+
+    buffer = io.BytesIO()
+    export_invoices_to_excel(buffer, include_items=True)
+    sheet = openpyxl.load_workbook(buffer)['Line Items']
+    rows = [row for row in sheet.iter_rows(values_only=True) if row[0] == 'HALF-CENT-1']
+    assert [row[-1] for row in rows] == [1.01]
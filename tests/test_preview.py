@@ -0,0 +1,37 @@
+from conftest import make_invoice
+
+SCRIPT = '<script>alert(1)</script>'
+
+
+def _assert_escaped(html):
+    assert SCRIPT not in html
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in html
+
+
+def test_saved_invoice_preview_escapes_user_fields(db, client):
+    vendor_id = db.add_vendor(f'Evil {SCRIPT} & Co', SCRIPT, '')
+    invoice_id = db.save_invoice(make_invoice(
+        'XSS-1', vendor_id=vendor_id, comments=SCRIPT,
+        items=[{'item': SCRIPT, 'lot_number': SCRIPT, 'quantity': 1, 'units': 'u', 'unit_price': 1}]
+    ))
+
+    response = client.get(f'/preview-invoice/{invoice_id}')
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    _assert_escaped(html)
+    assert 'Evil &lt;script&gt;' in html
+    assert '&amp; Co' in html
+
+
+def test_draft_preview_escapes_user_fields(client):
+    response = client.post('/api/invoices/preview', json={
+        'invoice_number': 'DRAFT-XSS',
+        'vendor_name': SCRIPT,
+        'comments': SCRIPT,
+        'items': [{'item': SCRIPT, 'quantity': 1, 'units': SCRIPT, 'unit_price': 1}],
+    })
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    _assert_escaped(html)
+    # Cached fragments are inserted as HTML, not escaped a second time
+    assert '&amp;lt;' not in html
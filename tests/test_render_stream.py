@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+
+from render_jobs import render_queue
+
+
+def consume(stream, timeout=5):
+    """All items of the stream, failing instead of hanging if it never ends."""
+    items = []
+    reader = threading.Thread(target=lambda: items.extend(stream), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    assert not reader.is_alive(), "render stream never ended"
+    return items
+
+
+def done(path):
+    future = Future()
+    future.set_result((path, []))
+    return future
+
+
+def test_input_error_on_first_entry_ends_the_stream():
+    def entries():
+        raise RuntimeError("database is locked")
+        yield
+
+    items = consume(render_queue._stream(entries(), done, lambda entry: entry, 2))
+
+    assert items == [(None, None, "Reading the next entry failed: database is locked")]
+
+
+def test_input_error_in_done_callback_ends_the_stream():
+    pending = Future()
+
+    def entries():
+        yield 1
+        raise RuntimeError("database is locked")
+
+    # One slot: the second entry is only read from the first job's callback
+    stream = render_queue._stream(entries(), lambda entry: pending, lambda entry: entry, 1)
+    threading.Timer(0.05, pending.set_result, [('one.pdf', [])]).start()
+    items = consume(stream)
+
+    assert sorted(items, key=str) == sorted([
+        (1, 'one.pdf', None),
+        (None, None, "Reading the next entry failed: database is locked"),
+    ], key=str)
+
+
+def test_failed_start_is_reported_and_the_stream_continues():
+    def start(entry):
+        if entry == 2:
+            raise ValueError("no template")
+        return done(f"{entry}.pdf")
+
+    items = consume(render_queue._stream(iter([1, 2, 3]), start, lambda entry: entry, 1))
+
+    assert sorted(items) == [(1, '1.pdf', None), (2, None, 'no template'), (3, '3.pdf', None)]
@@ -0,0 +1,59 @@
+import pytest
+from werkzeug.exceptions import NotFound
+
+from server import app
+from static_assets import StaticAssets
+
+
+@pytest.fixture
+def assets(tmp_path):
+    public = tmp_path / 'public'
+    public.mkdir()
+    (public / 'app.js').write_text("console.log('v1');\n")
+    (public / 'index.html').write_text('<script src="app.js"></script>')
+    assets = StaticAssets(str(public), str(tmp_path / 'static'))
+    builds = []
+    build = assets.build
+    assets.build = lambda: builds.append(1) or build()
+    assets.builds = builds
+    return assets
+
+
+def serve(assets, built):
+    with app.test_request_context(f"/assets/{built}"):
+        return assets.asset_response(built)
+
+
+def test_first_request_builds_the_manifest(assets, tmp_path):
+    built = StaticAssets(assets.public_dir, str(tmp_path / 'other')).fingerprint('app.js')
+
+    response = serve(assets, built)
+    response.close()
+
+    assert response.status_code == 200
+    assert assets.builds == [1]
+
+
+def test_unknown_names_do_not_rebuild(assets):
+    assets.build()
+    for name in ('app.000000000000.js', 'nope.js', 'app.js'):
+        with pytest.raises(NotFound):
+            serve(assets, name)
+    assert assets.builds == [1]
+
+
+def test_changed_source_is_rebuilt_once(assets, tmp_path):
+    assets.build()
+    old = assets.fingerprint('app.js')
+    (tmp_path / 'public' / 'app.js').write_text("console.log('version 2');\n")
+    new = StaticAssets(assets.public_dir, str(tmp_path / 'other')).fingerprint('app.js')
+
+    response = serve(assets, new)
+    response.close()
+    with pytest.raises(NotFound):
+        serve(assets, 'app.ffffffffffff.js')
+
+    assert response.status_code == 200
+    assert assets.builds == [1, 1]
+    # Earlier builds stay servable to pages loaded before the change
+    serve(assets, old).close()
@@ -0,0 +1,38 @@
+def names(vendors):
+    return [vendor['name'] for vendor in vendors]
+
+
+def test_prefix_matches_come_before_substring_matches(db):
+    for name in ('Zorvex Mills', 'Älpine Zorvex', 'zorvex farms', 'Other Co'):
+        db.add_vendor(name, '', '')
+
+    assert names(db.search_vendors('ZORV')) == ['zorvex farms', 'Zorvex Mills', 'Älpine Zorvex']
+    assert names(db.search_vendors('alpine zo')) == ['Älpine Zorvex']
+    assert names(db.search_vendors('zorvex', limit=1)) == ['zorvex farms']
+
+
+def test_like_wildcards_match_literally(db):
+    for name in ('Qwib_50% Feed', 'Qwibx50x Feed'):
+        db.add_vendor(name, '', '')
+
+    assert names(db.search_vendors('qwib_50%')) == ['Qwib_50% Feed']
+
+
+def test_search_route(client):
+    client.post('/api/vendors', json={'name': 'Yarrowdale Hay', 'address': '', 'contact': ''})
+
+    response = client.get('/api/vendors/search?q=yarrowd')
+
+    assert response.status_code == 200
+    assert names(response.get_json()) == ['Yarrowdale Hay']
+
+
+def test_full_list_is_conditional(client):
+    first = client.get('/api/vendors')
+    again = client.get('/api/vendors', headers={'If-None-Match': first.headers['ETag']})
+    client.post('/api/vendors', json={'name': 'Brand New Vendor', 'address': '', 'contact': ''})
+    changed = client.get('/api/vendors', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
+    assert changed.status_code == 200
+    assert 'Brand New Vendor' in names(changed.get_json())
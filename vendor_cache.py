@@ -0,0 +1,39 @@
+import json
+import hashlib
+import threading
+from database import db
+
+
+class VendorCache:
+    """
+    The full vendor list kept in memory as its JSON body and ETag, so a
+    page load costs one version read instead of serializing every vendor.
+    Typeahead searches go to the database (Database.search_vendors).
+
+    Reloaded when the vendor version in the database changes (a trigger
+    bumps it on every insert, update and delete), so changes made through
+    any worker process or the bulk importer are seen on the next request.
+    """
+
+    def __init__(self):
+        self.version = None
+        # (JSON body, ETag), replaced as a whole on reload
+        self._snapshot = (b'[]', None)
+        self._lock = threading.Lock()
+
+    def _current(self):
+        version = db.get_vendor_version()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    body = json.dumps(db.get_all_vendors(), separators=(',', ':')).encode('utf-8')
+                    self._snapshot = (body, hashlib.sha256(body).hexdigest()[:32])
+                    self.version = version
+        return self._snapshot
+
+    def full_list(self):
+        """(JSON body, ETag) of the full vendor list."""
+        return self._current()
+
+
+vendor_cache = VendorCache()
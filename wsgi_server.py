@@ -0,0 +1,275 @@
+"""
+Production launcher: the Flask app served by several worker processes.
+
+    python wsgi_server.py [--workers N] [--host 0.0.0.0] [--port 3000]
+    python wsgi_server.py --reload
+
+The master process initialises the database and resumes pending PDF
+render jobs once, binds the listening socket and then starts the workers
+(INVOICE_WORKERS, default one per CPU core). Each worker imports the app
+and accepts connections on the shared socket with its own SQLite
+connections; writes from different processes are serialized by SQLite
+(WAL, BEGIN IMMEDIATE, busy timeout).
+
+Graceful reload (new code, templates or settings): SIGHUP on Linux/macOS,
+or `python wsgi_server.py --reload` on any platform. A new set of workers
+is started and the old ones stop accepting, finish their in-flight
+requests and exit. Crashed workers are replaced automatically.
+
+With INVOICE_METRICS=1, /metrics adds up the histograms of all workers
+(see metrics.py).
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RELOAD_FILE = os.path.join(BASE_DIR, 'data', 'server.reload')
+METRICS_DIR = os.path.join(BASE_DIR, 'data', 'metrics')
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 3000
+LISTEN_BACKLOG = 128
+# Seconds a new worker may take to import the app before a reload gives up
+READY_TIMEOUT = 60
+# Seconds old workers get to finish their requests on reload/shutdown
+GRACEFUL_TIMEOUT = 30
+# Minimum seconds between restarts of a crashing worker slot
+RESTART_DELAY = 1
+POLL_INTERVAL = 0.5
+
+
+def _worker_main(sock, host, ready, stop):
+    """Worker process: serve the app on the inherited socket until `stop`."""
+    # Ctrl+C reaches every process in the console; only the master reacts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    from werkzeug.serving import ThreadedWSGIServer
+    from server import app, start_warm_up
+
+    class DrainingServer(ThreadedWSGIServer):
+        # Non-daemon request threads are joined by server_close(), so
+        # stopping a worker lets in-flight requests finish
+        daemon_threads = False
+
+    server = DrainingServer(host, sock.getsockname()[1], app, fd=sock.fileno())
+    sock.close()
+
+    def wait_for_stop():
+        # Also stop if the master dies without telling us
+        parent = multiprocessing.parent_process()
+        while not stop.wait(POLL_INTERVAL):
+            if parent is not None and not parent.is_alive():
+                break
+        server.shutdown()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    ready.set()
+    start_warm_up()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        from render_jobs import render_queue
+        render_queue.shutdown(wait=True)
+        import metrics
+        metrics.flush()
+
+
+class Worker:
+    def __init__(self, context, sock, host):
+        self.ready = context.Event()
+        self.stop = context.Event()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(sock, host, self.ready, self.stop),
+            name='invoice-worker'
+        )
+        self.process.start()
+        self.stopping_since = None
+
+    def request_stop(self):
+        if self.stopping_since is None:
+            self.stop.set()
+            self.stopping_since = time.monotonic()
+
+
+class Supervisor:
+    """Keeps `workers` worker processes serving the shared socket."""
+
+    def __init__(self, sock, host, workers):
+        self.sock = sock
+        self.host = host
+        self.workers = workers
+        # spawn on every platform: workers never inherit the master's
+        # SQLite connections or threads through fork()
+        self._context = multiprocessing.get_context('spawn')
+        self._active = []
+        self._draining = []
+        self._last_start = 0
+        self._reload_requested = False
+        self._stop_requested = False
+        self._reload_mtime = _reload_mtime()
+
+    def _start_worker(self):
+        self._last_start = time.monotonic()
+        return Worker(self._context, self.sock, self.host)
+
+    def request_reload(self, *args):
+        self._reload_requested = True
+
+    def request_stop(self, *args):
+        self._stop_requested = True
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.request_reload)
+
+    def reload(self):
+        """Start a fresh set of workers, then drain the old ones."""
+        print(f"🔄 Reloading {self.workers} worker(s)...")
+        fresh = [self._start_worker() for _ in range(self.workers)]
+        deadline = time.monotonic() + READY_TIMEOUT
+        for worker in fresh:
+            worker.ready.wait(max(0, deadline - time.monotonic()))
+
+        if not all(worker.ready.is_set() for worker in fresh):
+            # Broken code or config: keep the old workers serving
+            print("❌ New workers did not start; keeping the running ones")
+            for worker in fresh:
+                worker.request_stop()
+                worker.process.terminate()
+            self._draining.extend(fresh)
+            return
+
+        for worker in self._active:
+            worker.request_stop()
+        self._draining.extend(self._active)
+        self._active = fresh
+        print("✅ Reload complete")
+
+    def _reap(self):
+        now = time.monotonic()
+        for worker in list(self._draining):
+            if not worker.process.is_alive():
+                worker.process.join()
+                self._draining.remove(worker)
+            elif now - worker.stopping_since > GRACEFUL_TIMEOUT:
+                worker.process.terminate()
+
+        for idx, worker in enumerate(self._active):
+            if worker.process.is_alive():
+                continue
+            if now - self._last_start < RESTART_DELAY:
+                continue
+            print(f"⚠️  Worker {worker.process.pid} exited ({worker.process.exitcode}); restarting")
+            worker.process.join()
+            self._active[idx] = self._start_worker()
+
+    def run(self):
+        self._active = [self._start_worker() for _ in range(self.workers)]
+        try:
+            while not self._stop_requested:
+                time.sleep(POLL_INTERVAL)
+                mtime = _reload_mtime()
+                if mtime != self._reload_mtime:
+                    self._reload_mtime = mtime
+                    self._reload_requested = True
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self._reap()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        print("🛑 Stopping workers...")
+        workers = self._active + self._draining
+        for worker in workers:
+            worker.request_stop()
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for worker in workers:
+            worker.process.join(max(0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self._active = []
+        self._draining = []
+
+
+def _reload_mtime():
+    try:
+        return os.stat(RELOAD_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def request_reload():
+    """Ask a running master (in any process) to reload its workers."""
+    os.makedirs(os.path.dirname(RELOAD_FILE), exist_ok=True)
+    with open(RELOAD_FILE, 'a'):
+        pass
+    os.utime(RELOAD_FILE)
+
+
+def default_workers():
+    return int(os.environ.get('INVOICE_WORKERS') or 0) or os.cpu_count() or 1
+
+
+def serve(workers=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    workers = workers or default_workers()
+    # Share the cores between the workers' PDF render pools
+    os.environ.setdefault('INVOICE_RENDER_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+    import metrics
+    if metrics.ENABLED:
+        # Each worker keeps its own histograms; /metrics adds them up
+        metrics.prepare_multiprocess(METRICS_DIR)
+
+    from server import prepare, print_banner, open_browser
+    from render_jobs import render_queue
+
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    prepare()
+    print_banner(f"production, {workers} worker process(es)")
+
+    supervisor = Supervisor(sock, host, workers)
+    supervisor.install_signal_handlers()
+    threading.Thread(target=open_browser, daemon=True).start()
+    try:
+        supervisor.run()
+    finally:
+        sock.close()
+        render_queue.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the invoice server with multiple worker processes.')
+    parser.add_argument('--workers', type=int, help='worker processes (default: INVOICE_WORKERS or CPU count)')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--reload', action='store_true', help='gracefully reload a running server and exit')
+    args = parser.parse_args()
+
+    if args.reload:
+        request_reload()
+        print("🔄 Reload requested")
+        return 0
+
+    serve(args.workers, args.host, args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import zipfile
+from database import db
+from render_jobs import render_queue
+
+
+PDF_DIR = os.path.join(os.path.dirname(__file__), 'pdfs')
+
+# Bytes read from a PDF per write into the archive
+READ_CHUNK_SIZE = 64 * 1024
+# Invoices loaded per detail query when re-rendering
+DETAIL_BATCH_SIZE = 100
+
+MISSING_MANIFEST = 'MISSING.txt'
+
+
+def local_pdf_path(pdf_path):
+    """
+    Stored paths may have been written on another machine;
+    the file itself always lives in pdfs/ under its own name.
+    """
+    if not pdf_path:
+        return None
+    return os.path.join(PDF_DIR, os.path.basename(pdf_path.replace('\\', '/')))
+
+
+class _ChunkSink:
+    """
+    Unseekable file object for ZipFile. Without tell()/seek() ZipFile
+    writes data descriptors instead of patching headers, so every byte
+    can be handed to the response as soon as it is written.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _arcname(names, filename):
+    """Unique name inside the archive."""
+    base, ext = os.path.splitext(filename)
+    name = filename
+    n = 2
+    while name in names:
+        name = f"{base} ({n}){ext}"
+        n += 1
+    names.add(name)
+    return name
+
+
+def _write_pdf(zf, sink, path, names):
+    """Copy one PDF into the archive, yielding output chunk by chunk."""
+    info = zipfile.ZipInfo.from_file(path, _arcname(names, os.path.basename(path)))
+    info.compress_type = zipfile.ZIP_DEFLATED
+
+    with open(path, 'rb') as src, zf.open(info, 'w') as dest:
+        while True:
+            chunk = src.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            dest.write(chunk)
+            if sink.buffer:
+                yield sink.drain()
+    yield sink.drain()
+
+
+def _render_payloads(missing):
+    """Yield (invoice_id, invoice_data) for the invoices whose PDF is missing."""
+    ids = list(missing)
+    for start in range(0, len(ids), DETAIL_BATCH_SIZE):
+        for invoice in db.get_invoices(ids[start:start + DETAIL_BATCH_SIZE]):
+            yield invoice['id'], invoice.to_invoice_data()
+
+
+def stream_invoice_pdfs_zip(filters=None, render_missing=True):
+    """
+    Yield a ZIP archive of the PDFs of every invoice matching `filters`
+    (the invoice list filters, including 'ids').
+
+    Existing files are read in fixed-size chunks straight into the
+    response; nothing is buffered on disk. Missing PDFs start rendering on
+    the process pool before the existing ones are streamed and are added
+    as they finish. Invoices that could not be included are listed in
+    MISSING.txt.
+    """
+    # First pass: which invoices have no PDF on disk (ids and numbers only)
+    missing = {}
+    for invoice_id, invoice_number, pdf_path in db.iter_invoice_pdf_paths(filters):
+        path = local_pdf_path(pdf_path)
+        if not path or not os.path.isfile(path):
+            missing[invoice_id] = invoice_number
+
+    problems = []
+    renders = None
+    if missing and render_missing:
+        renders = render_queue.render_many(_render_payloads(missing))
+    elif missing:
+        problems.extend((number, "PDF not found") for number in missing.values())
+
+    sink = _ChunkSink()
+    names = set()
+
+    try:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for invoice_id, invoice_number, pdf_path in db.iter_invoice_pdf_paths(filters):
+                if invoice_id in missing:
+                    continue
+                path = local_pdf_path(pdf_path)
+                if not os.path.isfile(path):
+                    problems.append((invoice_number, "PDF not found"))
+                    continue
+                yield from _write_pdf(zf, sink, path, names)
+
+            if renders is not None:
+                for invoice_id, pdf_path, error in renders:
+                    if error:
+                        number = missing.get(invoice_id, '(unknown)')
+                        problems.append((number, f"render failed: {error}"))
+                        continue
+                    yield from _write_pdf(zf, sink, local_pdf_path(pdf_path), names)
+
+            if problems:
+                lines = [f"{number}\t{reason}" for number, reason in sorted(problems)]
+                zf.writestr(MISSING_MANIFEST, '\n'.join(lines) + '\n')
+        yield sink.drain()
+    finally:
+        if renders is not None:
+            renders.close()